@@ -1,16 +1,33 @@
-import os, time, threading, datetime
+import os, time, threading
+import asyncio
+import atexit
+import multiprocessing
 from collections import defaultdict
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, FIRST_COMPLETED
 
 import pandas as pd
 from dotenv import load_dotenv
-from flask import Flask, render_template
+from flask import Flask, Response, render_template, request
 from flask_socketio import SocketIO
-from binance.spot import Spot
 
-from data_features import direction_conf_quant, buy_sell_pressure
-from modules.elliott_wave import current_wave_label
-from modules.temporal_predictor import ReversalTimer
-from modules.indicators import rsi as rsi_fn, atr as atr_fn
+from data_features import candle_signals, direction_from_signals, buy_sell_pressure, FeatureCache, _volume_strength
+from modules.elliott_wave import current_wave_label, WaveTracker
+from modules.temporal_predictor import ReversalTimer, PooledReversal
+from modules.ml_model import OnlineNextMove
+from modules.indicators import rsi as rsi_fn, atr as atr_fn, RSI, ATR, ADX, EMA
+from modules.candle_store import CandleStore
+from modules.compute_graph import ComputeGraph
+from modules.market_stream import MarketStream, depth_summary
+from modules.disk_store import CandleDisk
+from modules.binance_client import make_client, request_weight
+from modules.kline_codec import decode_klines
+from modules.publisher import DeltaPublisher
+from modules.message_bus import make_bus
+from modules.metrics import Metrics
+from modules.scheduler import TieredScheduler, parse_tiers
+from modules.model_registry import ModelRegistry
+from modules import batch_score
 
 load_dotenv()
 
@@ -23,6 +40,8 @@ ATR_LEN = int(os.getenv("ATR_LEN", "14"))
 ATR_TP_MULT = float(os.getenv("ATR_TP_MULT", "0.5"))
 ML_LOOKBACK = int(os.getenv("ML_LOOKBACK", "300"))
 ML_MIN_SAMPLES = int(os.getenv("ML_MIN_SAMPLES", "120"))
+ML_PROB = os.getenv("ML_PROB", "1") == "1"  # online next-move probability (ml_prob) per timeframe
+ML_LEARNING_RATE = float(os.getenv("ML_LEARNING_RATE", "0.01"))
 REC_CONF_THRESHOLD = float(os.getenv("REC_CONF_THRESHOLD", "0.65"))
 REC_MIN_MINUTES = int(os.getenv("REC_MIN_MINUTES", "3"))
 REC_MAX_MINUTES = int(os.getenv("REC_MAX_MINUTES", "20"))
@@ -30,15 +49,102 @@ ADX_LEN = int(os.getenv("ADX_LEN", "14"))
 VOLUME_BOOM_MULT = float(os.getenv("VOLUME_BOOM_MULT", "1.3"))
 DEPTH_LIMIT = int(os.getenv("DEPTH_LIMIT", "20"))
 REV_MAX_FWD = int(os.getenv("REV_MAX_FWD", "30"))
+KLINE_TAIL_LIMIT = int(os.getenv("KLINE_TAIL_LIMIT", "2"))
+TIMEFRAMES = tuple(tf.strip() for tf in os.getenv("TIMEFRAMES", "5m,10m").split(",") if tf.strip())  # rolled up from 1m
+TIMEFRAME_ROWS = int(os.getenv("TIMEFRAME_ROWS", "200"))  # candles kept per rolled-up timeframe
+INGEST_MODE = os.getenv("INGEST_MODE", "rest").lower()  # rest | stream
+STREAM_URL = os.getenv("STREAM_URL", "wss://stream.binance.com:9443")
+STREAM_MIN_INTERVAL = float(os.getenv("STREAM_MIN_INTERVAL", "0.25"))
+STREAM_RECORD_PATH = os.getenv("STREAM_RECORD_PATH") or None
+LOCAL_BOOK = os.getenv("LOCAL_BOOK", "1") == "1"  # stream mode: order book from the diff-depth stream
+DEPTH_SNAPSHOT_LIMIT = int(os.getenv("DEPTH_SNAPSHOT_LIMIT", "1000"))
+DEPTH_BANDS_BPS = tuple(int(x) for x in os.getenv("DEPTH_BANDS_BPS", "10,25,50,100").split(",") if x.strip())
+REV_REFIT_EVERY = int(os.getenv("REV_REFIT_EVERY", "5"))
+REV_DRIFT_THRESHOLD = float(os.getenv("REV_DRIFT_THRESHOLD", "1.5"))
+REV_ESTIMATOR = os.getenv("REV_ESTIMATOR", "gbr").lower()  # gbr | warm | hist
+REV_ASYNC_FIT = os.getenv("REV_ASYNC_FIT", "1") == "1"
+REV_MODE = os.getenv("REV_MODE", "symbol").lower()  # symbol (a model per symbol) | pooled (one model over all symbols)
+REV_POOL_REFIT_SECONDS = float(os.getenv("REV_POOL_REFIT_SECONDS", "60"))
+CANDLE_DIR = os.getenv("CANDLE_DIR", "")  # empty disables the on-disk candle store
+CANDLE_DISK_ROWS = int(os.getenv("CANDLE_DISK_ROWS", "20000"))
+MODEL_DIR = os.getenv("MODEL_DIR", os.path.join(CANDLE_DIR, "models") if CANDLE_DIR else "")  # empty: no model snapshots
+MODEL_SNAPSHOT_SECONDS = float(os.getenv("MODEL_SNAPSHOT_SECONDS", "600"))
+NAME_CACHE_MAX_AGE = float(os.getenv("NAME_CACHE_MAX_AGE", "86400"))
+EXEC_MODE = os.getenv("EXEC_MODE", "serial").lower()  # serial | pool
+FETCH_WORKERS = int(os.getenv("FETCH_WORKERS", "8"))
+FETCH_MODE = os.getenv("FETCH_MODE", "thread").lower()  # thread | async (one event loop, every request of a sweep in flight)
+FETCH_CONCURRENCY = int(os.getenv("FETCH_CONCURRENCY", "64"))  # async mode: max requests in flight
+COMPUTE_WORKERS = int(os.getenv("COMPUTE_WORKERS", str(os.cpu_count() or 2)))
+SCORE_ENGINE = os.getenv("SCORE_ENGINE", "batch").lower()  # batch (all frames in one array pass) | frame
+PUBLISH_DIGITS = int(os.getenv("PUBLISH_DIGITS", "0"))  # >0: compact frames, floats rounded to N significant digits
+ROLE = os.getenv("ROLE", "all").lower()  # all | producer | web
+BUS_URL = os.getenv("BUS_URL", os.getenv("REDIS_URL", ""))  # empty: in-process bus
+BUS_CHANNEL = "frames"
+UNIVERSE_N = int(os.getenv("UNIVERSE_N", str(TOP_N)))  # > TOP_N turns on tiered scheduling
+TIERS = os.getenv("TIERS", f"{TOP_N}:1,85:5,*:20")  # tier size:cadence in sweeps, tier 0 every sweep
+SWEEP_WEIGHT_BUDGET = float(os.getenv("SWEEP_WEIGHT_BUDGET", str(4800 * POLL_SECONDS / 60)))  # 80% of 6000/min
+SWEEP_CPU_BUDGET = float(os.getenv("SWEEP_CPU_BUDGET", str(0.8 * POLL_SECONDS * (COMPUTE_WORKERS if EXEC_MODE == 'pool' else 1))))
+SCREEN_VOL_Z = float(os.getenv("SCREEN_VOL_Z", "2.0"))
+SCREEN_MOVE = float(os.getenv("SCREEN_MOVE", "0.005"))
+SCREEN_KLINES = int(os.getenv("SCREEN_KLINES", "30"))  # 1m candles fetched per pre-screen (REST), enough for the volume z-score
+MODEL_CACHE_SIZE = int(os.getenv("MODEL_CACHE_SIZE", str(2 * UNIVERSE_N)))  # reversal models kept in memory
+BINANCE_BASE_URL = os.getenv("BINANCE_BASE_URL", "")  # e.g. a local fake exchange for testing
+BINANCE_WEIGHT_LIMIT = int(os.getenv("BINANCE_WEIGHT_LIMIT", "6000"))  # request weight per minute per IP
+METRICS_SAMPLE = float(os.getenv("METRICS_SAMPLE", "1.0"))  # share of stage spans timed, 0 turns them off
 
 app = Flask(__name__)
 socketio = SocketIO(app, cors_allowed_origins="*", async_mode="threading")
-
-client = Spot(timeout=TIMEOUT_SECONDS)
+bus = make_bus(BUS_URL)
+metrics = Metrics(sample=METRICS_SAMPLE)
+metrics.set_buckets('sweep_seconds', [POLL_SECONDS * f for f in (0.1, 0.25, 0.5, 0.75, 1, 1.5, 2, 4)])
+metrics.gauge('poll_seconds', POLL_SECONDS)
+
+# request weights: a full compute is a 1m kline tail (2), bookTicker (2) and depth at
+# DEPTH_LIMIT (5 up to 100 levels); higher timeframes are rolled up, not fetched. A screen
+# is one 1m tail. In stream mode both come from memory.
+FULL_WEIGHT = (request_weight('klines', (), {}) + request_weight('book_ticker', ('X',), {})
+               + request_weight('depth', (), {'limit': DEPTH_LIMIT}))
+scheduler = TieredScheduler(parse_tiers(TIERS), SWEEP_WEIGHT_BUDGET, SWEEP_CPU_BUDGET,
+                            full_weight=0 if INGEST_MODE == 'stream' else FULL_WEIGHT,
+                            screen_weight=0 if INGEST_MODE == 'stream' else request_weight('klines', (), {}),
+                            z_threshold=SCREEN_VOL_Z, move_threshold=SCREEN_MOVE) if UNIVERSE_N > TOP_N else None
+sweep_cost = {}
+
+def publish_frame(event, data, room):
+    # producer side: web workers relay frames to their own clients and serve the
+    # stored snapshot to new connections
+    bus.set('snapshot', publisher.snapshot())
+    bus.publish(BUS_CHANNEL, {'event': event, 'data': data, 'room': room})
+
+publisher = DeltaPublisher(publish_frame, digits=PUBLISH_DIGITS or None)
+
+client = make_client(timeout=TIMEOUT_SECONDS, weight_limit=BINANCE_WEIGHT_LIMIT, pool_size=max(10, 2 * FETCH_WORKERS),
+                     metrics=metrics, **({'base_url': BINANCE_BASE_URL} if BINANCE_BASE_URL else {}))
 
 symbols = []
 symbol_display_name = {}
-timer_cache = defaultdict(lambda: ReversalTimer(max_forward=REV_MAX_FWD, min_rows=ML_MIN_SAMPLES))
+def new_timer():
+    return ReversalTimer(max_forward=REV_MAX_FWD, min_rows=ML_MIN_SAMPLES, refit_every=REV_REFIT_EVERY,
+                         drift_threshold=REV_DRIFT_THRESHOLD, estimator=REV_ESTIMATOR, async_fit=REV_ASYNC_FIT)
+
+def restore_timer(saved):
+    # a snapshot is reused only if it was fitted for the same target and estimator;
+    # the scheduling settings always come from the current config
+    fresh = new_timer()
+    if type(saved) is not ReversalTimer or (saved.max_forward, saved.estimator) != (fresh.max_forward, fresh.estimator):
+        return fresh
+    for k in ('min_rows', 'refit_every', 'drift_threshold', 'async_fit'):
+        setattr(saved, k, getattr(fresh, k))
+    return saved
+
+timer_cache = ModelRegistry(new_timer, max_entries=MODEL_CACHE_SIZE, directory=MODEL_DIR,
+                            snapshot_seconds=MODEL_SNAPSHOT_SECONDS, restore=restore_timer, metrics=metrics)
+rev_pool = PooledReversal(max_forward=REV_MAX_FWD, min_rows=ML_MIN_SAMPLES, refit_seconds=REV_POOL_REFIT_SECONDS,
+                          rows_per_symbol=ML_LOOKBACK, estimator=REV_ESTIMATOR, async_fit=REV_ASYNC_FIT)
+wave_trackers = defaultdict(lambda: WaveTracker(sensitivity=3))
+ml_models = defaultdict(lambda: OnlineNextMove(min_samples=ML_MIN_SAMPLES, lr=ML_LEARNING_RATE))  # (symbol, tf)
+feature_cache = FeatureCache(rsi_len=RSI_LEN, atr_len=ATR_LEN)
+compute_graph = ComputeGraph(metrics)
 
 ASSET_NAMES = {
     "BTC":"Bitcoin", "ETH":"Ethereum", "BNB":"BNB", "SOL":"Solana", "XRP":"XRP",
@@ -49,18 +155,50 @@ ASSET_NAMES = {
     "ATOM":"Cosmos", "LINK":"Chainlink", "APT":"Aptos"
 }
 
-def safe_fetch(func, *args, retries=3, delay=0.5, **kwargs):
-    for i in range(retries):
-        try:
+def safe_fetch(func, *args, **kwargs):
+    # throttling, backoff and retries happen in the client; this only turns a final
+    # failure into None
+    name = getattr(func, '__name__', 'call')
+    try:
+        with metrics.span(f'fetch_{name}'):
             return func(*args, **kwargs)
-        except Exception as e:
-            if i == retries-1:
-                print(f"[WARN] {func.__name__} failed after {retries} tries: {e}")
-                return None
-            time.sleep(delay)
+    except Exception as e:
+        metrics.inc('fetch_failures_total', endpoint=name)
+        print(f"[WARN] {name} failed: {e}")
+        return None
+
+# indicator columns maintained incrementally on every candle buffer, named the way
+# data_features.feature_frame expects them
+KLINE_INDICATORS = {
+    f'rsi{RSI_LEN}': partial(RSI, RSI_LEN), f'atr{ATR_LEN}': partial(ATR, ATR_LEN),
+    'rsi14': partial(RSI, 14), 'adx14': partial(ADX, 14),
+    'ema20': partial(EMA, 20), 'ema50': partial(EMA, 50), 'ema100': partial(EMA, 100),
+}
+
+def fetch_kline_rows(symbol, interval, limit, start_time=None):
+    if start_time is None:
+        return safe_fetch(client.klines, symbol, interval=interval, limit=limit)
+    return safe_fetch(client.klines, symbol, interval=interval, limit=limit, startTime=start_time)
+
+def fetch_depth_snapshot(symbol):
+    return safe_fetch(client.depth, symbol, limit=DEPTH_SNAPSHOT_LIMIT)
+
+candle_disk = CandleDisk(CANDLE_DIR, max_rows=CANDLE_DISK_ROWS) if CANDLE_DIR else None
+candle_store = CandleStore(fetch_kline_rows, tail_limit=KLINE_TAIL_LIMIT, indicators=KLINE_INDICATORS,
+                           disk=candle_disk, rollups={tf: TIMEFRAME_ROWS for tf in TIMEFRAMES})
+market_stream = MarketStream(candle_store, {'1m': LOOKBACK_1M}, url=STREAM_URL,
+                             depth_levels=DEPTH_LIMIT, min_interval=STREAM_MIN_INTERVAL,
+                             record_path=STREAM_RECORD_PATH, snapshot=fetch_depth_snapshot if LOCAL_BOOK else None,
+                             bands=DEPTH_BANDS_BPS) if INGEST_MODE == 'stream' else None
 
 def build_name_cache():
     global symbol_display_name
+    if candle_disk is not None:
+        cached = candle_disk.load_json('names.json', max_age=NAME_CACHE_MAX_AGE)
+        if cached:
+            symbol_display_name = cached
+            print(f"[INFO] name cache size: {len(symbol_display_name)} (disk)")
+            return
     info = safe_fetch(client.exchange_info)
     if not info or 'symbols' not in info:
         print('[WARN] exchange_info not available, using basic labels only')
@@ -80,6 +218,8 @@ def build_name_cache():
         except Exception:
             continue
     symbol_display_name = out
+    if candle_disk is not None and out:
+        candle_disk.save_json('names.json', out)
     print(f"[INFO] name cache size: {len(symbol_display_name)}")
 
 def load_top_symbols():
@@ -100,43 +240,47 @@ def load_top_symbols():
         except Exception:
             r['_qvol'] = 0.0
     rows.sort(key=lambda x: x['_qvol'], reverse=True)
-    symbols = [r['symbol'] for r in rows[:TOP_N]]
-    print(f"[INFO] TOP{TOP_N}: {symbols}")
-
-def fetch_klines(symbol, interval, limit):
-    kl = safe_fetch(client.klines, symbol, interval=interval, limit=limit)
-    if not kl: return pd.DataFrame()
+    if scheduler is not None:
+        symbols = scheduler.rank(rows[:UNIVERSE_N])
+    else:
+        symbols = [r['symbol'] for r in rows[:TOP_N]]
+    candle_store.retain(symbols)
+    for cache in (wave_trackers, ml_models):
+        for key in [k for k in cache if k[0] not in symbols]:
+            del cache[key]
+    timer_cache.retain(symbols)
+    rev_pool.retain(symbols)
+    feature_cache.retain(symbols)
+    compute_graph.retain(symbols)
+    publisher.retain(symbols)
+    print(f"[INFO] TOP{len(symbols)}: {symbols}")
+
+def klines_frame(buf, symbol, interval):
+    if buf is None or not len(buf): return pd.DataFrame()
     try:
-        df = pd.DataFrame([{
-            'open_time': pd.to_datetime(r[0], unit='ms', utc=True),
-            'open': float(r[1]), 'high': float(r[2]), 'low': float(r[3]),
-            'close': float(r[4]), 'volume': float(r[5]),
-            'close_time': pd.to_datetime(r[6], unit='ms', utc=True),
-        } for r in kl])
-        df['rsi'] = rsi_fn(df['close'], RSI_LEN)
-        from modules.indicators import atr as _atr
-        df['atr'] = _atr(df, ATR_LEN)
+        with metrics.span('parse'):
+            df = buf.to_frame()
+        df['rsi'] = df[f'rsi{RSI_LEN}'] if f'rsi{RSI_LEN}' in df else rsi_fn(df['close'], RSI_LEN)
+        df['atr'] = df[f'atr{ATR_LEN}'] if f'atr{ATR_LEN}' in df else atr_fn(df, ATR_LEN)
         return df
     except Exception as e:
         print(f"[WARN] parse klines failed for {symbol} {interval}: {e}")
         return pd.DataFrame()
 
-def build_10m_from_1m(df_1m):
-    if df_1m is None or df_1m.empty: return pd.DataFrame()
-    d = df_1m.copy().set_index('close_time')
-    o = d['open'].resample('10min').first()
-    h = d['high'].resample('10min').max()
-    l = d['low'].resample('10min').min()
-    c = d['close'].resample('10min').last()
-    v = d['volume'].resample('10min').sum()
-    out = pd.DataFrame({'open': o, 'high': h, 'low': l, 'close': c, 'volume': v})
-    out = out.dropna().reset_index().rename(columns={'close_time':'close_time'})
-    out['rsi'] = rsi_fn(out['close'], RSI_LEN)
-    out['atr'] = atr_fn(out, ATR_LEN)
-    return out.tail(120)
+def buffer_frame(buf, symbol, interval):
+    # klines_frame, rebuilt only when the buffer's content has changed
+    if buf is None:
+        return klines_frame(buf, symbol, interval)
+    return compute_graph.get(symbol, interval, 'frame', buf.version, klines_frame, buf, symbol, interval)
 
-def fetch_book(symbol):
-    bt = safe_fetch(client.book_ticker, symbol)
+def refresh_klines(symbol, interval, limit):
+    with metrics.span(f'klines_{interval}'):
+        return candle_store.refresh(symbol, interval, limit)
+
+def fetch_klines(symbol, interval, limit):
+    return buffer_frame(refresh_klines(symbol, interval, limit), symbol, interval)
+
+def parse_book(bt):
     if not bt: return None
     try:
         return {'bid': float(bt.get('bidPrice', 0.0) or 0.0),
@@ -146,18 +290,19 @@ def fetch_book(symbol):
     except Exception:
         return None
 
-def fetch_depth(symbol, limit=20):
-    dp = safe_fetch(client.depth, symbol, limit=limit)
+def fetch_book(symbol):
+    return parse_book(safe_fetch(client.book_ticker, symbol))
+
+def parse_depth(dp, limit=20):
     if not dp: return None
     try:
-        bids = sum(float(x[1]) for x in dp.get('bids', [])[:limit])
-        asks = sum(float(x[1]) for x in dp.get('asks', [])[:limit])
-        if bids + asks <= 0: return {'liq_bias': 0.0}
-        liq_bias = (bids - asks) / (bids + asks)
-        return {'liq_bias': float(liq_bias), 'bids_vol': float(bids), 'asks_vol': float(asks)}
+        return depth_summary(dp.get('bids', []), dp.get('asks', []), limit)
     except Exception:
         return {'liq_bias': 0.0}
 
+def fetch_depth(symbol, limit=20):
+    return parse_depth(safe_fetch(client.depth, symbol, limit=limit), limit)
+
 def apply_wave_to_conf(conf, wave, phase):
     if wave in (1,3,5):
         return min(1.0, conf * 1.10), "صاعد"
@@ -165,53 +310,162 @@ def apply_wave_to_conf(conf, wave, phase):
         return max(0.0, conf * 0.90), "هابط"
     return conf, "غير محدد"
 
-def compute_for_symbol(sym):
-    df1 = fetch_klines(sym, '1m', LOOKBACK_1M)
-    df5 = fetch_klines(sym, '5m', max(LOOKBACK_1M//5, 200))
-    if df1 is None or df1.empty or df5 is None or df5.empty:
+def gather_inputs(sym):
+    if market_stream is not None:
+        # streaming mode: everything is already in memory, no network on this path
+        buf = candle_store.get(sym, '1m')
+        book = market_stream.book(sym)
+        depth = market_stream.depth(sym)
+    else:
+        buf = refresh_klines(sym, '1m', LOOKBACK_1M)
+        if buf is None or not len(buf):
+            return None
+        book = fetch_book(sym)
+        depth = fetch_depth(sym, limit=DEPTH_LIMIT)
+    return assemble_inputs(sym, buf, book, depth)
+
+def assemble_inputs(sym, buf1, book, depth):
+    # Higher timeframes are rolled up from the 1m buffer as it updates, never fetched.
+    # The buffer versions key the compute graph; they are read before the frames are
+    # built, so a concurrent update can leave a version older than its frame (one
+    # extra recompute next sweep) but never newer.
+    bufs = {'1m': buf1, **{tf: candle_store.get(sym, tf) for tf in TIMEFRAMES}}
+    versions = {tf: buf.version if buf is not None else None for tf, buf in bufs.items()}
+    frames = {tf: compute_graph.get(sym, tf, 'frame', versions[tf], klines_frame, buf, sym, tf)
+              for tf, buf in bufs.items()}
+    df1 = frames.pop('1m')
+    if df1 is None or df1.empty:
         return None
+    return {'df1': df1, 'frames': frames, 'book': book, 'depth': depth, 'versions': versions}
 
-    df10 = build_10m_from_1m(df1)
-
-    book = fetch_book(sym)
-    depth = fetch_depth(sym, limit=DEPTH_LIMIT)
-    liq_bias = (depth or {}).get('liq_bias', 0.0)
-
-    pressure = buy_sell_pressure(df1, lookback=5)
-
-    out = {}
-    rel_spread = None
-    imbalance = None
-    quote_vol = None
+async def safe_fetch_async(func, *args, **kwargs):
+    name = getattr(func, '__name__', 'call')
     try:
-        quote_vol = float(df1['close'].iloc[-1]) * float(df1['volume'].iloc[-1])
-    except Exception:
-        quote_vol = None
-
-    pred_minutes = None
-    try:
-        timer = timer_cache[sym]
-        pred_minutes = timer.fit_predict_minutes(df1.tail(ML_LOOKBACK).copy())
-    except Exception:
-        pred_minutes = None
+        with metrics.span(f'fetch_{name}'):
+            return await func(*args, **kwargs)
+    except Exception as e:
+        metrics.inc('fetch_failures_total', endpoint=name)
+        print(f"[WARN] {name} failed: {e}")
+        return None
 
-    for tf, df in [('1m', df1), ('5m', df5), ('10m', df10)]:
-        res = direction_conf_quant(df, book=book, rsi_len=RSI_LEN, atr_len=ATR_LEN, atr_mult=ATR_TP_MULT,
-                                   depth_liq_bias=liq_bias, pressure=pressure)
-        if not res: 
+async def fetch_kline_rows_async(symbol, interval, limit):
+    return await safe_fetch_async(aio_client.klines, symbol, interval=interval, limit=limit)
+
+async def fetch_raw_async(sym):
+    # the symbol's kline, book and depth requests in flight together; parsing is left
+    # to the sweep thread so the event loop only waits on sockets
+    return await asyncio.gather(candle_store.refresh_async(sym, '1m', LOOKBACK_1M, fetch_kline_rows_async),
+                                safe_fetch_async(aio_client.book_ticker, sym),
+                                safe_fetch_async(aio_client.depth, sym, limit=DEPTH_LIMIT))
+
+def inputs_from_raw(sym, raw):
+    buf, bt, dp = raw
+    return assemble_inputs(sym, buf, parse_book(bt), parse_depth(dp, DEPTH_LIMIT))
+
+def compute_from_inputs(sym, inputs, timer=None, models=None, reversal=True):
+    return compute_batch([(sym, inputs)], [timer], [models], reversal)[0]
+
+def symbol_models(sym):
+    return {tf: ml_models[(sym, tf)] for tf in ('1m',) + TIMEFRAMES} if ML_PROB else None
+
+def compute_batch(items, timers=None, models=None, reversal=True):
+    # [(sym, inputs)] -> [(core, extras)] in the same order. The 1m feature frame, the
+    # reversal timer and wave labels are per symbol; direction/confidence of every
+    # (symbol, timeframe) frame is scored in one batch_score pass over the whole set
+    # (SCORE_ENGINE=frame scores them one by one with direction_conf_quant instead).
+    # Higher-timeframe frames come straight from the candle buffers, whose indicator
+    # columns are all the scoring and wave labelling read. Candle-only stages (pressure,
+    # the candle half of the score, wave labels) go through the compute graph keyed by
+    # inputs['versions'], so a frame whose candles did not change since the last sweep
+    # only has the book half of its score redone. `models` ({tf: OnlineNextMove} per
+    # item, default ml_models) learn each closed candle once and give 'ml_prob'.
+    # With REV_MODE=pooled the reversal minutes of all items come from one batched
+    # rev_pool prediction (`reversal=False` leaves them to the caller).
+    preps = []
+    for k, (sym, inputs) in enumerate(items):
+        with metrics.span('features'):
+            df1 = feature_cache.get((sym, '1m'), inputs['df1'])
+        depth = inputs['depth'] or {}
+        ml = models[k] if models is not None and models[k] is not None else symbol_models(sym)
+        pred_minutes, rev = None, None
+        if REV_MODE == 'pooled':
+            if reversal:
+                with metrics.span('reversal_timer'):
+                    rev = rev_pool.rows(df1.tail(ML_LOOKBACK))
+        else:
+            cached = timers is None or timers[k] is None
+            timer = timer_cache[sym] if cached else timers[k]
+            fits = timer.fits
+            try:
+                with metrics.span('reversal_timer'):
+                    pred_minutes = timer.fit_predict_minutes(df1.tail(ML_LOOKBACK))
+            except Exception:
+                pred_minutes = None
+            if cached and timer.fits != fits:
+                # an async fit swaps the model in later; mark it once the new one is there
+                fut = timer.pending_fit
+                if fut is None:
+                    timer_cache.mark_dirty(sym)
+                else:
+                    fut.add_done_callback(lambda _, sym=sym: timer_cache.mark_dirty(sym))
+        preps.append({'sym': sym, 'df1': df1, 'book': inputs['book'], 'liq_bias': depth.get('liq_bias', 0.0),
+                      'bands': depth.get('bands'), 'pred_minutes': pred_minutes, 'rev': rev,
+                      'versions': inputs.get('versions') or {}, 'ml': ml or {},
+                      'frames': [('1m', df1)] + [(tf, df) for tf, df in inputs['frames'].items()
+                                                 if df is not None and not df.empty]})
+
+    if REV_MODE == 'pooled' and reversal:
+        with metrics.span('reversal_timer'):
+            preds = rev_pool.fit_predict_minutes_many([p['sym'] for p in preps], [p['rev'] for p in preps])
+        for p, pred in zip(preps, preds):
+            p['pred_minutes'] = pred
+
+    rows = [(p, tf, df) for p in preps for tf, df in p['frames']]
+    with metrics.span('score'):
+        if SCORE_ENGINE == 'batch':
+            pressures = compute_graph.get_many('pressure', [(p['sym'], '1m', p['versions'].get('1m'), p['df1'])
+                                                            for p in preps],
+                                               lambda dfs: batch_score.pressure(dfs, lookback=5).tolist())
+            for p, press in zip(preps, pressures):
+                p['pressure'] = press
+            parts = compute_graph.get_many('candles', [(p['sym'], tf, p['versions'].get(tf), df) for p, tf, df in rows],
+                                           partial(batch_score.candles, rsi_len=RSI_LEN, atr_len=ATR_LEN,
+                                                   atr_mult=ATR_TP_MULT))
+            results = batch_score.combine(parts, [p['book'] for p, _, _ in rows], [p['liq_bias'] for p, _, _ in rows],
+                                          [p['pressure'] for p, _, _ in rows], [p['bands'] for p, _, _ in rows])
+        else:
+            for p in preps:
+                p['pressure'] = compute_graph.get(p['sym'], '1m', 'pressure', p['versions'].get('1m'),
+                                                  buy_sell_pressure, p['df1'], lookback=5)
+            results = [direction_from_signals(compute_graph.get(p['sym'], tf, 'candles', p['versions'].get(tf),
+                                                                candle_signals, df, RSI_LEN, ATR_LEN, ATR_TP_MULT),
+                                              book=p['book'], depth_liq_bias=p['liq_bias'], pressure=p['pressure'],
+                                              depth_bands=p['bands'])
+                       for p, tf, df in rows]
+
+    for p in preps:
+        p['out'], p['spread'], p['imbalance'] = {}, None, None
+    for (p, tf, df), res in zip(rows, results):
+        if not res:
             continue
         dirc, conf, extras = res
         if dirc is None or conf is None or df is None or df.empty:
             continue
 
-        wave, phase = current_wave_label(df[['open','high','low','close','volume','close_time']].copy(), sensitivity=3)
+        with metrics.span('wave'):
+            wave, phase = compute_graph.get(p['sym'], tf, 'wave', p['versions'].get(tf), current_wave_label, df,
+                                            sensitivity=3, tracker=wave_trackers[(p['sym'], tf)])
         conf_adj, wave_trend = apply_wave_to_conf(conf, wave, phase)
+        ml_prob = None
+        if tf in p['ml']:
+            with metrics.span('ml'):
+                ml_prob = compute_graph.get(p['sym'], tf, 'ml', p['versions'].get(tf), p['ml'][tf].update_predict, df)
 
         if extras:
-            rel_spread = extras.get('spread', rel_spread)
-            imbalance = extras.get('imbalance', imbalance)
+            p['spread'] = extras.get('spread', p['spread'])
+            p['imbalance'] = extras.get('imbalance', p['imbalance'])
 
-        out[tf] = {
+        p['out'][tf] = {
             'dir': int(dirc),
             'conf': float(conf_adj),
             'price': float(df['close'].iloc[-1]),
@@ -224,18 +478,28 @@ def compute_for_symbol(sym):
             'tp_pct': extras.get('tp_pct') if extras else None,
             'trend_phase': extras.get('trend_phase') if extras else None,
             'trend_color': extras.get('trend_color') if extras else 'gray',
-            'trend_strength': extras.get('trend_strength') if extras else 0.0
+            'trend_strength': extras.get('trend_strength') if extras else 0.0,
+            'ml_prob': ml_prob
         }
 
-    extras_out = {
-        'spread_pct': (rel_spread * 100.0) if rel_spread is not None else None,
-        'imbalance': imbalance,
-        'quote_volume_1m': quote_vol,
-        'liq_bias_pct': (liq_bias * 100.0) if liq_bias is not None else None,
-        'pressure': pressure,
-        'pred_minutes': float(pred_minutes) if pred_minutes is not None else None
-    }
-    return out if out else None, extras_out
+    computed = []
+    for p in preps:
+        df1, liq_bias, depth_bands, rel_spread = p['df1'], p['liq_bias'], p['bands'], p['spread']
+        try:
+            quote_vol = float(df1['close'].iloc[-1]) * float(df1['volume'].iloc[-1])
+        except Exception:
+            quote_vol = None
+        extras_out = {
+            'spread_pct': (rel_spread * 100.0) if rel_spread is not None else None,
+            'imbalance': p['imbalance'],
+            'quote_volume_1m': quote_vol,
+            'liq_bias_pct': (liq_bias * 100.0) if liq_bias is not None else None,
+            'depth_bands_pct': {str(b): v * 100.0 for b, v in depth_bands.items()} if depth_bands else None,
+            'pressure': p['pressure'],
+            'pred_minutes': float(p['pred_minutes']) if p['pred_minutes'] is not None else None
+        }
+        computed.append((p['out'] if p['out'] else None, extras_out))
+    return computed
 
 def rec_from_payload(tfs: dict, threshold: float=0.65, min_minutes: int=3, max_minutes: int=20, pred_minutes: float | None = None):
     t1 = tfs.get('1m', {})
@@ -276,7 +540,7 @@ def rec_from_payload(tfs: dict, threshold: float=0.65, min_minutes: int=3, max_m
         conf_pct = round(avg_conf * 100.0, 1)
 
     return {"action": action, "timeframe": tf_choice, "confidence_pct": conf_pct,
-            "duration_min": duration, "ts": datetime.datetime.utcnow().isoformat() + "Z"}
+            "duration_min": duration}
 
 def compute_market_summary(payloads: list[dict]) -> dict:
     if not payloads:
@@ -314,35 +578,237 @@ def compute_market_summary(payloads: list[dict]) -> dict:
         "avg_conf_pct": round(avg_conf*100.0, 1),
         "liq_bias_pct": round(liq, 1),
         "avg_spread_pct": round(spread, 2),
-        "pressure_label": pres_label,
-        "ts": datetime.datetime.utcnow().isoformat() + "Z"
+        "pressure_label": pres_label
     }
 
+def build_payload(sym, computed):
+    core, extras = computed
+    if not core:
+        return None
+    label = symbol_display_name.get(sym, f"{sym.replace('USDT','')} ({sym[:-4]}/USDT)")
+
+    payload = {'symbol': sym, 'name': label, 'tfs': core, 'extras': extras or {}}
+    payload['recommendation'] = rec_from_payload(core, threshold=REC_CONF_THRESHOLD,
+                                                 min_minutes=REC_MIN_MINUTES, max_minutes=REC_MAX_MINUTES,
+                                                 pred_minutes=extras.get('pred_minutes') if extras else None)
+    return payload
+
+fetch_pool = None
+compute_pool = None
+aio_loop = None
+aio_client = None
+
+def start_fetchers(async_fetch):
+    global fetch_pool, aio_loop, aio_client
+    if async_fetch:
+        if aio_loop is None:
+            from modules.async_fetch import AsyncLoop, AsyncSpot  # aiohttp is only needed here
+            aio_loop = AsyncLoop('fetch')
+            aio_client = AsyncSpot(limiter=client, concurrency=FETCH_CONCURRENCY, timeout=TIMEOUT_SECONDS)
+    elif fetch_pool is None:
+        fetch_pool = ThreadPoolExecutor(max_workers=FETCH_WORKERS, thread_name_prefix='fetch')
+
+def _compute_task(sym, inputs, timer, models):
+    # runs in a worker process; the timer and the online models travel both ways so
+    # their state ends up back in the parent's caches. Fit synchronously here, a
+    # background fit would finish in the worker after the timer has been sent back.
+    # Without a timer (REV_MODE=pooled) the symbol's normalized reversal rows go back
+    # instead, for the parent's batched prediction.
+    started = time.perf_counter()
+    if timer is None:
+        computed = compute_from_inputs(sym, inputs, models=models, reversal=False)
+        rev = rev_pool.rows(feature_cache.get((sym, '1m'), inputs['df1']).tail(ML_LOOKBACK))
+    else:
+        timer.async_fit = False
+        computed, rev = compute_from_inputs(sym, inputs, timer=timer, models=models), None
+    return computed, timer, models, rev, time.perf_counter() - started
+
+def _pooled_landed(items):
+    # [(sym, computed, rev rows)] from the process pool -> one batched reversal prediction
+    preds = rev_pool.fit_predict_minutes_many([sym for sym, _, _ in items], [rev for _, _, rev in items])
+    for (sym, computed, _), pred in zip(items, preds):
+        computed[1]['pred_minutes'] = pred
+        yield sym, computed
+
+def _safe_result(fut, sym, stage):
+    try:
+        return fut.result()
+    except Exception as e:
+        print(f"[WARN] {stage} failed for {sym}: {e}")
+        return None
+
+def _compute_landed(items, spent=None):
+    # one compute_batch over every symbol whose inputs are in; the scoring pass is
+    # shared, so its time is split evenly (plus what `spent` says gathering took)
+    started = time.perf_counter()
+    with metrics.span('compute'):
+        results = compute_batch(items)
+    share = (time.perf_counter() - started) / len(items)
+    for (sym, _), computed in zip(items, results):
+        sweep_cost[sym] = (spent or {}).get(sym, 0.0) + share
+        yield sym, computed
+
+def sweep(syms):
+    # Yields (symbol, computed) as symbols finish. Serially, every symbol is gathered
+    # and then computed in one batch. In pool mode fetches fan out over a bounded
+    # thread pool and the model/indicator work runs in a process pool. With
+    # FETCH_MODE=async every symbol's requests go out at once on one event loop and
+    # whatever has landed is computed as one batch (or in the process pool).
+    global compute_pool
+    async_fetch = FETCH_MODE == 'async' and market_stream is None
+    if EXEC_MODE != 'pool' and not async_fetch:
+        items, spent = [], {}
+        for sym in syms:
+            started = time.perf_counter()
+            with metrics.span('gather'):
+                inputs = gather_inputs(sym)
+            spent[sym] = time.perf_counter() - started
+            if inputs:
+                items.append((sym, inputs))
+            else:
+                yield sym, None
+        if items:
+            yield from _compute_landed(items, spent)
+        return
+    if EXEC_MODE == 'pool' and compute_pool is None:
+        compute_pool = ProcessPoolExecutor(max_workers=COMPUTE_WORKERS,
+                                           mp_context=multiprocessing.get_context('spawn'))
+    start_fetchers(async_fetch)
+    if async_fetch:
+        owner = {aio_loop.submit(fetch_raw_async(sym)): (sym, 'fetch') for sym in syms}
+    else:
+        owner = {fetch_pool.submit(gather_inputs, sym): (sym, 'fetch') for sym in syms}
+    pending = set(owner)
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        landed, pooled = [], []
+        for fut in done:
+            sym, stage = owner.pop(fut)
+            res = _safe_result(fut, sym, stage)
+            if stage == 'fetch':
+                if res is not None and async_fetch:
+                    res = inputs_from_raw(sym, res)
+                if not res:
+                    continue
+                if compute_pool is None:
+                    landed.append((sym, res))
+                    continue
+                nxt = compute_pool.submit(_compute_task, sym, res, timer_cache[sym] if REV_MODE != 'pooled' else None,
+                                          symbol_models(sym))
+                owner[nxt] = (sym, 'compute')
+                pending.add(nxt)
+                continue
+            if res is None:
+                yield sym, None
+                continue
+            computed, timer, models, rev, sweep_cost[sym] = res
+            for tf, model in (models or {}).items():
+                ml_models[(sym, tf)] = model
+            if timer is None:
+                pooled.append((sym, computed, rev))
+                continue
+            refit = sym not in timer_cache or timer.fits != timer_cache[sym].fits
+            timer_cache[sym] = timer
+            if refit:
+                timer_cache.mark_dirty(sym)
+            yield sym, computed
+        if pooled:
+            yield from _pooled_landed(pooled)
+        if landed:
+            yield from _compute_landed(landed)
+
+def prescreen(df1):
+    # cheap activity check for symbols off their cadence: volume z-score and last price
+    if df1 is None or len(df1) < 5:
+        return None
+    return 6.0 * _volume_strength(df1) - 3.0, float(df1['close'].iloc[-1])
+
+def _screen_frame(rows):
+    return pd.DataFrame(decode_klines(rows)) if rows else None
+
+async def _screen_rows_async(syms):
+    return await asyncio.gather(*(fetch_kline_rows_async(s, '1m', SCREEN_KLINES) for s in syms))
+
+def prescreen_many(syms):
+    # in stream mode from the buffered candles; over REST a short 1m tail per symbol
+    # (not a seed of the candle store), fetched together on the sweep's fetch executor
+    if market_stream is not None:
+        return [prescreen(buffer_frame(candle_store.get(s, '1m'), s, '1m')) for s in syms]
+    async_fetch = FETCH_MODE == 'async'
+    start_fetchers(async_fetch)
+    with metrics.span('prescreen'):
+        if async_fetch:
+            rows = aio_loop.run(_screen_rows_async(syms))
+        else:
+            rows = fetch_pool.map(lambda s: fetch_kline_rows(s, '1m', SCREEN_KLINES), syms)
+        return [prescreen(_screen_frame(r)) for r in rows]
+
+def plan_sweep(candidates):
+    if scheduler is None:
+        return list(candidates)
+    syms = scheduler.plan(prescreen_many, batch=FETCH_WORKERS, only=set(candidates))
+    for k, v in scheduler.stats.items():
+        metrics.gauge(f'scheduler_{k}', v)
+    return syms
+
+def record_result(sym, payload):
+    if scheduler is not None:
+        scheduler.record(sym, sweep_cost.get(sym, 0.0), (payload['tfs'].get('1m') or {}).get('price'))
+
+def finish_sweep(started, summary):
+    with metrics.span('publish'):
+        if summary:
+            publisher.set_summary(summary)
+        publisher.flush()
+    took = time.perf_counter() - started
+    metrics.observe('sweep_seconds', took)
+    if took > POLL_SECONDS:
+        metrics.inc('sweeps_over_budget_total')
+    timer_cache.snapshot()
+    if ROLE == 'producer':
+        bus.set('metrics', metrics.render())  # web workers serve it on /metrics
+
+def stream_poller():
+    latest = {}
+    market_stream.start(symbols)
+    reloaded = time.time()
+    while True:
+        if time.time() - reloaded >= 600:
+            reloaded = time.time()
+            load_top_symbols()
+            market_stream.set_symbols(symbols)
+        dirty = market_stream.wait_dirty(POLL_SECONDS)
+        started = time.perf_counter()
+        for sym, computed in sweep(plan_sweep(dirty)):
+            payload = build_payload(sym, computed) if computed else None
+            if not payload:
+                continue
+            record_result(sym, payload)
+            latest[sym] = payload
+            publisher.stage(sym, payload)
+
+        finish_sweep(started, compute_market_summary([latest[s] for s in symbols if s in latest]))
+
 def poller():
     build_name_cache()
     load_top_symbols()
+    if market_stream is not None:
+        return stream_poller()
+    latest = {}
     while True:
-        payloads = []
         if int(time.time()) % 600 < POLL_SECONDS:
             load_top_symbols()
-        for sym in symbols:
-            computed = compute_for_symbol(sym)
-            if not computed:
+        started = time.perf_counter()
+        for sym, computed in sweep(plan_sweep(symbols)):
+            payload = build_payload(sym, computed) if computed else None
+            if not payload:
                 continue
-            core, extras = computed
-            label = symbol_display_name.get(sym, f"{sym.replace('USDT','')} ({sym[:-4]}/USDT)")
-
-            payload = {'symbol': sym, 'name': label, 'tfs': core, 'extras': extras or {}}
-            payload['recommendation'] = rec_from_payload(core, threshold=REC_CONF_THRESHOLD,
-                                                         min_minutes=REC_MIN_MINUTES, max_minutes=REC_MAX_MINUTES,
-                                                         pred_minutes=extras.get('pred_minutes') if extras else None)
-            payloads.append(payload)
-            socketio.emit('top15_update', payload)
-
-        # بعد إرسال جميع العملات، نرسل ملخص السوق العام مرة واحدة
-        summary = compute_market_summary(payloads)
-        if summary:
-            socketio.emit('market_summary', summary)
+            record_result(sym, payload)
+            latest[sym] = payload
+            publisher.stage(sym, payload)
+
+        # بعد حساب جميع العملات، نرسل إطارًا واحدًا بالتغييرات فقط مع ملخص السوق
+        finish_sweep(started, compute_market_summary([latest[s] for s in symbols if s in latest]))
 
         time.sleep(POLL_SECONDS)
 
@@ -355,7 +821,36 @@ def home():
 def fav():
     return ('',204)
 
+@app.route('/metrics')
+def metrics_text():
+    # a web worker only relays: its own registry holds the same families (poll_seconds
+    # is set at import), so appending it would duplicate them and fail the scrape
+    text = (bus.get('metrics') or '') if ROLE == 'web' else metrics.render()
+    return Response(text, mimetype='text/plain; version=0.0.4')
+
+@socketio.on('connect')
+def on_connect(*_):
+    # new dashboards get the full state once, then only deltas
+    snap = bus.get('snapshot')
+    if snap is not None:
+        socketio.emit('top15_delta', snap, to=request.sid)
+
+@socketio.on('resync')
+def on_resync(*_):
+    on_connect()
+
+def relay(msg):
+    socketio.emit(msg['event'], msg['data'], to=msg.get('room'))
+
+# web workers (gunicorn imports this module) only relay; spawned compute workers skip it
+if ROLE in ('all', 'web') and multiprocessing.current_process().name == 'MainProcess':
+    bus.subscribe(BUS_CHANNEL, relay)
+
 if __name__ == '__main__':
-    threading.Thread(target=poller, daemon=True).start()
+    atexit.register(timer_cache.snapshot, True)  # fitted reversal models survive a restart
+    if ROLE == 'producer':
+        poller()
+    if ROLE == 'all':
+        threading.Thread(target=poller, daemon=True).start()
     port = int(os.environ.get('PORT', 8000))
     socketio.run(app, host='0.0.0.0', port=port)
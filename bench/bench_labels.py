@@ -0,0 +1,53 @@
+import os, sys, time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from modules.temporal_predictor import ReversalTimer
+
+# Compares the vectorized ReversalTimer._labels against the original nested loop.
+#   python bench/bench_labels.py [rows] [repeats]
+
+def labels_loop(price, max_forward):
+    mom = np.sign(np.diff(price, prepend=price[0]) + 1e-12)
+    n = len(price)
+    lbl = np.full(n, max_forward, dtype=float)
+    for i in range(n-1):
+        cur = mom[i]
+        for fwd in range(1, max_forward+1):
+            j = i + fwd
+            if j >= n: break
+            if np.sign(price[j] - price[i]) != cur:
+                lbl[i] = fwd
+                break
+    return lbl
+
+def best_of(fn, repeats):
+    best = float('inf')
+    for _ in range(repeats):
+        t = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t)
+    return best
+
+def main(rows=300, repeats=5):
+    rng = np.random.default_rng(7)
+    print(f"rows={rows} repeats={repeats}")
+    print(f"{'series':>8} {'max_fwd':>8} {'loop_ms':>10} {'vec_ms':>10} {'speedup':>9}")
+    # a choppy random walk reverses within a few bars, a drifting one runs long;
+    # prices are rounded so flat moves (sign 0) are exercised too
+    for name, drift in (('choppy', 0.0), ('trending', 0.002)):
+        price = np.round(100 * np.exp(np.cumsum(rng.normal(drift, 0.001, rows))), 2)
+        df = pd.DataFrame({'close': price})
+        for fwd in (30, 60, 120):
+            timer = ReversalTimer(max_forward=fwd)
+            ref = labels_loop(price, fwd)
+            assert np.array_equal(ref, timer._labels(df).values), f"label mismatch at max_forward={fwd}"
+            t_loop = best_of(lambda: labels_loop(price, fwd), repeats)
+            t_vec = best_of(lambda: timer._labels(df), repeats)
+            print(f"{name:>8} {fwd:>8} {t_loop*1e3:>10.2f} {t_vec*1e3:>10.3f} {t_loop/t_vec:>8.0f}x")
+
+if __name__ == '__main__':
+    args = [int(a) for a in sys.argv[1:3]]
+    main(*args)
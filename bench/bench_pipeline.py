@@ -0,0 +1,182 @@
+import argparse, json, os, platform, resource, subprocess, sys, time, tracemalloc
+from collections import defaultdict
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import app
+from modules import batch_score
+from data_features import direction_conf_quant, detect_trend_phase, feature_frame
+from modules.backtest import _frame
+from modules.candle_store import CandleBuffer, rollup
+from modules.disk_store import CandleDisk, INTERVAL_MS
+from modules.elliott_wave import current_wave_label, WaveTracker
+from modules.temporal_predictor import PooledReversal
+
+# Per-stage latency of the per-symbol compute pipeline over synthetic or recorded
+# (CandleDisk) OHLCV, for every lookback x symbol-count combination. Each sweep
+# advances every symbol by one candle, as the live poller sees it; the first sweep
+# is cold (empty caches, unfitted models) and reported separately. Peak memory is
+# the tracemalloc peak of one extra sweep run after the timed ones, so tracing does
+# not skew the latencies; max RSS covers the whole process. batch_score scores every
+# symbol's 1m frame in one call and is reported per symbol, next to direction_conf_quant;
+# reversal_pooled likewise, for one PooledReversal (fitted once, synchronously, on the
+# cold sweep) against the per-symbol reversal_timer.
+#   python bench/bench_pipeline.py --lookbacks 300,900 --symbols 15 --json out.json
+#   python bench/bench_pipeline.py --compare base.json --json new.json
+
+STAGES = ('rollup', 'feature_frame', 'direction_conf_quant', 'batch_score', 'detect_trend_phase',
+          'wave_label', 'reversal_timer', 'reversal_pooled', 'compute_from_inputs')
+
+def synthetic_cols(n, seed, interval='1m'):
+    rng = np.random.default_rng(seed)
+    step = INTERVAL_MS[interval]
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.002, n)))
+    open_ = np.concatenate([[close[0]], close[:-1]])
+    wick = np.abs(rng.normal(0, 0.001, (2, n)))
+    ot = 1_700_000_000_000 + np.arange(n, dtype=np.int64) * step
+    return {'open_time': ot, 'open': open_, 'high': np.maximum(open_, close) * (1 + wick[0]),
+            'low': np.minimum(open_, close) * (1 - wick[1]), 'close': close,
+            'volume': rng.lognormal(3, 0.5, n), 'close_time': ot + step - 1}
+
+def recorded_cols(disk, sym, interval, n):
+    cols = disk.load(sym, interval, n)
+    if cols is None or len(cols['open_time']) < n:
+        raise SystemExit(f"{sym} {interval}: fewer than {n} stored candles")
+    return cols
+
+def fixtures(nsym, lookback, sweeps, data=None):
+    # (symbol, 1m columns, 1m frame) with `sweeps` extra candles to advance through
+    disk = CandleDisk(data) if data else None
+    stored = sorted(d for d in os.listdir(data) if os.path.isdir(os.path.join(data, d))) if data else []
+    out = []
+    for k in range(nsym):
+        sym = f"SYM{k:03d}USDT"
+        if disk is not None:
+            src = stored[k % len(stored)]
+            c1 = recorded_cols(disk, src, '1m', lookback + sweeps)
+        else:
+            c1 = synthetic_cols(lookback + sweeps, k)
+        out.append((sym, c1, _frame(app, c1, sym, '1m')))
+    return out
+
+def timed(rec, stage, fn, *args, **kwargs):
+    t = time.perf_counter()
+    res = fn(*args, **kwargs)
+    rec[stage].append(time.perf_counter() - t)
+    return res
+
+def pct(xs):
+    a = np.asarray(xs) * 1e3
+    return {'n': len(a), 'p50': float(np.percentile(a, 50)), 'p90': float(np.percentile(a, 90)),
+            'p99': float(np.percentile(a, 99)), 'max': float(a.max())}
+
+def run_config(lookback, nsym, sweeps, data=None):
+    fx = fixtures(nsym, lookback, sweeps + 1, data)
+    book = {'bid': 99.99, 'ask': 100.01, 'bid_qty': 3.0, 'ask_qty': 2.0}
+    depth = {'liq_bias': 0.1}
+    trackers = defaultdict(lambda: WaveTracker(sensitivity=3))
+    timers = {}
+    pooled = PooledReversal(max_forward=app.REV_MAX_FWD, min_rows=app.ML_MIN_SAMPLES, refit_seconds=float('inf'),
+                            rows_per_symbol=app.ML_LOOKBACK, estimator=app.REV_ESTIMATOR, async_fit=False)
+    rolls = defaultdict(lambda: {tf: CandleBuffer(app.TIMEFRAME_ROWS, app.KLINE_INDICATORS) for tf in app.TIMEFRAMES})
+    app.feature_cache.retain([]); app.compute_graph.retain([]); app.wave_trackers.clear(); app.ml_models.clear(); app.timer_cache.clear()
+    warm, cold, sweep_s = defaultdict(list), defaultdict(list), []
+    for s in range(sweeps + 2):
+        rec = cold if s == 0 else warm if s <= sweeps else defaultdict(list)
+        if s == sweeps + 1:
+            tracemalloc.start()
+        t_sweep = time.perf_counter()
+        scored = []
+        for sym, c1, df1_all in fx:
+            df1 = df1_all.iloc[s:s + lookback]
+            window = {c: v[s:s + lookback] for c, v in c1.items()}
+            since = None if s == 0 else window['open_time'][-1]
+            t = time.perf_counter()
+            for tf, buf in rolls[sym].items():
+                rollup(buf, window, INTERVAL_MS[tf], since)
+            rec['rollup'].append(time.perf_counter() - t)
+            versions = {tf: buf.version for tf, buf in rolls[sym].items()}
+            frames = {tf: app.klines_frame(buf, sym, tf) for tf, buf in rolls[sym].items()}
+            f1 = timed(rec, 'feature_frame', feature_frame, df1, rsi_len=app.RSI_LEN, atr_len=app.ATR_LEN)
+            timed(rec, 'direction_conf_quant', direction_conf_quant, f1, book=book, rsi_len=app.RSI_LEN,
+                  atr_len=app.ATR_LEN, atr_mult=app.ATR_TP_MULT, depth_liq_bias=0.1)
+            scored.append((sym, f1))
+            timed(rec, 'detect_trend_phase', detect_trend_phase, f1)
+            timed(rec, 'wave_label', current_wave_label, f1, 3, trackers[sym])
+            if sym not in timers:
+                timers[sym] = app.timer_cache.default_factory()
+                timers[sym].async_fit = False
+            timed(rec, 'reversal_timer', timers[sym].fit_predict_minutes, f1.tail(app.ML_LOOKBACK))
+            inputs = {'df1': df1, 'frames': frames, 'book': book, 'depth': depth, 'versions': versions}
+            timed(rec, 'compute_from_inputs', app.compute_from_inputs, sym, inputs, timer=timers[sym])
+        t = time.perf_counter()
+        batch_score.score([f1 for _, f1 in scored], [book] * nsym, [0.1] * nsym, [0.0] * nsym, [None] * nsym,
+                          rsi_len=app.RSI_LEN, atr_len=app.ATR_LEN, atr_mult=app.ATR_TP_MULT)
+        rec['batch_score'].append((time.perf_counter() - t) / nsym)
+        t = time.perf_counter()
+        pooled.fit_predict_minutes_many([sym for sym, _ in scored],
+                                        [pooled.rows(f1.tail(app.ML_LOOKBACK)) for _, f1 in scored])
+        rec['reversal_pooled'].append((time.perf_counter() - t) / nsym)
+        sweep_s.append(time.perf_counter() - t_sweep)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'lookback': lookback, 'symbols': nsym, 'sweeps': sweeps,
+            'cold': {st: pct(cold[st]) for st in STAGES},
+            'stages': {st: pct(warm[st]) for st in STAGES if warm[st]},
+            'sweep_s': {'cold': sweep_s[0], 'warm_mean': float(np.mean(sweep_s[1:-1])) if sweeps else None},
+            'peak_mb': peak / 2**20, 'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+
+def meta():
+    try:
+        rev = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except Exception:
+        rev = None
+    return {'git': rev, 'python': platform.python_version(), 'numpy': np.__version__,
+            'machine': platform.machine(), 'cpus': os.cpu_count(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S')}
+
+def compare(base, new, tolerance):
+    old = {(r['lookback'], r['symbols']): r for r in base['results']}
+    print(f"\nvs {base['meta'].get('git')} (p50, regression if > {tolerance:.0%} slower)")
+    for r in new['results']:
+        b = old.get((r['lookback'], r['symbols']))
+        if b is None:
+            continue
+        for st, cur in r['stages'].items():
+            ref = b['stages'].get(st)
+            if not ref:
+                continue
+            ratio = cur['p50'] / ref['p50'] if ref['p50'] else float('inf')
+            flag = 'REGRESSION' if ratio > 1 + tolerance else ''
+            print(f"{r['lookback']:>6} {r['symbols']:>5} {st:>22} {ref['p50']:>9.3f} -> {cur['p50']:>9.3f} ms {ratio:>6.2f}x {flag}")
+
+def main():
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--lookbacks', default='300,900,5000')
+    ap.add_argument('--symbols', default='15,100,500')
+    ap.add_argument('--sweeps', type=int, default=3)
+    ap.add_argument('--data', help='CandleDisk directory for recorded fixtures (default: synthetic)')
+    ap.add_argument('--json', help='write results here')
+    ap.add_argument('--compare', help='earlier results JSON to compare against')
+    ap.add_argument('--tolerance', type=float, default=0.10)
+    args = ap.parse_args()
+    out = {'meta': meta(), 'fixture': args.data or 'synthetic', 'results': []}
+    print(f"{'lookback':>8} {'syms':>5} {'stage':>22} {'p50_ms':>9} {'p90_ms':>9} {'p99_ms':>9} {'max_ms':>9}")
+    for lookback in (int(x) for x in args.lookbacks.split(',')):
+        for nsym in (int(x) for x in args.symbols.split(',')):
+            r = run_config(lookback, nsym, args.sweeps, args.data)
+            out['results'].append(r)
+            for st, p in r['stages'].items():
+                print(f"{lookback:>8} {nsym:>5} {st:>22} {p['p50']:>9.3f} {p['p90']:>9.3f} {p['p99']:>9.3f} {p['max']:>9.3f}")
+            print(f"{lookback:>8} {nsym:>5} {'sweep (cold / warm)':>22} {r['sweep_s']['cold']:>9.3f}s "
+                  f"{r['sweep_s']['warm_mean'] or 0:>9.3f}s  peak {r['peak_mb']:.1f} MB")
+    if args.json:
+        with open(args.json, 'w') as fh:
+            json.dump(out, fh, indent=2)
+    if args.compare:
+        with open(args.compare) as fh:
+            compare(json.load(fh), out, args.tolerance)
+
+if __name__ == '__main__':
+    main()
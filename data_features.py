@@ -23,15 +23,18 @@ def _volume_strength(df, window=20):
     v = pd.to_numeric(df['volume'], errors='coerce')
     if len(v) < 5:
         return 0.0
-    m = v.rolling(window, min_periods=max(5, window//2)).mean()
-    s = v.rolling(window, min_periods=max(5, window//2)).std()
+    if window == 20 and 'vol_m20' in df:
+        m, s = df['vol_m20'], df['vol_s20']
+    else:
+        m = v.rolling(window, min_periods=max(5, window//2)).mean()
+        s = v.rolling(window, min_periods=max(5, window//2)).std()
     m_last = float(m.iloc[-1]) if pd.notna(m.iloc[-1]) else 0.0
     s_last = float(s.iloc[-1]) if pd.notna(s.iloc[-1]) else 1e-6
     z = float((v.iloc[-1] - m_last) / (s_last if s_last != 0 else 1e-6))
     z_norm = (max(-3.0, min(3.0, z)) + 3.0) / 6.0
     return max(0.0, min(1.0, z_norm))
 
-def _micro_from_orderbook(bid, ask, bid_qty, ask_qty, depth_liq_bias=None):
+def _micro_from_orderbook(bid, ask, bid_qty, ask_qty, depth_liq_bias=None, depth_bands=None):
     try:
         bid = float(bid); ask = float(ask)
         bq = float(bid_qty or 0.0); aq = float(ask_qty or 0.0)
@@ -45,6 +48,10 @@ def _micro_from_orderbook(bid, ask, bid_qty, ask_qty, depth_liq_bias=None):
     rel_spread = (ask - bid) / (mid + 1e-9)
     imbalance = (bq - aq) / ((bq + aq) + 1e-9)
 
+    if depth_bands:
+        # local book: imbalance within each bps band around the mid, tighter bands weigh more
+        w = sum(1.0/b for b in depth_bands)
+        depth_liq_bias = sum(v/b for b, v in depth_bands.items()) / w
     if depth_liq_bias is not None:
         imbalance = 0.5*imbalance + 0.5*depth_liq_bias
 
@@ -56,7 +63,7 @@ def _micro_from_orderbook(bid, ask, bid_qty, ask_qty, depth_liq_bias=None):
 
 def rsi_filter_factor(df, rsi_len=14):
     try:
-        rs = rsi_fn(df['close'], rsi_len)
+        rs = df[f'rsi{rsi_len}'] if f'rsi{rsi_len}' in df else rsi_fn(df['close'], rsi_len)
         last = float(rs.iloc[-1])
         if last >= 70 or last <= 30:
             return 0.85, last
@@ -69,7 +76,7 @@ def rsi_filter_factor(df, rsi_len=14):
 
 def atr_target_pct(df, atr_len=14, mult=0.5):
     try:
-        a = atr_fn(df, atr_len)
+        a = df[f'atr{atr_len}'] if f'atr{atr_len}' in df else atr_fn(df, atr_len)
         atr_last = float(a.iloc[-1])
         price = float(df['close'].iloc[-1])
         tp_pct = (atr_last / (price + 1e-9)) * (mult * 100.0)
@@ -81,17 +88,18 @@ def detect_trend_phase(df, adx_len=14, volume_boom_mult=1.3):
     if df is None or df.empty or len(df) < adx_len + 5:
         return "Neutral", "gray", 0.0
 
-    adx_series = adx_fn(df, adx_len)
+    # use the shared feature-frame columns when present
+    adx_series = df[f'adx{adx_len}'] if f'adx{adx_len}' in df else adx_fn(df, adx_len)
     adx_now = float(adx_series.iloc[-1])
     adx_prev = float(adx_series.iloc[-2]) if len(adx_series) > 2 else adx_now
-    from modules.indicators import rsi as _rsi, ema as _ema
-    rsi_now = float(_rsi(df['close'], 14).iloc[-1])
+    rsi_series = df['rsi14'] if 'rsi14' in df else rsi_fn(df['close'], 14)
+    rsi_now = float(rsi_series.iloc[-1])
     v_now = float(df['volume'].iloc[-1])
-    v_avg = float(df['volume'].rolling(20).mean().iloc[-1] or 0.0)
+    v_avg = float((df['vol_ma20'] if 'vol_ma20' in df else df['volume'].rolling(20).mean()).iloc[-1] or 0.0)
 
-    ema20 = float(_ema(df['close'], 20).iloc[-1])
-    ema50 = float(_ema(df['close'], 50).iloc[-1])
-    ema100 = float(_ema(df['close'], 100).iloc[-1])
+    ema20 = float((df['ema20'] if 'ema20' in df else ema_fn(df['close'], 20)).iloc[-1])
+    ema50 = float((df['ema50'] if 'ema50' in df else ema_fn(df['close'], 50)).iloc[-1])
+    ema100 = float((df['ema100'] if 'ema100' in df else ema_fn(df['close'], 100)).iloc[-1])
 
     if adx_prev < 20 and adx_now > 20 and (v_avg > 0 and v_now > volume_boom_mult * v_avg):
         return "Start", "yellow", min(1.0, (adx_now/50.0))
@@ -119,19 +127,27 @@ def buy_sell_pressure(df, lookback=5):
         press = 0.0
     return press
 
-def direction_conf_quant(df, book=None, rsi_len=14, atr_len=14, atr_mult=0.5,
-                         depth_liq_bias=None, pressure=0.0):
+def candle_signals(df, rsi_len=14, atr_len=14, atr_mult=0.5):
+    # the part of direction_conf_quant that depends on the candles alone
     base_dir, base_conf = _base_dir_conf_last5(df)
     if base_dir is None:
-        return None, None, {}
+        return None
+    rsi_factor, rsi_last = rsi_filter_factor(df, rsi_len=rsi_len)
+    tp_pct, atr_last = atr_target_pct(df, atr_len=atr_len, mult=atr_mult)
+    return {'base_dir': base_dir, 'base_conf': base_conf, 'vol_str': _volume_strength(df),
+            'rsi_factor': rsi_factor, 'rsi': rsi_last, 'atr': atr_last, 'tp_pct': tp_pct,
+            'phase': detect_trend_phase(df)}
 
-    vol_str = _volume_strength(df)
+def direction_from_signals(sig, book=None, depth_liq_bias=None, pressure=0.0, depth_bands=None):
+    if sig is None:
+        return None, None, {}
+    base_dir, base_conf, vol_str = sig['base_dir'], sig['base_conf'], sig['vol_str']
 
     micro_dir, micro_conf, rel_spread, imbalance = (None, None, None, None)
     if book:
         micro_dir, micro_conf, rel_spread, imbalance = _micro_from_orderbook(
             book.get('bid'), book.get('ask'), book.get('bid_qty'), book.get('ask_qty'),
-            depth_liq_bias=depth_liq_bias
+            depth_liq_bias=depth_liq_bias, depth_bands=depth_bands
         )
 
     base_signed = (+base_conf) if base_dir == 1 else (-base_conf)
@@ -148,19 +164,15 @@ def direction_conf_quant(df, book=None, rsi_len=14, atr_len=14, atr_mult=0.5,
 
     dir_out = 1 if final_score >= 0 else 0
     conf_out = abs(final_score)
-
-    rsi_factor, rsi_last = rsi_filter_factor(df, rsi_len=rsi_len)
-    conf_out = max(0.0, min(1.0, conf_out * rsi_factor))
-
-    tp_pct, atr_last = atr_target_pct(df, atr_len=atr_len, mult=atr_mult)
-    phase, phase_color, phase_strength = detect_trend_phase(df)
+    conf_out = max(0.0, min(1.0, conf_out * sig['rsi_factor']))
+    phase, phase_color, phase_strength = sig['phase']
 
     extras = {
         'spread': rel_spread,
         'imbalance': imbalance,
-        'rsi': rsi_last,
-        'atr': atr_last,
-        'tp_pct': tp_pct,
+        'rsi': sig['rsi'],
+        'atr': sig['atr'],
+        'tp_pct': sig['tp_pct'],
         'trend_phase': phase,
         'trend_color': phase_color,
         'trend_strength': phase_strength,
@@ -169,3 +181,74 @@ def direction_conf_quant(df, book=None, rsi_len=14, atr_len=14, atr_mult=0.5,
     }
 
     return int(dir_out), float(conf_out), extras
+
+def direction_conf_quant(df, book=None, rsi_len=14, atr_len=14, atr_mult=0.5,
+                         depth_liq_bias=None, pressure=0.0, depth_bands=None):
+    return direction_from_signals(candle_signals(df, rsi_len, atr_len, atr_mult), book=book,
+                                  depth_liq_bias=depth_liq_bias, pressure=pressure, depth_bands=depth_bands)
+
+def feature_frame(df, rsi_len=14, atr_len=14, adx_len=14):
+    # One pass of every indicator/feature column read by the scoring functions above,
+    # ReversalTimer and MLNextMove. Columns already on the frame (e.g. maintained
+    # incrementally by the candle buffers) are reused as is.
+    if df is None or df.empty:
+        return df
+    d = df.copy()
+    c = pd.to_numeric(d['close'], errors='coerce')
+    o, h, l = d['open'], d['high'], d['low']
+    v = pd.to_numeric(d['volume'], errors='coerce')
+    cols = {
+        f'rsi{rsi_len}': lambda: rsi_fn(c, rsi_len),
+        'rsi14': lambda: rsi_fn(c, 14),
+        f'atr{atr_len}': lambda: atr_fn(d, atr_len),
+        f'adx{adx_len}': lambda: adx_fn(d, adx_len),
+        'ema20': lambda: ema_fn(c, 20),
+        'ema50': lambda: ema_fn(c, 50),
+        'ema100': lambda: ema_fn(c, 100),
+        'vol_m20': lambda: v.rolling(20, min_periods=10).mean(),
+        'vol_s20': lambda: v.rolling(20, min_periods=10).std(),
+        'vol_ma20': lambda: d['volume'].rolling(20).mean(),
+        'ret1': lambda: d['close'].pct_change(),
+        'ret3': lambda: d['close'].pct_change(3),
+        'ret5': lambda: d['close'].pct_change(5),
+        'atrp': lambda: (d['atr'] if 'atr' in d else d[f'atr{atr_len}']) / (d['close'] + 1e-9),
+        'mom': lambda: (d['close'] - o) / (o + 1e-9),
+        'rng': lambda: (h - l) / (o + 1e-9),
+        'volz': lambda: (d['volume'] / (d['vol_ma20'] + 1e-9)).clip(0, 10),
+        'hl_spread': lambda: (h - l) / (d['close'].shift(1).abs() + 1e-9),
+        'body': lambda: (d['close'] - o) / (o.abs() + 1e-9),
+        'vol_norm': lambda: d['volz'],
+    }
+    for name, fn in cols.items():
+        if name not in d:
+            d[name] = fn()
+    return d
+
+class FeatureCache:
+    # Feature frames per (symbol, timeframe), rebuilt only when the underlying candles
+    # change (new candle, revised last candle or a shifted window).
+    def __init__(self, rsi_len=14, atr_len=14, adx_len=14):
+        self.lens = {'rsi_len': rsi_len, 'atr_len': atr_len, 'adx_len': adx_len}
+        self.entries = {}
+
+    @staticmethod
+    def _signature(df):
+        last = df.iloc[-1]
+        return (len(df), df['close_time'].iloc[0], last['close_time'],
+                tuple(float(last[k]) for k in ('open', 'high', 'low', 'close', 'volume')))
+
+    def get(self, key, df):
+        if df is None or df.empty:
+            return df
+        sig = self._signature(df)
+        hit = self.entries.get(key)
+        if hit is not None and hit[0] == sig:
+            return hit[1]
+        out = feature_frame(df, **self.lens)
+        self.entries[key] = (sig, out)
+        return out
+
+    def retain(self, symbols):
+        keep = set(symbols)
+        for key in [k for k in self.entries if k[0] not in keep]:
+            del self.entries[key]
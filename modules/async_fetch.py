@@ -0,0 +1,153 @@
+import asyncio
+import random
+import threading
+import time
+
+import aiohttp
+from binance.error import ClientError, ServerError
+
+from modules.binance_client import TokenBucket, request_weight
+
+BASE_URL = "https://api.binance.com"
+PATHS = {'klines': '/api/v3/klines', 'book_ticker': '/api/v3/ticker/bookTicker', 'depth': '/api/v3/depth',
+         'ticker_24hr': '/api/v3/ticker/24hr', 'exchange_info': '/api/v3/exchangeInfo'}
+
+
+class AsyncLoop:
+    # An asyncio event loop on a daemon thread, so the threaded app can hand it
+    # coroutines: submit() returns a concurrent.futures.Future.
+    def __init__(self, name='aio'):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name=name, daemon=True)
+        self.thread.start()
+
+    def submit(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def run(self, coro, timeout=None):
+        return self.submit(coro).result(timeout)
+
+
+class AsyncSpot:
+    # Async counterpart of RateLimitedSpot for the public endpoints the sweep needs:
+    # one aiohttp session, at most `concurrency` requests in flight, a `timeout` per
+    # request, and the same weight bucket, 429/418 pause, jittered retries and
+    # coalescing of identical in-flight calls. Given the sync client as `limiter`,
+    # both share its bucket and Retry-After pause, so REST weight is counted once.
+    def __init__(self, base_url=None, limiter=None, weight_limit=6000, safety=0.8, concurrency=64, timeout=10,
+                 max_retries=4, base_delay=0.5, max_delay=30.0, metrics=None):
+        if base_url is None:
+            base_url = getattr(getattr(limiter, 'spot', None), 'base_url', None) or BASE_URL
+        self.base_url = base_url.rstrip('/')
+        self.limiter = limiter
+        self.weight_limit = limiter.weight_limit if limiter is not None else weight_limit
+        self.bucket = limiter.bucket if limiter is not None else TokenBucket(weight_limit * safety)
+        self.concurrency = concurrency
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.metrics = metrics if metrics is not None else getattr(limiter, 'metrics', None)
+        self._blocked_until = 0.0
+        self.session = None
+        self.sem = None
+        self.inflight = {}
+
+    @property
+    def blocked_until(self):
+        return self.limiter.blocked_until if self.limiter is not None else self._blocked_until
+
+    @blocked_until.setter
+    def blocked_until(self, t):
+        if self.limiter is not None:
+            self.limiter.blocked_until = t
+        else:
+            self._blocked_until = t
+
+    def _count(self, metric, name):
+        if self.metrics is not None:
+            self.metrics.inc(metric, endpoint=name)
+
+    async def _session(self):
+        # created on first use, inside the loop that will run it
+        if self.session is None:
+            self.session = aiohttp.ClientSession(timeout=self.timeout,
+                                                 connector=aiohttp.TCPConnector(limit=self.concurrency))
+            self.sem = asyncio.Semaphore(self.concurrency)
+        return self.session
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def klines(self, symbol, interval='1m', limit=500, startTime=None):
+        params = {'symbol': symbol, 'interval': interval, 'limit': limit}
+        if startTime is not None:
+            params['startTime'] = startTime
+        return await self.call('klines', **params)
+
+    async def book_ticker(self, symbol):
+        return await self.call('book_ticker', symbol=symbol)
+
+    async def depth(self, symbol, limit=100):
+        return await self.call('depth', symbol=symbol, limit=limit)
+
+    async def call(self, name, **params):
+        key = (name, tuple(sorted(params.items())))
+        task = self.inflight.get(key)
+        if task is not None:
+            self._count('fetch_coalesced_total', name)
+            return await asyncio.shield(task)
+        task = self.inflight[key] = asyncio.ensure_future(self._request(name, params))
+        task.add_done_callback(lambda _: self.inflight.pop(key, None))
+        return await asyncio.shield(task)
+
+    def _backoff(self, attempt):
+        d = min(self.max_delay, self.base_delay * 2 ** attempt)
+        return d / 2 + random.uniform(0, d / 2)
+
+    async def _request(self, name, params):
+        session = await self._session()
+        weight = request_weight(name, (), params)
+        url = self.base_url + PATHS[name]
+        for attempt in range(self.max_retries + 1):
+            pause = self.blocked_until - time.time()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            while True:
+                wait = self.bucket.reserve(weight)
+                if not wait:
+                    break
+                await asyncio.sleep(min(wait, 1.0))
+            try:
+                async with self.sem:
+                    async with session.get(url, params=params) as resp:
+                        body = await resp.json(content_type=None)
+                        status, header = resp.status, dict(resp.headers)
+            except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+                if attempt == self.max_retries:
+                    raise
+                self._count('fetch_retries_total', name)
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+            used = header.get('X-MBX-USED-WEIGHT-1M')
+            if used is not None:
+                self.bucket.sync(int(used), self.weight_limit)
+                if self.metrics is not None:
+                    self.metrics.gauge('used_weight_1m', int(used))
+            if status < 400:
+                return body
+            if status >= 500:
+                if attempt == self.max_retries:
+                    raise ServerError(status, str(body))
+                self._count('fetch_retries_total', name)
+                await asyncio.sleep(self._backoff(attempt))
+                continue
+            err = body if isinstance(body, dict) else {}
+            if status not in (429, 418) or attempt == self.max_retries:
+                raise ClientError(status, err.get('code'), err.get('msg'), header, body)
+            retry_after = float(header.get('Retry-After') or self._backoff(attempt))
+            self.blocked_until = max(self.blocked_until, time.time() + retry_after)
+            self._count('fetch_throttled_total', name)
+            print(f"[WARN] {name}: HTTP {status}, pausing all requests for {retry_after:.0f}s")
@@ -0,0 +1,227 @@
+import argparse
+import json
+import multiprocessing
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from modules.candle_store import CandleBuffer, rollup
+from modules.disk_store import CandleDisk, INTERVAL_MS
+from modules.temporal_predictor import PooledReversal
+
+# Replays stored candles through the live pipeline (app.compute_from_inputs, the same
+# feature cache, wave trackers, ReversalTimer and rec_from_payload) one closed 1m candle
+# at a time and scores the output against what happened next:
+#   - per-timeframe direction hit rate over the next 1/5/10 minutes
+#   - recommendation hit rate over its duration_min
+#   - reversal timing error of pred_minutes against the realised ReversalTimer label
+# With REV_MODE=pooled each replay gets its own PooledReversal, fitted synchronously on
+# the candle clock, so results are repeatable and no other symbol's rows leak in.
+# Candles come from a CandleDisk directory (CANDLE_DIR). Book snapshots are optional,
+# one JSON object per line: {"symbol", "time" (ms), "bid", "ask", "bid_qty", "ask_qty",
+# "liq_bias", "bands"}; each step uses the latest one not older than book_max_age.
+#   python -m modules.backtest data --symbols BTCUSDT,ETHUSDT --start 2026-01-01 --end 2026-03-01
+
+HORIZON = {'1m': 1, '5m': 5, '10m': 10}
+BUY, SELL = "شراء", "بيع"
+
+
+def _ms(day):
+    return int(pd.Timestamp(day, tz='UTC').value // 1_000_000) if day else None
+
+
+def load_books(path):
+    rows = defaultdict(list)
+    with open(path) as fh:
+        for line in fh:
+            if line.strip():
+                b = json.loads(line)
+                rows[b['symbol']].append(b)
+    out = {}
+    for sym, bs in rows.items():
+        bs.sort(key=lambda b: b['time'])
+        out[sym] = (np.array([b['time'] for b in bs], dtype=np.int64), bs)
+    return out
+
+
+def _frame(live, cols, sym, interval):
+    buf = CandleBuffer(len(cols['open_time']), live.KLINE_INDICATORS)
+    buf.seed(cols)
+    return live.klines_frame(buf, sym, interval)
+
+
+def _book_at(books, t, max_age):
+    if books is None:
+        return None, None
+    times, bs = books
+    k = int(np.searchsorted(times, t, side='right')) - 1
+    if k < 0 or t - times[k] > max_age:
+        return None, None
+    b = bs[k]
+    depth = {'liq_bias': b.get('liq_bias', 0.0)}
+    if b.get('bands'):
+        depth['bands'] = {int(k): v for k, v in b['bands'].items()}
+    return {c: b[c] for c in ('bid', 'ask', 'bid_qty', 'ask_qty')}, depth
+
+
+def replay_symbol(root, sym, start_ms=None, end_ms=None, step=1, books=None, book_max_age=120_000, refit_every=None):
+    import app as live  # the live pipeline and its settings; imported per worker process
+    disk = CandleDisk(root)
+    c1 = disk.load_range(sym, '1m', start_ms, end_ms, warmup=live.LOOKBACK_1M)
+    stats = {'symbol': sym, 'steps': 0, 'candles': 0, 'seconds': 0.0,
+             'dir': {tf: [0, 0] for tf in HORIZON}, 'rec': [0, 0], 'rec_ret': 0.0, 'rev_err': [0.0, 0]}
+    if c1 is None or not len(c1['open_time']):
+        return stats
+    df1 = _frame(live, c1, sym, '1m')
+    close = df1['close'].to_numpy()
+    t1 = c1['close_time']
+    n = len(df1)
+    # higher timeframes are rolled up step by step from the 1m candles, as the live store does
+    rolls = {tf: CandleBuffer(live.TIMEFRAME_ROWS, live.KLINE_INDICATORS) for tf in live.TIMEFRAMES}
+    prev = None
+    timer = live.timer_cache.default_factory()
+    timer.async_fit = False
+    models = {tf: live.ml_models.default_factory() for tf in ('1m',) + live.TIMEFRAMES} if live.ML_PROB else None
+    pool = None
+    if live.REV_MODE == 'pooled':
+        pool = PooledReversal(max_forward=live.REV_MAX_FWD, min_rows=live.ML_MIN_SAMPLES,
+                              refit_seconds=live.REV_POOL_REFIT_SECONDS, rows_per_symbol=live.ML_LOOKBACK,
+                              estimator=live.REV_ESTIMATOR, async_fit=False)
+    if refit_every is not None:
+        # 0 skips the reversal model entirely, for fast sweeps over the direction signals
+        timer.refit_every = refit_every
+        timer.min_rows = timer.min_rows if refit_every > 0 else float('inf')
+        if pool is not None and refit_every == 0:
+            pool.min_rows = float('inf')
+    actual_rev = timer._labels(df1).to_numpy()
+    # without a start date the first LOOKBACK_1M candles are warm-up only
+    first = int(np.searchsorted(c1['open_time'], start_ms)) if start_ms is not None else live.LOOKBACK_1M - 1
+    started = time.perf_counter()
+    for i in range(first, n, step):
+        lo = max(0, i + 1 - live.LOOKBACK_1M)
+        window = {c: v[lo:i + 1] for c, v in c1.items()}
+        for tf, buf in rolls.items():
+            rollup(buf, window, INTERVAL_MS[tf], since=None if prev is None else c1['open_time'][prev + 1])
+        prev = i
+        book, depth = _book_at(books, int(t1[i]), book_max_age)
+        inputs = {'df1': df1.iloc[lo:i + 1], 'book': book, 'depth': depth,
+                  'versions': {tf: buf.version for tf, buf in rolls.items()},
+                  'frames': {tf: live.klines_frame(buf, sym, tf) for tf, buf in rolls.items()}}
+        if pool is None:
+            core, extras = live.compute_from_inputs(sym, inputs, timer=timer, models=models)
+        else:
+            core, extras = live.compute_from_inputs(sym, inputs, models=models, reversal=False)
+            rev = pool.rows(live.feature_cache.get((sym, '1m'), inputs['df1']).tail(live.ML_LOOKBACK))
+            extras['pred_minutes'] = pool.fit_predict_minutes_many([sym], [rev], now=int(t1[i]) / 1000.0)[0]
+        stats['steps'] += 1
+        if not core:
+            continue
+        for tf, h in HORIZON.items():
+            if tf in core and i + h < n and close[i + h] != close[i]:
+                up = close[i + h] > close[i]
+                stats['dir'][tf][0] += int(up == (core[tf]['dir'] == 1))
+                stats['dir'][tf][1] += 1
+        rec = live.rec_from_payload(core, threshold=live.REC_CONF_THRESHOLD, min_minutes=live.REC_MIN_MINUTES,
+                                    max_minutes=live.REC_MAX_MINUTES, pred_minutes=extras.get('pred_minutes'))
+        j = i + rec['duration_min']
+        if rec['action'] in (BUY, SELL) and j < n:
+            ret = (close[j] - close[i]) / close[i] * (1 if rec['action'] == BUY else -1)
+            stats['rec'][0] += int(ret > 0)
+            stats['rec'][1] += 1
+            stats['rec_ret'] += ret
+        pm = extras.get('pred_minutes')
+        if pm is not None and i + timer.max_forward < n:
+            stats['rev_err'][0] += abs(pm - actual_rev[i])
+            stats['rev_err'][1] += 1
+    stats['seconds'] = time.perf_counter() - started
+    stats['candles'] = max(0, n - first)
+    live.feature_cache.retain([])
+    for key in [k for k in live.wave_trackers if k[0] == sym]:
+        del live.wave_trackers[key]
+    return stats
+
+
+def _rate(hit_total):
+    return hit_total[0] / hit_total[1] if hit_total[1] else None
+
+
+def summarize(results, wall):
+    tot = {'steps': 0, 'candles': 0, 'dir': {tf: [0, 0] for tf in HORIZON}, 'rec': [0, 0],
+           'rec_ret': 0.0, 'rev_err': [0.0, 0]}
+    for r in results:
+        tot['steps'] += r['steps']; tot['candles'] += r['candles']
+        for tf in HORIZON:
+            tot['dir'][tf][0] += r['dir'][tf][0]; tot['dir'][tf][1] += r['dir'][tf][1]
+        for key in ('rec', 'rev_err'):
+            tot[key][0] += r[key][0]; tot[key][1] += r[key][1]
+        tot['rec_ret'] += r['rec_ret']
+    return {
+        'symbols': len(results),
+        'steps': tot['steps'],
+        'candles': tot['candles'],
+        'seconds': round(wall, 3),
+        'candles_per_sec': round(tot['candles'] / wall, 1) if wall > 0 else None,
+        'steps_per_sec': round(tot['steps'] / wall, 1) if wall > 0 else None,
+        'dir_hit_rate': {tf: _rate(tot['dir'][tf]) for tf in HORIZON},
+        'dir_samples': {tf: tot['dir'][tf][1] for tf in HORIZON},
+        'rec_hit_rate': _rate(tot['rec']),
+        'rec_trades': tot['rec'][1],
+        'rec_mean_ret_pct': tot['rec_ret'] / tot['rec'][1] * 100.0 if tot['rec'][1] else None,
+        'rev_mae_min': _rate(tot['rev_err']),
+        'rev_samples': tot['rev_err'][1],
+    }
+
+
+def _chunks(start_ms, end_ms, parts):
+    if parts <= 1 or start_ms is None or end_ms is None:
+        return [(start_ms, end_ms)]
+    edges = np.linspace(start_ms, end_ms, parts + 1).astype(np.int64)
+    return list(zip(edges[:-1].tolist(), edges[1:].tolist()))
+
+
+def run(root, symbols, start=None, end=None, step=1, workers=1, chunks=1, books_path=None, refit_every=None):
+    # Each (symbol, date chunk) is an independent task; a chunk warms up on the
+    # candles right before it, so model state restarts at chunk boundaries.
+    books = load_books(books_path) if books_path else {}
+    tasks = [(sym, a, b) for sym in symbols for a, b in _chunks(_ms(start), _ms(end), chunks)]
+    started = time.perf_counter()
+    results = []
+    if workers <= 1:
+        for sym, a, b in tasks:
+            results.append(replay_symbol(root, sym, a, b, step, books.get(sym), refit_every=refit_every))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn')) as pool:
+            futs = {pool.submit(replay_symbol, root, sym, a, b, step, books.get(sym), refit_every=refit_every): sym for sym, a, b in tasks}
+            for fut in as_completed(futs):
+                try:
+                    results.append(fut.result())
+                except Exception as e:
+                    print(f"[WARN] backtest failed for {futs[fut]}: {e}")
+    return summarize(results, time.perf_counter() - started), results
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument('root', help='CandleDisk directory (CANDLE_DIR)')
+    ap.add_argument('--symbols', help='comma separated, default: every symbol under root')
+    ap.add_argument('--start')
+    ap.add_argument('--end')
+    ap.add_argument('--step', type=int, default=1, help='evaluate every Nth 1m candle')
+    ap.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    ap.add_argument('--chunks', type=int, default=1, help='split the date range per symbol')
+    ap.add_argument('--books', help='book snapshot JSONL')
+    ap.add_argument('--refit-every', type=int, help='override REV_REFIT_EVERY, 0 disables the reversal model')
+    ap.add_argument('--json', help='write the summary and per-symbol stats here')
+    args = ap.parse_args()
+    syms = args.symbols.split(',') if args.symbols else sorted(
+        d for d in os.listdir(args.root) if os.path.isdir(os.path.join(args.root, d)))
+    summary, per_symbol = run(args.root, syms, args.start, args.end, args.step, args.workers, args.chunks, args.books,
+                                args.refit_every)
+    print(json.dumps(summary, indent=2, ensure_ascii=False))
+    if args.json:
+        with open(args.json, 'w') as fh:
+            json.dump({'summary': summary, 'symbols': per_symbol}, fh, indent=2)
@@ -0,0 +1,211 @@
+import numpy as np
+
+from modules.indicators import rsi as rsi_fn, atr as atr_fn, ema as ema_fn, adx as adx_fn
+
+# Whole-universe counterparts of data_features.direction_conf_quant and
+# buy_sell_pressure. The tail of every frame is stacked right-aligned into
+# (frames x WINDOW) arrays, NaN-padded when a frame is shorter, and each scoring rule
+# becomes a handful of array expressions. The rules only look at the last WINDOW
+# rows plus the last values of the indicator columns, which the candle buffers keep
+# up to date; a frame without one of them gets it computed the way feature_frame
+# would. The arithmetic follows the scalar code operation by operation (including
+# how Python's min/max treat NaN), so results match it to floating-point rounding
+# of the 5/20-row means.
+#   dirs, confs, extras = zip(*score(frames, books, liq_biases, pressures, bands))
+# score() is candles() (the frame-only half, cacheable per frame) followed by combine().
+
+WINDOW = 20
+PHASES = (("Neutral", "gray"), ("Start", "yellow"), ("In Progress", "green"), ("End", "red"))
+CANDLE_FIELDS = ('base_up', 'base_conf', 'vol_str', 'rsi', 'rsi_factor', 'atr', 'tp_pct', 'phase', 'strength')
+
+
+def _pymin(a, b):
+    # min(a, b) as Python evaluates it: a unless b < a (so a NaN b is ignored)
+    return np.where(b < a, b, a)
+
+
+def _pymax(a, b):
+    return np.where(b > a, b, a)
+
+
+def _clip01(x):
+    return _pymax(0.0, _pymin(1.0, x))
+
+
+def _column(df, name):
+    if name in df:
+        return df[name].to_numpy()
+    if name.startswith('rsi'):
+        return rsi_fn(df['close'], int(name[3:]))
+    if name.startswith('atr'):
+        return atr_fn(df, int(name[3:]))
+    if name.startswith('adx'):
+        return adx_fn(df, int(name[3:]))
+    if name.startswith('ema'):
+        return ema_fn(df['close'], int(name[3:]))
+    raise KeyError(name)
+
+
+def stack(frames, cols, window=WINDOW):
+    # -> ({col: (n, window) float array}, lengths)
+    out = {c: np.full((len(frames), window), np.nan) for c in cols}
+    n = np.zeros(len(frames), dtype=np.int64)
+    for i, df in enumerate(frames):
+        if df is None or not len(df):
+            continue
+        n[i] = len(df)
+        for c in cols:
+            a = np.asarray(_column(df, c)[-window:], dtype=np.float64)
+            out[c][i, window - len(a):] = a
+    return out, n
+
+
+def pressure(frames, lookback=5):
+    # buy_sell_pressure for every frame
+    a, n = stack(frames, ('close', 'volume'), lookback + 1)
+    c = a['close'][:, -(lookback + 1):]
+    v = a['volume'][:, -(lookback + 1):]
+    price_dir = np.nan_to_num(np.sign(np.diff(c, axis=1)), nan=0.0).sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        vc = v[:, 1:] / v[:, :-1] - 1
+    vol_change = np.where(np.isnan(vc), 0.0, vc).sum(axis=1)
+    press = np.where((price_dir > 0) & (vol_change > 0), 1.0, np.where((price_dir < 0) & (vol_change > 0), -1.0, 0.0))
+    return np.where(n < lookback + 1, 0.0, press)
+
+
+def _volume_strength(v, n):
+    # rolling(20, min_periods=10) mean/std of volume at the last row
+    cnt = (~np.isnan(v)).sum(axis=1)
+    filled = np.where(np.isnan(v), 0.0, v)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        m = filled.sum(axis=1) / cnt
+        dev = np.where(np.isnan(v), 0.0, (v - m[:, None]) ** 2)
+        s = np.sqrt(dev.sum(axis=1) / (cnt - 1))
+    m = np.where(cnt >= 10, m, np.nan)
+    s = np.where(cnt >= 10, s, np.nan)
+    m_last = np.where(np.isnan(m), 0.0, m)
+    s_last = np.where(np.isnan(s), 1e-6, s)
+    z = (v[:, -1] - m_last) / np.where(s_last != 0, s_last, 1e-6)
+    z_norm = (_pymax(-3.0, _pymin(3.0, z)) + 3.0) / 6.0
+    return np.where(n < 5, 0.0, _clip01(z_norm))
+
+
+def _micro(books, liq_biases, bands):
+    k = len(books)
+    bid, ask, bq, aq, eff = (np.full(k, np.nan) for _ in range(5))
+    has = np.zeros(k, dtype=bool)
+    for i, book in enumerate(books):
+        if not book:
+            continue
+        try:
+            bid[i], ask[i] = float(book.get('bid')), float(book.get('ask'))
+            bq[i], aq[i] = float(book.get('bid_qty') or 0.0), float(book.get('ask_qty') or 0.0)
+        except Exception:
+            continue
+        has[i] = True
+        b = bands[i]
+        if b:
+            w = sum(1.0/x for x in b)
+            eff[i] = sum(v/x for x, v in b.items()) / w
+        elif liq_biases[i] is not None:
+            eff[i] = liq_biases[i]
+    with np.errstate(invalid='ignore'):
+        valid = has & (bid > 0) & (ask > 0) & (ask > bid)
+    mid = 0.5 * (bid + ask)
+    rel_spread = (ask - bid) / (mid + 1e-9)
+    imbalance = (bq - aq) / ((bq + aq) + 1e-9)
+    imbalance = np.where(np.isnan(eff), imbalance, 0.5*imbalance + 0.5*eff)
+    tightness = 1.0 - _pymax(0.0, _pymin(1.0, rel_spread / 0.001))
+    micro_conf = _clip01((np.abs(imbalance) * 0.7) + (tightness * 0.3))
+    micro_signed = np.where(valid, np.where(imbalance > 0, micro_conf, -micro_conf), 0.0)
+    return valid, micro_signed, rel_spread, imbalance
+
+
+def _trend_phase(a, n, adx_len=14, volume_boom_mult=1.3):
+    adx_now, adx_prev = a[f'adx{adx_len}'][:, -1], a[f'adx{adx_len}'][:, -2]
+    rsi_now = a['rsi14'][:, -1]
+    v_now = a['volume'][:, -1]
+    v_avg = np.where(n >= 20, a['volume'].mean(axis=1), np.nan)
+    e20, e50, e100 = a['ema20'][:, -1], a['ema50'][:, -1], a['ema100'][:, -1]
+    with np.errstate(invalid='ignore'):
+        start = (adx_prev < 20) & (adx_now > 20) & (v_avg > 0) & (v_now > volume_boom_mult * v_avg)
+        trending = (25 < adx_now) & (adx_now <= 45)
+        progress = (((e20 > e50) & (e50 > e100) & trending & (55 <= rsi_now) & (rsi_now <= 70)) |
+                    ((e20 < e50) & (e50 < e100) & trending & (30 <= rsi_now) & (rsi_now <= 45)))
+        end = (adx_now < adx_prev) & ((rsi_now > 70) | (rsi_now < 30))
+    phase = np.select([start, progress, end], [1, 2, 3], 0)
+    short = n < adx_len + 5
+    return np.where(short, 0, phase), np.where(short, 0.0, _pymin(1.0, adx_now / 50.0))
+
+
+def candles(frames, rsi_len=14, atr_len=14, atr_mult=0.5, adx_len=14):
+    # The candle-only half of the scoring: one tuple of CANDLE_FIELDS per frame (None
+    # for frames under 5 rows). It changes only with the frame, so callers can keep
+    # it between sweeps; combine() adds the book, depth and pressure every time.
+    if not len(frames):
+        return []
+    cols = ('open', 'close', 'volume', f'rsi{rsi_len}', 'rsi14', f'atr{atr_len}', f'adx{adx_len}',
+            'ema20', 'ema50', 'ema100')
+    a, n = stack(frames, dict.fromkeys(cols))
+    o5, c5 = a['open'][:, -5:], a['close'][:, -5:]
+    ups, downs = (c5 > o5).sum(axis=1), (c5 < o5).sum(axis=1)
+    base_up = np.where(ups == downs, c5[:, -1] > o5[:, -1], ups > downs)
+    body = np.abs(c5 - o5)
+    avg_body = body.mean(axis=1)
+    base_conf = _clip01(body[:, -1] / np.where(avg_body == 0, 1e-6, avg_body))
+    vol_str = _volume_strength(a['volume'], n)
+    rsi_last = a[f'rsi{rsi_len}'][:, -1]
+    with np.errstate(invalid='ignore'):
+        rsi_factor = np.where((rsi_last >= 70) | (rsi_last <= 30), 0.85,
+                              np.where(((60 <= rsi_last) & (rsi_last < 70)) | ((30 < rsi_last) & (rsi_last <= 40)), 0.93, 1.0))
+    atr_last = a[f'atr{atr_len}'][:, -1]
+    tp_pct = _pymax(0.01, (atr_last / (a['close'][:, -1] + 1e-9)) * (atr_mult * 100.0))
+    phase, strength = _trend_phase(a, n, adx_len)
+    table = np.column_stack([base_up, base_conf, vol_str, rsi_last, rsi_factor, atr_last, tp_pct, phase, strength])
+    return [tuple(row) if n[i] >= 5 else None for i, row in enumerate(table.tolist())]
+
+
+def combine(parts, books, liq_biases, pressures, bands):
+    # candles() output plus the per-sweep inputs -> [(dir, conf, extras)]
+    k = len(parts)
+    if not k:
+        return []
+    ok = np.array([p is not None for p in parts])
+    t = np.array([p if p is not None else (np.nan,) * len(CANDLE_FIELDS) for p in parts], dtype=np.float64)
+    base_up, base_conf, vol_str, rsi_last, rsi_factor, atr_last, tp_pct, phase, strength = t.T
+    base_up = base_up == 1.0
+
+    valid, micro_signed, rel_spread, imbalance = _micro(books, liq_biases, bands)
+    base_signed = np.where(base_up, base_conf, -base_conf)
+    vol_signed = (vol_str * 0.6 + 0.4*base_conf) * np.where(base_up, 1.0, -1.0)
+    liq_signed = np.array([b or 0.0 for b in liq_biases], dtype=np.float64)
+    press = np.asarray(pressures, dtype=np.float64)
+    final = (0.50 * base_signed) + (0.15 * micro_signed) + (0.20 * vol_signed) + (0.15 * (0.5*liq_signed + 0.5*press))
+    final = _pymax(-1.0, _pymin(1.0, final))
+    conf = _clip01(np.abs(final) * rsi_factor)
+
+    out = []
+    for i in range(k):
+        if not ok[i]:
+            out.append((None, None, {}))
+            continue
+        name, color = PHASES[int(phase[i])]
+        out.append((int(final[i] >= 0), float(conf[i]), {
+            'spread': float(rel_spread[i]) if valid[i] else None,
+            'imbalance': float(imbalance[i]) if valid[i] else None,
+            'rsi': float(rsi_last[i]),
+            'atr': float(atr_last[i]),
+            'tp_pct': float(tp_pct[i]),
+            'trend_phase': name,
+            'trend_color': color,
+            'trend_strength': float(strength[i]),
+            'liq_bias': liq_biases[i],
+            'pressure': pressures[i],
+        }))
+    return out
+
+
+def score(frames, books, liq_biases, pressures, bands, rsi_len=14, atr_len=14, atr_mult=0.5, adx_len=14):
+    # One (dir, conf, extras) per frame, as direction_conf_quant(frames[i], book=books[i],
+    # depth_liq_bias=liq_biases[i], pressure=pressures[i], depth_bands=bands[i], ...).
+    return combine(candles(frames, rsi_len, atr_len, atr_mult, adx_len), books, liq_biases, pressures, bands)
@@ -1,18 +1,187 @@
-import pandas as pd
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from binance.error import ClientError, ServerError
 from binance.spot import Spot
 
-def make_client(timeout=10, api_key=None, api_secret=None):
-    return Spot(api_key=api_key, api_secret=api_secret, timeout=timeout)
+from modules.kline_codec import decode_klines, frame_from_columns
+
+# request weights of the public endpoints used here (Binance spot, per call)
+DEPTH_WEIGHTS = ((100, 5), (500, 25), (1000, 50), (5000, 250))
+
+
+def request_weight(name, args, kwargs):
+    single = bool(args) or kwargs.get('symbol')
+    if name == 'depth':
+        limit = int(kwargs.get('limit', 100))
+        return next((w for lim, w in DEPTH_WEIGHTS if limit <= lim), 250)
+    if name == 'ticker_24hr':
+        return 2 if single else 80
+    if name in ('book_ticker', 'ticker_price'):
+        return 2 if single else 4
+    if name == 'exchange_info':
+        return 20
+    return 2
+
+
+class TokenBucket:
+    # Request-weight budget shared by all threads: `capacity` tokens refilled evenly
+    # over `window` seconds. sync() lowers the level to what the server reports as
+    # used, so other processes on the same IP are accounted for too.
+    def __init__(self, capacity, window=60.0):
+        self.capacity = float(capacity)
+        self.rate = self.capacity / window
+        self.tokens = self.capacity
+        self.stamp = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.stamp) * self.rate)
+        self.stamp = now
+
+    def reserve(self, n):
+        # takes n tokens and returns 0, or returns how long to wait before trying again
+        with self.lock:
+            self._refill()
+            if self.tokens >= n:
+                self.tokens -= n
+                return 0.0
+            return (n - self.tokens) / self.rate
+
+    def take(self, n):
+        while True:
+            wait = self.reserve(n)
+            if not wait:
+                return
+            time.sleep(min(wait, 1.0))
+
+    def sync(self, used, limit):
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.tokens, self.capacity - used * self.capacity / limit)
+
+
+class _Flight:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class RateLimitedSpot:
+    # Drop-in wrapper around binance.spot.Spot: client.klines(...) etc. go through a
+    # shared weight bucket (`safety` share of `weight_limit` per minute), honour
+    # X-MBX-USED-WEIGHT-1M, stop every thread on 429/418 until Retry-After, retry
+    # server/network errors with jittered exponential backoff and collapse identical
+    # concurrent calls into one request. Other 4xx errors are raised immediately.
+    def __init__(self, spot=None, weight_limit=6000, safety=0.8, pool_size=32, max_retries=4,
+                 base_delay=0.5, max_delay=30.0, metrics=None, **spot_kwargs):
+        self.spot = spot if spot is not None else Spot(show_header=True, **spot_kwargs)
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        self.spot.session.mount('https://', adapter)
+        self.spot.session.mount('http://', adapter)
+        self.weight_limit = weight_limit
+        self.bucket = TokenBucket(weight_limit * safety)
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.metrics = metrics
+        self.blocked_until = 0.0
+        self.inflight = {}
+        self.lock = threading.Lock()
+
+    def __getattr__(self, name):
+        attr = getattr(self.spot, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            return self.call(name, *args, **kwargs)
+        call.__name__ = name
+        return call
+
+    def _count(self, metric, name):
+        if self.metrics is not None:
+            self.metrics.inc(metric, endpoint=name)
+
+    def call(self, name, *args, **kwargs):
+        key = (name, args, tuple(sorted(kwargs.items())))
+        try:
+            hash(key)
+        except TypeError:
+            return self._request(name, args, kwargs)
+        with self.lock:
+            flight = self.inflight.get(key)
+            owner = flight is None
+            if owner:
+                flight = self.inflight[key] = _Flight()
+        if not owner:
+            self._count('fetch_coalesced_total', name)
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = self._request(name, args, kwargs)
+            return flight.result
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self.lock:
+                del self.inflight[key]
+            flight.done.set()
+
+    def _backoff(self, attempt):
+        d = min(self.max_delay, self.base_delay * 2 ** attempt)
+        return d / 2 + random.uniform(0, d / 2)
+
+    def _request(self, name, args, kwargs):
+        fn = getattr(self.spot, name)
+        weight = request_weight(name, args, kwargs)
+        for attempt in range(self.max_retries + 1):
+            pause = self.blocked_until - time.time()
+            if pause > 0:
+                time.sleep(pause)
+            self.bucket.take(weight)
+            try:
+                resp = fn(*args, **kwargs)
+            except ClientError as e:
+                if e.status_code not in (429, 418) or attempt == self.max_retries:
+                    raise
+                retry_after = float((e.header or {}).get('Retry-After') or self._backoff(attempt))
+                self.blocked_until = max(self.blocked_until, time.time() + retry_after)
+                self._count('fetch_throttled_total', name)
+                print(f"[WARN] {name}: HTTP {e.status_code}, pausing all requests for {retry_after:.0f}s")
+                continue
+            except (ServerError, requests.RequestException):
+                if attempt == self.max_retries:
+                    raise
+                self._count('fetch_retries_total', name)
+                time.sleep(self._backoff(attempt))
+                continue
+            if isinstance(resp, dict) and 'header' in resp and 'data' in resp:
+                used = resp['header'].get('X-MBX-USED-WEIGHT-1M')
+                if used is not None:
+                    self.bucket.sync(int(used), self.weight_limit)
+                    if self.metrics is not None:
+                        self.metrics.gauge('used_weight_1m', int(used))
+                return resp['data']
+            return resp
+
+
+def make_client(timeout=10, api_key=None, api_secret=None, **kwargs):
+    return RateLimitedSpot(api_key=api_key, api_secret=api_secret, timeout=timeout, **kwargs)
 
 def fetch_klines(client, symbol, interval='1m', limit=900):
     kl = client.klines(symbol, interval=interval, limit=limit)
-    df = pd.DataFrame([{
-        'open_time': pd.to_datetime(r[0], unit='ms', utc=True),
-        'open': float(r[1]), 'high': float(r[2]), 'low': float(r[3]),
-        'close': float(r[4]), 'volume': float(r[5]),
-        'close_time': pd.to_datetime(r[6], unit='ms', utc=True),
-    } for r in kl])
-    return df
+    return frame_from_columns(decode_klines(kl))
 
 def fetch_book(client, symbol):
     bt = client.book_ticker(symbol)
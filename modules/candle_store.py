@@ -0,0 +1,343 @@
+import asyncio
+import itertools
+import threading
+import time
+from collections import deque
+
+import numpy as np
+import pandas as pd
+
+from modules.kline_codec import PRICE_COLS, decode_klines, frame_from_columns
+from modules.disk_store import INTERVAL_MS, run_start
+
+TIME_COLS = ('open_time', 'close_time')
+_versions = itertools.count(1)
+
+
+def aggregate(cols, step):
+    # Sorted base candles -> `step`-ms candles keyed by bucket open time. The last
+    # bucket may be partial (still forming), like the open candle Binance returns.
+    ot = cols['open_time']
+    if not len(ot):
+        return {c: v[:0] for c, v in cols.items()}
+    b = ot - ot % step
+    idx = np.flatnonzero(np.r_[True, b[1:] != b[:-1]])
+    last = np.r_[idx[1:], len(ot)] - 1
+    return {'open_time': b[idx], 'open': cols['open'][idx],
+            'high': np.maximum.reduceat(cols['high'], idx), 'low': np.minimum.reduceat(cols['low'], idx),
+            'close': cols['close'][last], 'volume': np.add.reduceat(cols['volume'], idx),
+            'close_time': b[idx] + step - 1}
+
+
+def rollup(buf, cols, step, since=None):
+    # Merge base candles into the higher-interval buffer `buf`, starting from the bucket
+    # holding `since` (default: the first full bucket of `cols`). A bucket whose start
+    # is older than the base window is skipped rather than stored incomplete.
+    ot = cols['open_time']
+    if not len(ot):
+        return
+    t = int(ot[0]) if since is None else int(since)
+    b = t - t % step
+    if ot[0] > b:
+        b += step
+    i = int(np.searchsorted(ot, b))
+    if i < len(ot):
+        buf.upsert(aggregate({c: v[i:] for c, v in cols.items()}, step))
+
+
+class CandleBuffer:
+    # Columns live in preallocated arrays of 2*capacity rows; the live window is
+    # [start:end). When the end is reached the window is compacted to the front,
+    # so appends are amortized O(1) and every column stays a contiguous view.
+    # `indicators` maps a column name to a factory for a streaming indicator from
+    # modules.indicators; those columns are updated as rows are appended or revised.
+    # `version` is drawn from a process-wide counter whenever the window's content
+    # changes (re-sent identical rows leave it alone), so it can key derived results.
+    REWIND = 16
+
+    def __init__(self, capacity: int, indicators=None):
+        self.capacity = max(1, int(capacity))
+        size = 2 * self.capacity
+        self.cols = {c: np.zeros(size, dtype=np.int64) for c in TIME_COLS}
+        self.cols.update({c: np.zeros(size, dtype=np.float64) for c in PRICE_COLS})
+        self.factories = dict(indicators or {})
+        self.ind_cols = {c: np.full(size, np.nan) for c in self.factories}
+        self.indicators = {}
+        self.hist = deque(maxlen=self.REWIND)  # (row seq, indicator states) after each tail row
+        self.seq = 0
+        self.start = 0
+        self.end = 0
+        self.version = next(_versions)
+        self.lock = threading.RLock()
+
+    def __len__(self):
+        return self.end - self.start
+
+    def view(self, col):
+        arr = self.cols[col] if col in self.cols else self.ind_cols[col]
+        return arr[self.start:self.end]
+
+    @property
+    def last_open_time(self):
+        return int(self.cols['open_time'][self.end - 1]) if len(self) else None
+
+    def clear(self):
+        with self.lock:
+            self.start = self.end = 0
+            self.hist.clear()
+            self.version = next(_versions)
+
+    def _compact(self):
+        n = len(self)
+        for arr in list(self.cols.values()) + list(self.ind_cols.values()):
+            arr[:n] = arr[self.start:self.end]
+        self.start, self.end = 0, n
+
+    def _recompute(self, i0):
+        # Bring indicator columns up to date from window row i0 onward, resuming from
+        # the saved state of row i0-1 when it is still in the rewind history.
+        if not self.factories or i0 >= len(self):
+            return
+        first_seq = self.seq - len(self)
+        saved = None
+        if i0 > 0:
+            saved = next((st for q, st in self.hist if q == first_seq + i0 - 1), None)
+        if saved is None:
+            i0 = 0
+            self.indicators = {c: f() for c, f in self.factories.items()}
+        else:
+            for c, ind in self.indicators.items():
+                ind.restore(saved[c])
+        while self.hist and self.hist[-1][0] >= first_seq + i0:
+            self.hist.pop()
+        src = {c: self.view(c) for c in ('high', 'low', 'close')}
+        for i in range(i0, len(self)):
+            for c, ind in self.indicators.items():
+                self.ind_cols[c][self.start + i] = ind.update(*[src[k][i] for k in ind.inputs])
+            if i >= len(self) - self.REWIND:
+                self.hist.append((first_seq + i, {c: ind.state for c, ind in self.indicators.items()}))
+
+    def _write(self, pos, cols, k):
+        for c, arr in self.cols.items():
+            arr[pos] = cols[c][k]
+
+    def _append(self, cols, k):
+        if self.end == len(self.cols['open_time']):
+            self._compact()
+        self._write(self.end, cols, k)
+        self.end += 1
+        self.seq += 1
+        if len(self) > self.capacity:
+            self.start += 1
+
+    def upsert(self, cols):
+        # Rows must be sorted by open_time. Rows matching a stored candle revise it,
+        # newer rows are appended, rows older than the window are ignored.
+        with self.lock:
+            self._upsert(cols)
+
+    def _upsert(self, cols):
+        ot = cols['open_time']
+        changed = None
+        for k in range(len(ot)):
+            last = self.last_open_time
+            if last is None or ot[k] > last:
+                self._append(cols, k)
+                i = len(self) - 1
+            else:
+                times = self.view('open_time')
+                i = int(np.searchsorted(times, ot[k]))
+                if i >= len(times) or times[i] != ot[k]:
+                    continue
+                pos = self.start + i
+                if all(arr[pos] == cols[c][k] for c, arr in self.cols.items()):
+                    continue
+                self._write(pos, cols, k)
+            changed = i if changed is None else min(changed, i)
+        if changed is not None:
+            self._recompute(changed)
+            self.version = next(_versions)
+
+    def seed(self, cols):
+        n = len(cols['open_time'])
+        if n > self.capacity:
+            cols = {c: v[n - self.capacity:] for c, v in cols.items()}
+            n = self.capacity
+        with self.lock:
+            for c, arr in self.cols.items():
+                arr[:n] = cols[c]
+            self.start, self.end = 0, n
+            self.seq = n
+            self.hist.clear()
+            self._recompute(0)
+            self.version = next(_versions)
+
+    def to_frame(self) -> pd.DataFrame:
+        with self.lock:
+            names = ('open_time',) + PRICE_COLS + ('close_time',) + tuple(self.ind_cols)
+            return frame_from_columns({c: self.view(c).copy() for c in names})
+
+
+class CandleStore:
+    # Per (symbol, interval) candle buffers. The first refresh seeds the full lookback,
+    # afterwards only the newest `tail_limit` klines are pulled and merged into the tail.
+    # fetch(symbol, interval, limit, start_time=None) must return raw Binance kline rows
+    # (or None). With a CandleDisk, seeding starts from the stored history and only the
+    # gap since the last stored candle is fetched; closed candles are appended to disk.
+    # `rollups` maps higher intervals to buffer sizes; those buffers are never fetched,
+    # they are rolled up from the `base` interval whenever its buffer changes.
+    PAGE = 1000
+
+    def __init__(self, fetch, tail_limit: int = 2, indicators=None, disk=None, base='1m', rollups=None):
+        self.fetch = fetch
+        self.tail_limit = max(2, int(tail_limit))
+        self.indicators = indicators
+        self.disk = disk
+        self.base = base
+        self.rollups = {tf: int(n) for tf, n in (rollups or {}).items()}
+        self.buffers = {}
+        self.lock = threading.Lock()
+
+    def get(self, symbol, interval):
+        return self.buffers.get((symbol, interval))
+
+    def _from_disk(self, symbol, interval, lookback):
+        stored = self.disk.load(symbol, interval, lookback)
+        step = INTERVAL_MS.get(interval)
+        if stored is None or not step:
+            return None
+        # rows before a hole in the segment (an outage) are dropped; if what is left can't
+        # fill the lookback, a full fetch rewrites a gap-free tail instead
+        k = run_start(stored['open_time'], step)
+        stored = {c: v[k:] for c, v in stored.items()}
+        start = int(stored['open_time'][-1])
+        if (time.time() * 1000 - start) // step + 1 > lookback:
+            return None  # too stale, a plain full fetch is cheaper
+        pages = []
+        while True:
+            rows = self.fetch(symbol, interval, self.PAGE, start_time=start)
+            if not rows:
+                break
+            pages.append(decode_klines(rows))
+            if len(rows) < self.PAGE:
+                break
+            start = int(pages[-1]['open_time'][-1]) + step
+        if pages:
+            first = pages[0]['open_time'][0]
+            keep = stored['open_time'] < first
+            stored = {c: np.concatenate([stored[c][keep]] + [p[c] for p in pages]) for c in stored}
+        if k and len(stored['open_time']) < lookback:
+            return None
+        return {c: v[-lookback:] for c, v in stored.items()}
+
+    def _seed(self, buf, symbol, interval, lookback):
+        cols = self._from_disk(symbol, interval, lookback) if self.disk is not None else None
+        if cols is None:
+            rows = self.fetch(symbol, interval, lookback)
+            cols = decode_klines(rows) if rows else None
+        if cols is not None and len(cols['open_time']):
+            buf.seed(cols)
+            self.persist(symbol, interval)
+            self.roll(symbol, interval)
+        return buf
+
+    def roll(self, symbol, interval, since=None):
+        if interval != self.base or not self.rollups:
+            return
+        base = self.get(symbol, interval)
+        if base is None:
+            return
+        with base.lock:
+            i = 0
+            if since is not None:
+                # only the rows from the widest bucket touched onward (plus one older row,
+                # so rollup() can tell the bucket is complete) are needed
+                step = max(INTERVAL_MS[tf] for tf in self.rollups)
+                i = max(0, int(np.searchsorted(base.view('open_time'), since - since % step)) - 1)
+            cols = {c: base.view(c)[i:].copy() for c in TIME_COLS + PRICE_COLS}
+        for tf, rows in self.rollups.items():
+            key = (symbol, tf)
+            with self.lock:
+                buf = self.buffers.get(key)
+                if buf is None:
+                    buf = self.buffers[key] = CandleBuffer(rows, self.indicators)
+            rollup(buf, cols, INTERVAL_MS[tf], since)
+
+    def merge(self, symbol, interval, cols):
+        # stream path: upsert pushed candles and keep the rollups in step
+        buf = self.get(symbol, interval)
+        if buf is None or not len(buf):
+            return None
+        buf.upsert(cols)
+        self.roll(symbol, interval, since=cols['open_time'][0])
+        return buf
+
+    def persist(self, symbol, interval):
+        buf = self.get(symbol, interval)
+        if self.disk is None or buf is None or not len(buf):
+            return
+        with buf.lock:
+            cols = {c: buf.view(c).copy() for c in TIME_COLS + PRICE_COLS}
+        self.disk.append(symbol, interval, cols)
+
+    def _buffer(self, symbol, interval, lookback):
+        key = (symbol, interval)
+        with self.lock:
+            buf = self.buffers.get(key)
+            if buf is None or buf.capacity != lookback:
+                buf = self.buffers[key] = CandleBuffer(lookback, self.indicators)
+        return buf
+
+    def _merge_tail(self, buf, symbol, interval, rows):
+        # False when the tail no longer overlaps the buffer (missed candles) and it needs a reseed
+        if not rows:
+            return True
+        cols = decode_klines(rows)
+        if cols['open_time'][0] > buf.last_open_time:
+            return False
+        buf.upsert(cols)
+        self.persist(symbol, interval)
+        self.roll(symbol, interval, since=cols['open_time'][0])
+        return True
+
+    def refresh(self, symbol, interval, lookback):
+        buf = self._buffer(symbol, interval, lookback)
+        if not len(buf):
+            return self._seed(buf, symbol, interval, lookback)
+        rows = self.fetch(symbol, interval, self.tail_limit)
+        if not self._merge_tail(buf, symbol, interval, rows):
+            return self._seed(buf, symbol, interval, lookback)
+        return buf
+
+    def backfill(self, symbol, interval, lookback):
+        # refresh() after a pause of unknown length (e.g. a stream reconnect): pulls every
+        # candle since the last stored one instead of the fixed tail, reseeding only when
+        # more than the lookback is missing
+        buf = self._buffer(symbol, interval, lookback)
+        step = INTERVAL_MS.get(interval)
+        if not len(buf) or not step:
+            return self.refresh(symbol, interval, lookback)
+        missing = (int(time.time() * 1000) - buf.last_open_time) // step
+        if missing >= lookback:
+            return self._seed(buf, symbol, interval, lookback)
+        rows = self.fetch(symbol, interval, max(self.tail_limit, missing + 1))
+        if not self._merge_tail(buf, symbol, interval, rows):
+            return self._seed(buf, symbol, interval, lookback)
+        return buf
+
+    async def refresh_async(self, symbol, interval, lookback, fetch):
+        # refresh() with the tail request awaited on `fetch` (an async fetch with the
+        # same signature); seeding is rare and may page through disk, so it runs on
+        # the default executor with the blocking fetch
+        buf = self._buffer(symbol, interval, lookback)
+        if len(buf):
+            rows = await fetch(symbol, interval, self.tail_limit)
+            if self._merge_tail(buf, symbol, interval, rows):
+                return buf
+        return await asyncio.get_running_loop().run_in_executor(None, self._seed, buf, symbol, interval, lookback)
+
+    def retain(self, symbols):
+        keep = set(symbols)
+        with self.lock:
+            for key in [k for k in self.buffers if k[0] not in keep]:
+                del self.buffers[key]
@@ -0,0 +1,69 @@
+import threading
+
+# Memoized (symbol, timeframe, stage) results. Each entry keeps the key of the inputs
+# it was computed from; a stage re-runs only when that key changes, i.e. when its
+# inputs are dirty. For candle-derived stages the key is the candle buffer's version,
+# which moves only when a row of that buffer actually changes, so a higher timeframe
+# costs nothing between the 1m updates that touch its forming candle. A key of None
+# (inputs not tied to a buffer) always runs and is never stored.
+#   df = graph.get(sym, '5m', 'frame', buf.version, klines_frame, buf, sym, '5m')
+#   parts = graph.get_many('candles', [(sym, tf, version, df), ...], score_frames)
+
+
+class ComputeGraph:
+    def __init__(self, metrics=None):
+        self.metrics = metrics
+        self.entries = {}
+        self.lock = threading.Lock()
+
+    def _count(self, stage, hits, runs):
+        if self.metrics is not None:
+            if hits:
+                self.metrics.inc('graph_hits_total', hits, stage=stage)
+            if runs:
+                self.metrics.inc('graph_runs_total', runs, stage=stage)
+
+    def _lookup(self, sym, tf, stage, key):
+        if key is None:
+            return None
+        hit = self.entries.get((sym, tf, stage))
+        return hit if hit is not None and hit[0] == key else None
+
+    def _store(self, sym, tf, stage, key, value):
+        if key is not None:
+            with self.lock:
+                self.entries[(sym, tf, stage)] = (key, value)
+
+    def get(self, sym, tf, stage, key, fn, *args, **kwargs):
+        hit = self._lookup(sym, tf, stage, key)
+        if hit is not None:
+            self._count(stage, 1, 0)
+            return hit[1]
+        out = fn(*args, **kwargs)
+        self._store(sym, tf, stage, key, out)
+        self._count(stage, 0, 1)
+        return out
+
+    def get_many(self, stage, items, fn):
+        # items: [(sym, tf, key, arg)]; fn(list of args) -> list of results, called once
+        # with the args of the dirty items only
+        out, dirty = [None] * len(items), []
+        for i, (sym, tf, key, _) in enumerate(items):
+            hit = self._lookup(sym, tf, stage, key)
+            if hit is None:
+                dirty.append(i)
+            else:
+                out[i] = hit[1]
+        if dirty:
+            for i, value in zip(dirty, fn([items[i][3] for i in dirty])):
+                sym, tf, key, _ = items[i]
+                out[i] = value
+                self._store(sym, tf, stage, key, value)
+        self._count(stage, len(items) - len(dirty), len(dirty))
+        return out
+
+    def retain(self, symbols):
+        keep = set(symbols)
+        with self.lock:
+            for key in [k for k in self.entries if k[0] not in keep]:
+                del self.entries[key]
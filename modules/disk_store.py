@@ -0,0 +1,121 @@
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+KLINE_DTYPE = np.dtype([('open_time', '<i8'), ('open', '<f8'), ('high', '<f8'), ('low', '<f8'),
+                        ('close', '<f8'), ('volume', '<f8'), ('close_time', '<i8')])
+
+INTERVAL_MS = {'1m': 60_000, '3m': 180_000, '5m': 300_000, '10m': 600_000, '15m': 900_000, '30m': 1_800_000,
+               '1h': 3_600_000, '2h': 7_200_000, '4h': 14_400_000, '1d': 86_400_000}
+
+
+def run_start(open_time, step):
+    # index where the last run of consecutive candles (open_time `step` apart) begins;
+    # a segment written across an outage has a hole the candles on either side hide
+    gaps = np.flatnonzero(np.diff(open_time) != step)
+    return int(gaps[-1]) + 1 if len(gaps) else 0
+
+
+class CandleDisk:
+    # Append-only segment per (symbol, interval): <root>/<SYMBOL>/<interval>.bin holding
+    # fixed-size KLINE_DTYPE records. Only closed candles are written, reads memory-map
+    # the file and copy out the tail. Segments are trimmed to `max_rows` once they grow
+    # past twice that.
+    def __init__(self, root, max_rows=20_000):
+        self.root = root
+        self.max_rows = max_rows
+        self.last = {}
+        self.lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, symbol, interval):
+        return os.path.join(self.root, symbol.upper(), f"{interval}.bin")
+
+    def _records(self, symbol, interval):
+        p = self.path(symbol, interval)
+        if not os.path.exists(p) or os.path.getsize(p) < KLINE_DTYPE.itemsize:
+            return None
+        n = os.path.getsize(p) // KLINE_DTYPE.itemsize
+        return np.memmap(p, dtype=KLINE_DTYPE, mode='r', shape=(n,))
+
+    def last_open_time(self, symbol, interval):
+        key = (symbol, interval)
+        if key not in self.last:
+            rec = self._records(symbol, interval)
+            self.last[key] = int(rec['open_time'][-1]) if rec is not None else None
+        return self.last[key]
+
+    def load(self, symbol, interval, limit):
+        rec = self._records(symbol, interval)
+        if rec is None:
+            return None
+        tail = np.array(rec[-limit:])
+        return {name: tail[name].copy() for name in KLINE_DTYPE.names}
+
+    def load_range(self, symbol, interval, start_ms=None, end_ms=None, warmup=0):
+        # rows with start_ms <= open_time < end_ms, plus `warmup` rows before start_ms;
+        # only the last gap-free run of them, so candle offsets stay minutes apart
+        rec = self._records(symbol, interval)
+        if rec is None:
+            return None
+        ot = rec['open_time']
+        lo = 0 if start_ms is None else int(np.searchsorted(ot, start_ms, side='left'))
+        hi = len(ot) if end_ms is None else int(np.searchsorted(ot, end_ms, side='left'))
+        part = np.array(rec[max(0, lo - warmup):hi])
+        k = run_start(part['open_time'], INTERVAL_MS[interval]) if interval in INTERVAL_MS else 0
+        if k:
+            print(f"[WARN] {symbol} {interval} candles have a gap, dropping the {k} rows before it")
+            part = part[k:]
+        return {name: part[name].copy() for name in KLINE_DTYPE.names}
+
+    def append(self, symbol, interval, cols, now_ms=None):
+        # writes the closed rows of `cols` newer than what is already stored
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        with self.lock:
+            last = self.last_open_time(symbol, interval)
+            ot = cols['open_time']
+            mask = cols['close_time'] < now_ms
+            if last is not None:
+                mask &= ot > last
+            if not mask.any():
+                return 0
+            rec = np.empty(int(mask.sum()), dtype=KLINE_DTYPE)
+            for name in KLINE_DTYPE.names:
+                rec[name] = cols[name][mask]
+            p = self.path(symbol, interval)
+            os.makedirs(os.path.dirname(p), exist_ok=True)
+            with open(p, 'ab') as fh:
+                fh.write(rec.tobytes())
+            self.last[(symbol, interval)] = int(rec['open_time'][-1])
+            if os.path.getsize(p) > 2 * self.max_rows * KLINE_DTYPE.itemsize:
+                self._trim(p)
+            return len(rec)
+
+    def _trim(self, p):
+        keep = np.array(np.memmap(p, dtype=KLINE_DTYPE, mode='r')[-self.max_rows:])
+        tmp = p + '.tmp'
+        with open(tmp, 'wb') as fh:
+            fh.write(keep.tobytes())
+        os.replace(tmp, p)
+
+    def load_json(self, name, max_age=None):
+        p = os.path.join(self.root, name)
+        if not os.path.exists(p):
+            return None
+        if max_age is not None and time.time() - os.path.getmtime(p) > max_age:
+            return None
+        try:
+            with open(p) as fh:
+                return json.load(fh)
+        except Exception:
+            return None
+
+    def save_json(self, name, obj):
+        p = os.path.join(self.root, name)
+        tmp = p + '.tmp'
+        with open(tmp, 'w') as fh:
+            json.dump(obj, fh)
+        os.replace(tmp, p)
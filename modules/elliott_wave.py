@@ -1,58 +1,55 @@
 import pandas as pd
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+def _swing_flags(highs: np.ndarray, lows: np.ndarray, sensitivity: int, start: int = None) -> np.ndarray:
+    # 1 where the bar's high is the max of its +/- sensitivity window, else -1 where the
+    # low is the window min, else 0. Only centres >= start are evaluated.
+    n = len(highs)
+    out = np.zeros(n, dtype=np.int64)
+    s = sensitivity
+    if n < 2*s+1:
+        return out
+    lo = s if start is None else max(s, start)
+    if lo >= n - s:
+        return out
+    hmax = sliding_window_view(highs[lo-s:], 2*s+1).max(axis=1)
+    lmin = sliding_window_view(lows[lo-s:], 2*s+1).min(axis=1)
+    is_h = highs[lo:n-s] == hmax
+    is_l = ~is_h & (lows[lo:n-s] == lmin)
+    out[lo:n-s] = np.where(is_h, 1, np.where(is_l, -1, 0))
+    return out
 
 def detect_swings(df: pd.DataFrame, sensitivity: int = 3) -> pd.DataFrame:
     d = df.copy()
-    d['swing'] = 0
-    n = len(d)
-    if n < 2*sensitivity+1:
-        return d
-    highs = d['high'].values
-    lows = d['low'].values
-    for i in range(sensitivity, n - sensitivity):
-        if highs[i] == max(highs[i-sensitivity:i+sensitivity+1]):
-            d.iat[i, d.columns.get_loc('swing')] = 1
-        elif lows[i] == min(lows[i-sensitivity:i+sensitivity+1]):
-            d.iat[i, d.columns.get_loc('swing')] = -1
+    d['swing'] = _swing_flags(d['high'].values, d['low'].values, sensitivity)
     return d
 
+def _pivot_arrays(swing: np.ndarray, highs: np.ndarray, lows: np.ndarray):
+    # Pivot bars with runs of same-type pivots collapsed to the last extreme of the run
+    # (highest high / lowest low, later bar wins ties).
+    idx = np.flatnonzero(swing)
+    if not idx.size:
+        return idx, swing[idx], idx.astype(float)
+    kind = swing[idx]
+    val = np.where(kind == 1, highs[idx], lows[idx]).astype(float)
+    run = np.concatenate([[0], np.cumsum(kind[1:] != kind[:-1])])
+    order = np.lexsort((idx, kind * val, run))
+    last = order[np.flatnonzero(np.append(run[order][1:] != run[order][:-1], True))]
+    return idx[last], kind[last], val[last]
+
 def _pivots(d: pd.DataFrame):
-    piv = []
-    for i, s in enumerate(d['swing'].values):
-        if s == 1:
-            piv.append((i, 'H', float(d['high'].iloc[i])))
-        elif s == -1:
-            piv.append((i, 'L', float(d['low'].iloc[i])))
-    cleaned = []
-    for p in piv:
-        if not cleaned:
-            cleaned.append(p); continue
-        if cleaned[-1][1] == p[1]:
-            if p[1] == 'H':
-                if p[2] >= cleaned[-1][2]:
-                    cleaned[-1] = p
-            else:
-                if p[2] <= cleaned[-1][2]:
-                    cleaned[-1] = p
-        else:
-            cleaned.append(p)
-    return cleaned
-
-def current_wave_label(df: pd.DataFrame, sensitivity: int = 3):
-    if df is None or df.empty:
-        return None, None
-    d = detect_swings(df, sensitivity=sensitivity)
-    piv = _pivots(d)
-    if len(piv) < 3:
+    idx, kind, val = _pivot_arrays(d['swing'].values, d['high'].values, d['low'].values)
+    return [(int(i), 'H' if k == 1 else 'L', float(v)) for i, k, v in zip(idx, kind, val)]
+
+def _wave_from_pivots(kind: np.ndarray, val: np.ndarray):
+    if len(kind) < 3:
         return None, None
-    highs = [p for p in piv if p[1]=='H']
-    lows = [p for p in piv if p[1]=='L']
     up = 0
-    for i in range(1, len(highs)):
-        up += 1 if highs[i][2] > highs[i-1][2] else -1
-    for i in range(1, len(lows)):
-        up += 1 if lows[i][2] > lows[i-1][2] else -1
-    leg_count = len(piv)
+    for side in (1, -1):
+        v = val[kind == side]
+        up += int(np.where(v[1:] > v[:-1], 1, -1).sum())
+    leg_count = len(kind)
     if up >= 0:
         label = min(5, max(1, leg_count))
         return label, 'Impulse'
@@ -60,3 +57,45 @@ def current_wave_label(df: pd.DataFrame, sensitivity: int = 3):
         if leg_count <= 2: return 'A', 'Correction'
         elif leg_count in (3,4): return 'B', 'Correction'
         else: return 'C', 'Correction'
+
+class WaveTracker:
+    # Incremental swing detection for one (symbol, timeframe). Between calls only the
+    # bars whose window touches the revised last candle or the new candles are
+    # re-examined; anything else (edited history, a different series) recomputes fully.
+    def __init__(self, sensitivity: int = 3):
+        self.sensitivity = sensitivity
+        self.times = None
+        self.highs = None
+        self.lows = None
+        self.swing = None
+
+    def update(self, df: pd.DataFrame) -> np.ndarray:
+        s = self.sensitivity
+        times = df['close_time'].values
+        highs = df['high'].values.astype(float)
+        lows = df['low'].values.astype(float)
+        swing = None
+        if self.times is not None and len(self.times) and len(times):
+            off = int(np.searchsorted(self.times, times[0]))
+            m = len(self.times) - off
+            if off < len(self.times) and self.times[off] == times[0] and 0 < m <= len(times) \
+                    and np.array_equal(self.times[off:], times[:m]) \
+                    and np.array_equal(self.highs[off:-1], highs[:m-1]) \
+                    and np.array_equal(self.lows[off:-1], lows[:m-1]):
+                start = max(0, m - 1 - s)
+                swing = np.zeros(len(times), dtype=np.int64)
+                swing[s:start] = self.swing[off+s:off+start]
+                swing[start:] = _swing_flags(highs, lows, s, start)[start:]
+        if swing is None:
+            swing = _swing_flags(highs, lows, s)
+        self.times, self.highs, self.lows, self.swing = times, highs, lows, swing
+        return swing
+
+def current_wave_label(df: pd.DataFrame, sensitivity: int = 3, tracker: WaveTracker = None):
+    if df is None or df.empty:
+        return None, None
+    highs = df['high'].values
+    lows = df['low'].values
+    swing = tracker.update(df) if tracker is not None else _swing_flags(highs, lows, sensitivity)
+    _, kind, val = _pivot_arrays(swing, highs, lows)
+    return _wave_from_pivots(kind, val)
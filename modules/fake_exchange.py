@@ -0,0 +1,154 @@
+import argparse
+import json
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+from modules.binance_client import request_weight
+from modules.disk_store import INTERVAL_MS
+
+# Local stand-in for the Binance spot REST endpoints the app uses (klines, depth,
+# bookTicker, 24hr ticker, exchangeInfo) with synthetic, deterministic data. It keeps
+# a per-minute used-weight counter, reports it in X-MBX-USED-WEIGHT-1M, answers 429
+# with Retry-After past `weight_limit`, and can be told to fail the next requests
+# with a given status, or to answer slowly, for exercising the client.
+#   python -m modules.fake_exchange --port 9002 --symbols BTCUSDT,ETHUSDT
+#   BINANCE_BASE_URL=http://127.0.0.1:9002 python app.py
+
+
+class FakeExchange(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # an async sweep opens dozens of connections at once
+
+    def __init__(self, host='127.0.0.1', port=0, symbols=('BTCUSDT', 'ETHUSDT'), weight_limit=6000,
+                 latency=0.0, history_days=30):
+        super().__init__((host, port), _Handler)
+        self.symbols = list(symbols)
+        self.weight_limit = weight_limit
+        self.latency = latency
+        self.t0 = (int(time.time()) // 86400 - history_days) * 86_400_000
+        self.used = 0
+        self.minute = int(time.time() // 60)
+        self.hits = {}
+        self.failures = []
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}"
+
+    def fail_next(self, status, count=1, retry_after=1):
+        with self.lock:
+            self.failures += [(status, retry_after)] * count
+
+    def charge(self, weight):
+        with self.lock:
+            minute = int(time.time() // 60)
+            if minute != self.minute:
+                self.minute, self.used = minute, 0
+            self.used += weight
+            fail = self.failures.pop(0) if self.failures else None
+            return self.used, fail
+
+    def klines(self, symbol, interval, limit, start=None):
+        step = INTERVAL_MS[interval]
+        now = int(time.time() * 1000)
+        last = (now - self.t0) // step
+        first = max(0, last - limit + 1) if start is None else max(0, (start - self.t0 + step - 1) // step)
+        idx = np.arange(first, min(last + 1, first + limit))
+        rng = np.random.default_rng(zlib.crc32(f"{symbol}{interval}".encode()))
+        walk = 100 * np.exp(np.cumsum(rng.normal(0, 0.002, int(last) + 2)))
+        rows = []
+        for i in idx:
+            o, c = walk[i], walk[i + 1]
+            ot = self.t0 + int(i) * step
+            rows.append([ot, f"{o:.6f}", f"{max(o, c) * 1.0005:.6f}", f"{min(o, c) * 0.9995:.6f}", f"{c:.6f}",
+                         f"{10 + (i % 7):.3f}", ot + step - 1, "0", 1, "0", "0", "0"])
+        return rows
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # keep-alive, so pooled clients reuse their connections; headers and body go out as
+    # separate writes, so without TCP_NODELAY each response waits on a delayed ACK
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    ROUTES = {'/api/v3/klines': 'klines', '/api/v3/depth': 'depth', '/api/v3/ticker/bookTicker': 'book_ticker',
+              '/api/v3/ticker/24hr': 'ticker_24hr', '/api/v3/exchangeInfo': 'exchange_info'}
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, status, body, headers=()):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        for k, v in headers:
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        srv = self.server
+        u = urlparse(self.path)
+        q = {k: v[0] for k, v in parse_qs(u.query).items()}
+        name = self.ROUTES.get(u.path)
+        if name is None:
+            return self._send(404, {'code': -1, 'msg': 'unknown path'})
+        args = (q['symbol'],) if 'symbol' in q else ()
+        kw = {'limit': int(q['limit'])} if 'limit' in q else {}
+        used, fail = srv.charge(request_weight(name, args, kw))
+        with srv.lock:
+            srv.hits[name] = srv.hits.get(name, 0) + 1
+        if srv.latency:
+            time.sleep(srv.latency)
+        weight_hdr = [('X-MBX-USED-WEIGHT-1M', str(used))]
+        if fail is not None:
+            status, retry_after = fail
+            return self._send(status, {'code': -1003, 'msg': 'injected failure'},
+                              weight_hdr + [('Retry-After', str(retry_after))])
+        if used > srv.weight_limit:
+            return self._send(429, {'code': -1003, 'msg': 'Too much request weight used'},
+                              weight_hdr + [('Retry-After', str(60 - int(time.time()) % 60))])
+        sym = q.get('symbol')
+        if sym is not None and sym not in srv.symbols:
+            return self._send(400, {'code': -1121, 'msg': 'Invalid symbol.'}, weight_hdr)
+        self._send(200, self._body(name, sym, q), weight_hdr)
+
+    def _body(self, name, sym, q):
+        srv = self.server
+        if name == 'klines':
+            start = int(q['startTime']) if 'startTime' in q else None
+            return srv.klines(sym, q.get('interval', '1m'), int(q.get('limit', 500)), start)
+        last = float(srv.klines(sym or srv.symbols[0], '1m', 1)[-1][4])
+        if name == 'depth':
+            n = int(q.get('limit', 100))
+            return {'lastUpdateId': int(time.time() * 1000),
+                    'bids': [[f"{last * (1 - 1e-4 * (i + 1)):.6f}", "1.0"] for i in range(n)],
+                    'asks': [[f"{last * (1 + 1e-4 * (i + 1)):.6f}", "1.0"] for i in range(n)]}
+        if name == 'book_ticker':
+            return {'symbol': sym, 'bidPrice': f"{last * 0.9999:.6f}", 'bidQty': '2.0',
+                    'askPrice': f"{last * 1.0001:.6f}", 'askQty': '1.0'}
+        if name == 'ticker_24hr':
+            rows = [{'symbol': s, 'lastPrice': f"{last:.6f}", 'highPrice': f"{last * 1.02:.6f}",
+                     'lowPrice': f"{last * 0.98:.6f}", 'quoteVolume': str(1e9 / (k + 1))}
+                    for k, s in enumerate(srv.symbols)]
+            return rows if sym is None else next(r for r in rows if r['symbol'] == sym)
+        return {'symbols': [{'symbol': s, 'baseAsset': s[:-4], 'quoteAsset': s[-4:]} for s in srv.symbols]}
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument('--host', default='127.0.0.1')
+    ap.add_argument('--port', type=int, default=9002)
+    ap.add_argument('--symbols', default='BTCUSDT,ETHUSDT,BNBUSDT')
+    ap.add_argument('--weight-limit', type=int, default=6000)
+    ap.add_argument('--latency', type=float, default=0.0)
+    args = ap.parse_args()
+    srv = FakeExchange(args.host, args.port, args.symbols.split(','), args.weight_limit, args.latency)
+    print(f"[INFO] fake exchange on {srv.url}")
+    srv.serve_forever()
@@ -1,3 +1,5 @@
+from abc import ABC, abstractmethod
+
 import pandas as pd
 import numpy as np
 
@@ -36,3 +38,126 @@ def adx(df: pd.DataFrame, length: int = 14) -> pd.Series:
     dx = (100 * (plus_di - minus_di).abs() / ((plus_di + minus_di) + 1e-12)).fillna(0)
     adx_val = dx.ewm(alpha=1/length, adjust=False).mean()
     return adx_val.clip(lower=0, upper=100)
+
+
+# Streaming counterparts of the batch functions above. Each object keeps the
+# recursive state of its ewm chains, so appending a candle is O(1); the last one is
+# revised by restore()-ing the state taken before it and updating again. The arithmetic mirrors pandas' ewm(adjust=False) so values match
+# the batch functions exactly for the same input series.
+
+def _ewm_step(prev, x, alpha):
+    if prev != prev:
+        return x
+    if x != x or prev == x:
+        return prev
+    old_wt = 1.0 - alpha
+    return (old_wt * prev + alpha * x) / (old_wt + alpha)
+
+def _com_alpha(com):
+    return 1.0 / (1.0 + com)
+
+_NAN = float('nan')
+
+class _Streaming(ABC):
+    inputs = ('close',)
+
+    def __init__(self):
+        self._cur = self._initial()
+        self.value = _NAN
+
+    @abstractmethod
+    def _initial(self):
+        ...
+
+    @abstractmethod
+    def _step(self, state, *bar):
+        ...
+
+    @property
+    def state(self):
+        return self._cur, self.value
+
+    def restore(self, state):
+        self._cur, self.value = state
+
+    def update(self, *bar):
+        self._cur, self.value = self._step(self._cur, *map(float, bar))
+        return self.value
+
+class RSI(_Streaming):
+    def __init__(self, length: int = 14):
+        self.alpha = _com_alpha(length - 1.0)
+        super().__init__()
+
+    def _initial(self):
+        return (_NAN, _NAN, _NAN)  # prev close, up ewm, down ewm
+
+    def _step(self, state, close):
+        prev_c, up, down = state
+        delta = close - prev_c
+        up = _ewm_step(up, max(delta, 0.0) if delta == delta else _NAN, self.alpha)
+        down = _ewm_step(down, -min(delta, 0.0) if delta == delta else _NAN, self.alpha)
+        rs = up / (down + 1e-12)
+        return (close, up, down), 100 - (100 / (1 + rs))
+
+class EMA(_Streaming):
+    def __init__(self, length: int):
+        self.alpha = _com_alpha((length - 1) / 2.0)
+        super().__init__()
+
+    def _initial(self):
+        return _NAN
+
+    def _step(self, state, close):
+        v = _ewm_step(state, close, self.alpha)
+        return v, v
+
+def _true_range(high, low, prev_c):
+    parts = [abs(high - low), abs(high - prev_c), abs(low - prev_c)]
+    parts = [p for p in parts if p == p]
+    return max(parts) if parts else _NAN
+
+class ATR(_Streaming):
+    inputs = ('high', 'low', 'close')
+
+    def __init__(self, length: int = 14):
+        self.alpha = _com_alpha(length - 1.0)
+        super().__init__()
+
+    def _initial(self):
+        return (_NAN, _NAN)  # prev close, tr ewm
+
+    def _step(self, state, high, low, close):
+        prev_c, a = state
+        a = _ewm_step(a, _true_range(high, low, prev_c), self.alpha)
+        return (close, a), a
+
+class ADX(_Streaming):
+    inputs = ('high', 'low', 'close')
+
+    def __init__(self, length: int = 14):
+        self.alpha = _com_alpha(length - 1.0)
+        super().__init__()
+
+    def _initial(self):
+        return (_NAN, _NAN, _NAN, _NAN, _NAN, _NAN, _NAN)  # prev h/l/c, tr, +dm, -dm, adx ewms
+
+    def _step(self, state, high, low, close):
+        ph, pl, pc, tr_s, pdm_s, mdm_s, adx_s = state
+        up_move = high - ph
+        down_move = -(low - pl)
+        if up_move == up_move and down_move == down_move:
+            plus_dm = float(up_move > down_move and up_move > 0) * max(up_move, 0.0)
+            minus_dm = float(down_move > up_move and down_move > 0) * max(down_move, 0.0)
+        else:
+            plus_dm = minus_dm = _NAN
+        tr_s = _ewm_step(tr_s, _true_range(high, low, pc), self.alpha)
+        pdm_s = _ewm_step(pdm_s, plus_dm, self.alpha)
+        mdm_s = _ewm_step(mdm_s, minus_dm, self.alpha)
+        plus_di = 100 * (pdm_s / (tr_s + 1e-12))
+        minus_di = 100 * (mdm_s / (tr_s + 1e-12))
+        dx = 100 * abs(plus_di - minus_di) / ((plus_di + minus_di) + 1e-12)
+        if dx != dx:
+            dx = 0.0
+        adx_s = _ewm_step(adx_s, dx, self.alpha)
+        return (high, low, close, tr_s, pdm_s, mdm_s, adx_s), min(100.0, max(0.0, adx_s))
@@ -0,0 +1,44 @@
+import numpy as np
+import pandas as pd
+
+PRICE_COLS = ('open', 'high', 'low', 'close', 'volume')
+
+
+def decode_klines(rows) -> dict:
+    # Raw Binance kline arrays -> typed columns: int64 epoch-ms open/close times and
+    # float64 OHLCV. One object array for the whole payload, no per-row objects.
+    if not rows:
+        return {'open_time': np.empty(0, dtype=np.int64),
+                **{c: np.empty(0) for c in PRICE_COLS},
+                'close_time': np.empty(0, dtype=np.int64)}
+    a = np.array(rows, dtype=object)
+    if a.ndim != 2:
+        a = np.array([r[:7] for r in rows], dtype=object)
+    px = np.ascontiguousarray(a[:, 1:6].astype(np.float64).T)
+    out = {'open_time': a[:, 0].astype(np.int64)}
+    out.update(zip(PRICE_COLS, px))
+    out['close_time'] = a[:, 6].astype(np.int64)
+    return out
+
+
+def decode_twelvedata(values) -> dict:
+    # Twelve Data time_series "values" (newest first, string fields, no volume for
+    # forex) -> the same typed columns, oldest first. close_time is the bar datetime
+    # as naive epoch-ms.
+    if not values:
+        return {'close_time': np.empty(0, dtype=np.int64), **{c: np.empty(0) for c in PRICE_COLS}}
+    ts = pd.to_datetime(pd.Series([v.get('datetime') for v in values])).values.astype('datetime64[ms]').astype(np.int64)
+    out = {'close_time': ts}
+    for c in PRICE_COLS:
+        raw = pd.Series([v.get(c) for v in values], dtype=object)
+        out[c] = pd.to_numeric(raw, errors='coerce').fillna(0.0).to_numpy(dtype=np.float64)
+    order = np.argsort(ts, kind='stable')
+    return {c: v[order] for c, v in out.items()}
+
+
+def frame_from_columns(cols: dict, utc: bool = True) -> pd.DataFrame:
+    df = pd.DataFrame(cols, copy=False)
+    for c in ('open_time', 'close_time'):
+        if c in df:
+            df[c] = pd.to_datetime(df[c], unit='ms', utc=utc)
+    return df
@@ -0,0 +1,220 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import websocket
+
+from modules.order_book import BookSync
+
+STREAM_URL = "wss://stream.binance.com:9443"
+
+
+def depth_summary(bids, asks, limit=20):
+    b = sum(float(x[1]) for x in bids[:limit])
+    a = sum(float(x[1]) for x in asks[:limit])
+    if b + a <= 0:
+        return {'liq_bias': 0.0}
+    return {'liq_bias': float((b - a) / (b + a)), 'bids_vol': float(b), 'asks_vol': float(a)}
+
+
+def _kline_cols(k):
+    return {
+        'open_time': np.array([int(k['t'])], dtype=np.int64),
+        'open': np.array([float(k['o'])]), 'high': np.array([float(k['h'])]),
+        'low': np.array([float(k['l'])]), 'close': np.array([float(k['c'])]),
+        'volume': np.array([float(k['v'])]),
+        'close_time': np.array([int(k['T'])], dtype=np.int64),
+    }
+
+
+class MarketStream:
+    # Consumes Binance combined kline / bookTicker / partial-depth streams and keeps
+    # the latest state in memory. Klines are merged into the shared CandleStore; on
+    # each (re)connect a backfill worker seeds new buffers over REST and pulls only the
+    # candles missed while disconnected into the others, which keep their rows. Kline
+    # events for a buffer are held back until its backfill is done, so nothing lands
+    # past a gap. Everything else is read without I/O.
+    # With `snapshot` (symbol -> REST depth snapshot) the book and depth come from a
+    # local order book maintained off the diff-depth stream instead; snapshots are
+    # fetched on a small worker pool so the socket thread never blocks on REST.
+    def __init__(self, store, lookbacks, url=STREAM_URL, depth_levels=20, min_interval=0.25,
+                 record_path=None, snapshot=None, bands=(10, 25, 50, 100)):
+        self.store = store
+        self.lookbacks = dict(lookbacks)
+        self.url = url.rstrip('/')
+        self.depth_levels = depth_levels
+        self.min_interval = min_interval
+        self.record_path = record_path
+        self.symbols = []
+        self.books = {}
+        self.depths = {}
+        self.snapshot = snapshot
+        self.bands = tuple(bands)
+        self.syncs = {}
+        self.snapshot_pool = ThreadPoolExecutor(2, thread_name_prefix='book-snapshot') if snapshot is not None else None
+        self.backfill_pool = ThreadPoolExecutor(1, thread_name_prefix='stream-backfill')
+        self.conn_id = 0
+        self.ready = set()  # (symbol, interval) backfilled on the current connection
+        self.held = {}  # (symbol, interval) -> kline columns received before that
+        self.kline_lock = threading.Lock()
+        self.record = None
+        self.book_lock = threading.Lock()
+        self.last_event = {}
+        self.dirty = set()
+        self.cond = threading.Condition()
+        self.ws = None
+        self.stopped = False
+        self.thread = None
+
+    def streams(self):
+        out = []
+        for sym in self.symbols:
+            s = sym.lower()
+            out += [f"{s}@kline_{i}" for i in self.lookbacks]
+            if self.snapshot is not None:
+                out.append(f"{s}@depth@100ms")
+            else:
+                out += [f"{s}@bookTicker", f"{s}@depth{self.depth_levels}@100ms"]
+        return out
+
+    def start(self, symbols):
+        self.symbols = list(symbols)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def set_symbols(self, symbols):
+        if list(symbols) == self.symbols:
+            return
+        self.symbols = list(symbols)
+        if self.ws is not None:
+            self.ws.close()
+
+    def stop(self):
+        self.stopped = True
+        if self.ws is not None:
+            self.ws.close()
+
+    def _on_open(self):
+        with self.book_lock:
+            self.syncs = {}  # a new connection breaks the diff sequence
+        with self.kline_lock:
+            self.conn_id += 1
+            self.ready, self.held = set(), {}
+            conn = self.conn_id
+        self.backfill_pool.submit(self._backfill, conn, list(self.symbols))
+
+    def _backfill(self, conn, symbols):
+        for sym in symbols:
+            for interval, lookback in self.lookbacks.items():
+                if conn != self.conn_id:
+                    return  # reconnected meanwhile, the new connection backfills again
+                try:
+                    self.store.backfill(sym, interval, lookback)
+                except Exception as e:
+                    print(f"[WARN] backfill failed for {sym} {interval}: {e}")
+                with self.kline_lock:
+                    if conn != self.conn_id:
+                        return
+                    for cols, closed in self.held.pop((sym, interval), []):
+                        self._merge(sym, interval, cols, closed)
+                    self.ready.add((sym, interval))
+            self._touch(sym)
+
+    def _merge(self, sym, interval, cols, closed):
+        if self.store.merge(sym, interval, cols) is None:
+            return False
+        if closed:
+            self.store.persist(sym, interval)
+        return True
+
+    def _run(self):
+        delay = 1.0
+        while not self.stopped:
+            if not self.symbols:
+                time.sleep(1.0); continue
+            url = f"{self.url}/stream?streams=" + "/".join(self.streams())
+            started = time.time()
+            self.ws = websocket.WebSocketApp(url, on_open=lambda ws: self._on_open(),
+                                             on_message=lambda ws, msg: self.on_message(msg),
+                                             on_error=lambda ws, e: print(f"[WARN] stream error: {e}"))
+            self.record = open(self.record_path, 'a') if self.record_path else None
+            try:
+                self.ws.run_forever(ping_interval=60, ping_timeout=20)
+            finally:
+                if self.record is not None:
+                    self.record.close()
+                    self.record = None
+            if self.stopped:
+                break
+            delay = 1.0 if time.time() - started > 30 else min(30.0, delay * 2)
+            time.sleep(delay)
+
+    def on_message(self, raw):
+        record = self.record
+        if record is not None:
+            record.write(raw if isinstance(raw, str) else raw.decode())
+            record.write('\n')
+        try:
+            msg = json.loads(raw)
+            stream, data = msg['stream'], msg['data']
+            sym = stream.split('@', 1)[0].upper()
+            kind = stream.split('@', 1)[1]
+            if kind.startswith('kline_'):
+                k = data['k']
+                with self.kline_lock:
+                    if (sym, k['i']) not in self.ready:
+                        self.held.setdefault((sym, k['i']), []).append((_kline_cols(k), k.get('x')))
+                        return
+                    if not self._merge(sym, k['i'], _kline_cols(k), k.get('x')):
+                        return
+            elif kind == 'bookTicker':
+                self.books[sym] = {'bid': float(data.get('b', 0.0) or 0.0), 'ask': float(data.get('a', 0.0) or 0.0),
+                                   'bid_qty': float(data.get('B', 0.0) or 0.0), 'ask_qty': float(data.get('A', 0.0) or 0.0)}
+            elif kind == 'depth@100ms' and self.snapshot is not None:
+                with self.book_lock:
+                    sync = self.syncs.get(sym)
+                    if sync is None:
+                        sync = self.syncs[sym] = BookSync(sym, self.snapshot, submit=self.snapshot_pool.submit)
+                    if not sync.on_diff(data):
+                        return
+            elif kind.startswith('depth'):
+                self.depths[sym] = depth_summary(data.get('bids', []), data.get('asks', []), self.depth_levels)
+            else:
+                return
+        except Exception as e:
+            print(f"[WARN] bad stream message: {e}")
+            return
+        self._touch(sym)
+
+    def _touch(self, sym):
+        with self.cond:
+            self.last_event[sym] = time.time()
+            self.dirty.add(sym)
+            self.cond.notify_all()
+
+    def wait_dirty(self, timeout):
+        # Blocks until at least one symbol changed, then waits out `min_interval`
+        # so a burst of bookTicker updates is coalesced into one recompute.
+        with self.cond:
+            if not self.dirty:
+                self.cond.wait(timeout)
+        time.sleep(self.min_interval)
+        with self.cond:
+            out, self.dirty = self.dirty, set()
+        return [s for s in self.symbols if s in out]
+
+    def book(self, sym):
+        if self.snapshot is None:
+            return self.books.get(sym)
+        with self.book_lock:
+            sync = self.syncs.get(sym)
+            return sync.book.top() if sync is not None and sync.synced else None
+
+    def depth(self, sym):
+        if self.snapshot is None:
+            return self.depths.get(sym)
+        with self.book_lock:
+            sync = self.syncs.get(sym)
+            return sync.book.summary(self.depth_levels, self.bands) if sync is not None and sync.synced else None
@@ -0,0 +1,91 @@
+import json
+import queue
+import threading
+import time
+from collections import defaultdict
+
+
+class LocalBus:
+    # In-process stand-in for the Redis bus: same publish / subscribe / get / set calls,
+    # each subscriber drains its own queue on a daemon thread so a slow consumer never
+    # blocks the producer.
+    def __init__(self, max_queue=1000):
+        self.max_queue = max_queue
+        self.subs = defaultdict(list)
+        self.store = {}
+        self.lock = threading.Lock()
+
+    def publish(self, channel, msg):
+        with self.lock:
+            subs = list(self.subs[channel])
+        for q in subs:
+            try:
+                q.put_nowait(msg)
+            except queue.Full:
+                print(f"[WARN] bus subscriber on {channel} is behind, dropping a message")
+
+    def subscribe(self, channel, handler):
+        q = queue.Queue(maxsize=self.max_queue)
+        with self.lock:
+            self.subs[channel].append(q)
+
+        def run():
+            while True:
+                msg = q.get()
+                try:
+                    handler(msg)
+                except Exception as e:
+                    print(f"[WARN] bus handler failed on {channel}: {e}")
+        threading.Thread(target=run, daemon=True).start()
+
+    def set(self, key, value):
+        with self.lock:
+            self.store[key] = value
+
+    def get(self, key):
+        with self.lock:
+            return self.store.get(key)
+
+
+class RedisBus:
+    # Redis pub/sub for frames plus plain keys for state late joiners need (the current
+    # snapshot). Messages are JSON; `redis` is only imported when this bus is used.
+    def __init__(self, url, prefix='quant:'):
+        import redis
+        self.redis = redis.Redis.from_url(url)
+        self.prefix = prefix
+
+    def publish(self, channel, msg):
+        self.redis.publish(self.prefix + channel, json.dumps(msg))
+
+    def subscribe(self, channel, handler):
+        def run():
+            delay = 1.0
+            while True:
+                try:
+                    ps = self.redis.pubsub(ignore_subscribe_messages=True)
+                    ps.subscribe(self.prefix + channel)
+                    delay = 1.0
+                    for m in ps.listen():
+                        try:
+                            handler(json.loads(m['data']))
+                        except Exception as e:
+                            print(f"[WARN] bus handler failed on {channel}: {e}")
+                except Exception as e:
+                    print(f"[WARN] redis subscription to {channel} lost: {e}")
+                    time.sleep(delay)
+                    delay = min(30.0, delay * 2)
+        threading.Thread(target=run, daemon=True).start()
+
+    def set(self, key, value):
+        self.redis.set(self.prefix + key, json.dumps(value))
+
+    def get(self, key):
+        v = self.redis.get(self.prefix + key)
+        return json.loads(v) if v else None
+
+
+def make_bus(url=''):
+    if url.startswith(('redis://', 'rediss://', 'unix://')):
+        return RedisBus(url)
+    return LocalBus()
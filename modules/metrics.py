@@ -0,0 +1,112 @@
+import random
+import threading
+import time
+from collections import defaultdict
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _NoSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NO_SPAN = _NoSpan()
+
+
+class _Span:
+    __slots__ = ('metrics', 'stage', 't0')
+
+    def __init__(self, metrics, stage):
+        self.metrics = metrics
+        self.stage = stage
+
+    def __enter__(self):
+        self.t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.observe('stage_seconds', time.perf_counter() - self.t0, stage=self.stage)
+        return False
+
+
+class Metrics:
+    # Counters, gauges and fixed-bucket histograms rendered in the Prometheus text
+    # format. span(stage) times a block into stage_seconds{stage=...}; spans are
+    # sampled with probability `sample` and cost one comparison when it is 0.
+    def __init__(self, sample=1.0, prefix='quant_'):
+        self.sample = sample
+        self.prefix = prefix
+        self.counters = defaultdict(float)
+        self.gauges = {}
+        self.hists = {}
+        self.buckets = {}
+        self.lock = threading.Lock()
+
+    def span(self, stage):
+        if self.sample <= 0 or (self.sample < 1 and random.random() >= self.sample):
+            return NO_SPAN
+        return _Span(self, stage)
+
+    def set_buckets(self, name, buckets):
+        self.buckets[name] = tuple(sorted(buckets))
+
+    def inc(self, name, value=1.0, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] += value
+
+    def gauge(self, name, value, **labels):
+        self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def observe(self, name, value, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        bounds = self.buckets.get(name, DEFAULT_BUCKETS)
+        with self.lock:
+            h = self.hists.get(key)
+            if h is None:
+                h = self.hists[key] = [[0] * len(bounds), 0.0, 0]
+            for i, b in enumerate(bounds):
+                if value <= b:
+                    h[0][i] += 1
+                    break
+            h[1] += value
+            h[2] += 1
+
+    @staticmethod
+    def _labels(pairs, extra=()):
+        pairs = tuple(pairs) + tuple(extra)
+        return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}' if pairs else ''
+
+    def render(self):
+        lines = []
+        with self.lock:
+            counters = sorted(self.counters.items())
+            hists = sorted((k, (list(h[0]), h[1], h[2])) for k, h in self.hists.items())
+        gauges = sorted(self.gauges.items())
+        typed = set()
+        for kind, items in (('counter', counters), ('gauge', gauges)):
+            for (name, labels), v in items:
+                full = self.prefix + name
+                if full not in typed:
+                    typed.add(full)
+                    lines.append(f"# TYPE {full} {kind}")
+                lines.append(f"{full}{self._labels(labels)} {v:g}")
+        for (name, labels), (counts, total, n) in hists:
+            full = self.prefix + name
+            if full not in typed:
+                typed.add(full)
+                lines.append(f"# TYPE {full} histogram")
+            acc = 0
+            for b, c in zip(self.buckets.get(name, DEFAULT_BUCKETS), counts):
+                acc += c
+                lines.append(f"{full}_bucket{self._labels(labels, [('le', f'{b:g}')])} {acc}")
+            lines.append(f"{full}_bucket{self._labels(labels, [('le', '+Inf')])} {n}")
+            lines.append(f"{full}_sum{self._labels(labels)} {total:g}")
+            lines.append(f"{full}_count{self._labels(labels)} {n}")
+        return '\n'.join(lines) + '\n'
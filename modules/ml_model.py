@@ -1,14 +1,21 @@
+import math
+
 import pandas as pd
 import numpy as np
 from sklearn.linear_model import LogisticRegression
 
 class MLNextMove:
+    FEATURES = ['ret1','ret3','ret5','hl_spread','body','vol_norm']
+
     def __init__(self, min_samples: int = 100):
         self.min_samples = min_samples
         self.model = LogisticRegression(max_iter=250)
         self.fitted = False
 
     def _build_features(self, df: pd.DataFrame) -> pd.DataFrame:
+        if all(c in df for c in self.FEATURES):
+            # precomputed by data_features.feature_frame
+            return df[self.FEATURES].fillna(0.0)
         d = df.copy()
         d['ret1'] = d['close'].pct_change()
         d['ret3'] = d['close'].pct_change(3)
@@ -16,7 +23,7 @@ class MLNextMove:
         d['hl_spread'] = (d['high'] - d['low']) / (d['close'].shift(1).abs() + 1e-9)
         d['body'] = (d['close'] - d['open']) / (d['open'].abs() + 1e-9)
         d['vol_norm'] = (d['volume'] / (d['volume'].rolling(20).mean() + 1e-9)).clip(0, 10)
-        feats = d[['ret1','ret3','ret5','hl_spread','body','vol_norm']].fillna(0.0)
+        feats = d[self.FEATURES].fillna(0.0)
         return feats
 
     def fit_predict_prob(self, df: pd.DataFrame) -> float | None:
@@ -34,3 +41,89 @@ class MLNextMove:
             return prob
         except Exception:
             return None
+
+
+class OnlineNextMove:
+    # Incremental counterpart of MLNextMove for one (symbol, timeframe): logistic
+    # regression trained by one SGD step per closed candle on the same features,
+    # standardized with running means/variances (plain averages at first, then
+    # exponentially weighted over about `norm_window` candles). update_predict(df)
+    # learns from the candles that closed since the previous call (the whole frame on
+    # the first) and returns P(next close > close) for the last row, or None until
+    # `min_samples` candles have been learned. Constant, microsecond-scale work per
+    # candle; the last row of `df` is taken to be the forming candle.
+    FEATURES = MLNextMove.FEATURES
+    WARMUP = 20  # rows before the features are fully defined
+
+    def __init__(self, min_samples: int = 100, lr: float = 0.01, l2: float = 1e-4, norm_window: int = 500):
+        self.min_samples = min_samples
+        self.lr = lr
+        self.l2 = l2
+        self.norm_window = norm_window
+        k = len(self.FEATURES)
+        self.w = np.zeros(k)
+        self.b = 0.0
+        self.mean = np.zeros(k)
+        self.var = np.ones(k)
+        self.n = 0
+        self.last_time = None  # close_time of the newest candle used as a label
+
+    @staticmethod
+    def _features(o, h, l, c, v, idx):
+        # MLNextMove._build_features for rows idx only (NaN -> 0 as there)
+        def ret(k):
+            prev = c[np.maximum(idx - k, 0)]
+            return np.where(idx >= k, c[idx] / prev - 1.0, 0.0)
+        prev = c[np.maximum(idx - 1, 0)]
+        hl = np.where(idx >= 1, (h[idx] - l[idx]) / (np.abs(prev) + 1e-9), 0.0)
+        body = (c[idx] - o[idx]) / (np.abs(o[idx]) + 1e-9)
+        cs = np.concatenate([[0.0], np.cumsum(v)])
+        lo = np.maximum(idx - 19, 0)
+        vma = (cs[idx + 1] - cs[lo]) / 20.0
+        vol = np.where(idx >= 19, np.clip(v[idx] / (vma + 1e-9), 0, 10), 0.0)
+        return np.column_stack([ret(1), ret(3), ret(5), hl, body, vol])
+
+    def _scale(self, x):
+        return (x - self.mean) / np.sqrt(self.var + 1e-12)
+
+    def _prob(self, z):
+        s = float(z @ self.w) + self.b
+        return 1.0 / (1.0 + math.exp(-max(-30.0, min(30.0, s))))
+
+    def partial_fit(self, x, y):
+        # one candle: running-stat update, then one SGD step on the log loss
+        self.n += 1
+        a = max(1.0 / self.n, 1.0 / self.norm_window)
+        d = x - self.mean
+        self.mean = self.mean + a * d
+        self.var = (1.0 - a) * (self.var + a * d * d)
+        z = self._scale(x)
+        g = self._prob(z) - y
+        self.w = self.w - self.lr * (g * z + self.l2 * self.w)
+        self.b -= self.lr * g
+
+    def predict_proba(self, x):
+        return self._prob(self._scale(x)) if self.n >= self.min_samples else None
+
+    def update_predict(self, df: pd.DataFrame) -> float | None:
+        if df is None or len(df) < self.WARMUP + 3 or 'close_time' not in df:
+            return None
+        t = df['close_time'].values
+        # sample j pairs row j's features with close[j+1] > close[j]; j+1 must be closed.
+        # Only rows from WARMUP before the first new sample are read.
+        j0 = self.WARMUP if self.last_time is None else int(np.searchsorted(t, self.last_time, side='right')) - 1
+        first = max(0, min(j0, len(df) - 1) - self.WARMUP)
+        o, h, l, c, v = (df[k].to_numpy(dtype=float)[first:] for k in ('open', 'high', 'low', 'close', 'volume'))
+        t = t[first:]
+        last = len(c) - 1
+        js = np.arange(max(j0 - first, self.WARMUP), last - 1)
+        if len(js):
+            X = self._features(o, h, l, c, v, js)
+            up = (c[js + 1] > c[js]).astype(float)
+            for x, y in zip(X, up):
+                self.partial_fit(x, y)
+            self.last_time = t[js[-1] + 1]
+        try:
+            return self.predict_proba(self._features(o, h, l, c, v, np.array([last]))[0])
+        except Exception:
+            return None
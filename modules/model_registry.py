@@ -0,0 +1,154 @@
+import gzip
+import os
+import pickle
+import threading
+import time
+from collections import OrderedDict
+
+# Bounded per-symbol model store, used like the defaultdict it replaces: registry[sym]
+# returns the resident model, else the one snapshotted under `directory`, else a fresh
+# factory() one (`restore(saved)` may adapt or reject a loaded model). At most
+# `max_entries` models stay in memory; past that the least recently used go, symbols
+# outside the last retain() set first. With a directory, evicted models are written
+# out, and snapshot() (called once per sweep, acting every `snapshot_seconds`) saves
+# the ones marked dirty since their last save, so a restart or a symbol re-entering the
+# list picks its fitted model back up instead of training from scratch. Lookups and
+# stores do not mark anything; whoever fits or updates a model calls mark_dirty(key).
+# Disk writes happen after the lock is released; a model evicted while its write is
+# still running is handed back from `writing` rather than reloaded from disk.
+#   <directory>/<KEY>.pkl.gz   gzip'd pickle, replaced atomically
+
+
+class ModelRegistry:
+    def __init__(self, factory, max_entries=64, directory=None, snapshot_seconds=600.0, restore=None, metrics=None):
+        self.default_factory = factory
+        self.max_entries = max(1, int(max_entries))
+        self.directory = directory or None
+        self.snapshot_seconds = snapshot_seconds
+        self.restore = restore
+        self.metrics = metrics
+        self.entries = OrderedDict()
+        self.dirty = set()
+        self.writing = {}
+        self.active = None
+        self.saved_at = time.time()
+        self.lock = threading.RLock()
+        if self.directory:
+            os.makedirs(self.directory, exist_ok=True)
+
+    def _count(self, event, n=1):
+        if self.metrics is not None and n:
+            self.metrics.inc('model_registry_total', n, event=event)
+
+    def path(self, key):
+        return os.path.join(self.directory, f"{str(key).upper()}.pkl.gz")
+
+    def _load(self, key):
+        if self.directory is None or not os.path.exists(self.path(key)):
+            return None
+        try:
+            with gzip.open(self.path(key), 'rb') as fh:
+                model = pickle.load(fh)
+            if self.restore is not None:
+                model = self.restore(model)
+        except Exception as e:
+            print(f"[WARN] model snapshot for {key} unreadable: {e}")
+            return None
+        self._count('loaded')
+        return model
+
+    def _save(self, key, model):
+        p = self.path(key)
+        tmp = p + '.tmp'
+        try:
+            with gzip.open(tmp, 'wb', compresslevel=6) as fh:
+                pickle.dump(model, fh, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp, p)
+        except Exception as e:
+            print(f"[WARN] model snapshot for {key} failed: {e}")
+            return False
+        self._count('saved')
+        return True
+
+    def __getitem__(self, key):
+        with self.lock:
+            model = self.entries.get(key)
+            if model is not None:
+                self.entries.move_to_end(key)
+                return model
+            model = self.writing.get(key)
+            if model is None:
+                model = self._load(key)
+            if model is None:
+                model = self.default_factory()
+                self._count('created')
+            evicted = self._put(key, model)
+        self._write(evicted)
+        return model
+
+    def __setitem__(self, key, model):
+        with self.lock:
+            evicted = self._put(key, model)
+        self._write(evicted)
+
+    def _put(self, key, model):
+        self.entries[key] = model
+        self.entries.move_to_end(key)
+        evicted = self._evict()
+        if self.metrics is not None:
+            self.metrics.gauge('models_resident', len(self.entries))
+        return evicted
+
+    def mark_dirty(self, key):
+        with self.lock:
+            if key in self.entries:
+                self.dirty.add(key)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _evict(self):
+        # drops models past max_entries; returns the dirty ones, for _write() once unlocked
+        out = []
+        while len(self.entries) > self.max_entries:
+            # least recently used first, preferring symbols no longer in the list
+            victim = next((k for k in self.entries if self.active is not None and k not in self.active),
+                          next(iter(self.entries)))
+            model = self.entries.pop(victim)
+            if self.directory is not None and victim in self.dirty:
+                self.writing[victim] = model
+                out.append((victim, model))
+            self.dirty.discard(victim)
+            self._count('evicted')
+        return out
+
+    def _write(self, items):
+        for key, model in items:
+            self._save(key, model)
+            with self.lock:
+                if self.writing.get(key) is model:
+                    del self.writing[key]
+
+    def retain(self, keys):
+        with self.lock:
+            self.active = set(keys)
+            evicted = self._evict()
+        self._write(evicted)
+
+    def snapshot(self, force=False):
+        # saves the models marked dirty since their last save; returns how many were written
+        if self.directory is None or (not force and time.time() - self.saved_at < self.snapshot_seconds):
+            return 0
+        with self.lock:
+            items = [(k, self.entries[k]) for k in self.dirty if k in self.entries]
+            self.dirty.clear()
+            self.saved_at = time.time()
+        return sum(self._save(k, m) for k, m in items)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.dirty.clear()
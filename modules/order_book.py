@@ -0,0 +1,231 @@
+import json
+import time
+from bisect import bisect_left, bisect_right
+from collections import deque
+
+import numpy as np
+
+
+class _Side:
+    # Price levels kept sorted best-first: asks by price, bids by negated price. An
+    # update is a bisect plus a list insert/delete and only invalidates the prefix sums;
+    # the first band read after a batch of updates rebuilds them in one vectorised
+    # cumsum, and every band read is then a bisect plus one array lookup.
+    def __init__(self, sign):
+        self.sign = sign
+        self.keys = []
+        self.qty = []
+        self._cum = None
+
+    def clear(self):
+        self.keys, self.qty, self._cum = [], [], None
+
+    def set(self, price, qty):
+        k = self.sign * price
+        i = bisect_left(self.keys, k)
+        if i < len(self.keys) and self.keys[i] == k:
+            if qty > 0:
+                self.qty[i] = qty
+            else:
+                del self.keys[i], self.qty[i]
+        elif qty > 0:
+            self.keys.insert(i, k)
+            self.qty.insert(i, qty)
+        else:
+            return
+        self._cum = None
+
+    def trim(self, max_levels):
+        if len(self.keys) > max_levels:
+            del self.keys[max_levels:], self.qty[max_levels:]
+            self._cum = None
+
+    def best(self):
+        return (self.sign * self.keys[0], self.qty[0]) if self.keys else (None, 0.0)
+
+    def cum(self):
+        if self._cum is None:
+            self._cum = np.cumsum(self.qty) if self.qty else np.zeros(0)
+        return self._cum
+
+    def qty_through(self, price):
+        # total quantity at levels at or better than `price`
+        n = bisect_right(self.keys, self.sign * price)
+        return float(self.cum()[n - 1]) if n else 0.0
+
+    def qty_levels(self, levels):
+        n = min(levels, len(self.qty))
+        return float(self.cum()[n - 1]) if n > 0 else 0.0
+
+
+class OrderBook:
+    def __init__(self, max_levels=5000):
+        self.bids = _Side(-1)
+        self.asks = _Side(1)
+        self.last_update_id = 0
+        self.max_levels = max_levels
+
+    def load_snapshot(self, snap):
+        self.bids.clear(); self.asks.clear()
+        for p, q in snap.get('bids', []):
+            self.bids.set(float(p), float(q))
+        for p, q in snap.get('asks', []):
+            self.asks.set(float(p), float(q))
+        self.last_update_id = int(snap['lastUpdateId'])
+
+    def apply(self, ev):
+        for p, q in ev.get('b', []):
+            self.bids.set(float(p), float(q))
+        for p, q in ev.get('a', []):
+            self.asks.set(float(p), float(q))
+        self.bids.trim(self.max_levels); self.asks.trim(self.max_levels)
+        self.last_update_id = int(ev['u'])
+
+    def top(self):
+        bid, bq = self.bids.best()
+        ask, aq = self.asks.best()
+        if bid is None or ask is None:
+            return None
+        return {'bid': bid, 'ask': ask, 'bid_qty': bq, 'ask_qty': aq}
+
+    def mid(self):
+        t = self.top()
+        return 0.5 * (t['bid'] + t['ask']) if t else None
+
+    def depth_bps(self, bps):
+        # cumulative (bid, ask) quantity within `bps` basis points of the mid
+        mid = self.mid()
+        if mid is None:
+            return 0.0, 0.0
+        return self.bids.qty_through(mid * (1 - bps / 1e4)), self.asks.qty_through(mid * (1 + bps / 1e4))
+
+    def imbalance_bps(self, bps):
+        b, a = self.depth_bps(bps)
+        return (b - a) / (b + a) if b + a > 0 else 0.0
+
+    def summary(self, levels=20, bands=(10, 25, 50, 100)):
+        # same keys as the REST depth summary plus per-band imbalance
+        b, a = self.bids.qty_levels(levels), self.asks.qty_levels(levels)
+        out = {'liq_bias': float((b - a) / (b + a)) if b + a > 0 else 0.0,
+               'bids_vol': b, 'asks_vol': a}
+        out['bands'] = {int(bps): float(self.imbalance_bps(bps)) for bps in bands}
+        return out
+
+
+class BookSync:
+    # Keeps an OrderBook current from Binance diff-depth events using the documented
+    # snapshot + sequence procedure: buffer events, load a REST snapshot, drop events
+    # with u <= lastUpdateId, require the first applied event to straddle lastUpdateId+1
+    # and every later one to continue at previous u + 1. Any gap drops back to resync.
+    # With `submit` (e.g. an executor's submit) the snapshot is fetched on that worker
+    # and applied by the next on_diff, so the caller's thread never waits on REST;
+    # events keep buffering meanwhile. Failed syncs back off from `min_backoff` doubling
+    # to `max_backoff` seconds; a gap right after a sync continues the backoff.
+    def __init__(self, symbol, fetch_snapshot, max_levels=5000, max_pending=5000, submit=None,
+                 min_backoff=2.0, max_backoff=30.0):
+        self.symbol = symbol
+        self.fetch_snapshot = fetch_snapshot
+        self.book = OrderBook(max_levels)
+        self.synced = False
+        self.pending = deque(maxlen=max_pending)
+        self.submit = submit
+        self.min_backoff = min_backoff
+        self.max_backoff = max_backoff
+        self.backoff = min_backoff
+        self.next_attempt = 0.0
+        self.synced_at = None
+        self.inflight = False
+        self.fetched = None  # (snapshot,) once a worker fetch has finished
+        self.resyncs = 0
+
+    def on_diff(self, ev):
+        if self.synced:
+            if int(ev['u']) <= self.book.last_update_id:
+                return True
+            # U == last + 1 in steady state; right after a snapshot the first event may straddle it
+            if int(ev['U']) <= self.book.last_update_id + 1:
+                self.book.apply(ev)
+                return True
+            print(f"[WARN] {self.symbol} depth sequence gap, resyncing")
+            self.synced = False
+            self.pending.clear()
+            now = time.time()
+            if now - self.synced_at >= self.max_backoff:
+                self.backoff, self.next_attempt = self.min_backoff, now
+            else:
+                self._retry_later(now)
+        self.pending.append(ev)
+        return self._try_sync()
+
+    def _retry_later(self, now):
+        self.next_attempt = now + self.backoff
+        self.backoff = min(self.max_backoff, self.backoff * 2)
+
+    def _fetch(self):
+        try:
+            snap = self.fetch_snapshot(self.symbol)
+        except Exception as e:
+            print(f"[WARN] {self.symbol} depth snapshot failed: {e}")
+            snap = None
+        self.fetched = (snap,)
+
+    def _try_sync(self):
+        now = time.time()
+        if not self.inflight:
+            if now < self.next_attempt:
+                return False
+            self.inflight = True
+            if self.submit is None:
+                self._fetch()
+            else:
+                self.submit(self._fetch)
+        if self.fetched is None:
+            return False
+        (snap,), self.fetched, self.inflight = self.fetched, None, False
+        if self._load(snap):
+            self.synced, self.synced_at = True, now
+            return True
+        self._retry_later(now)
+        return False
+
+    def _load(self, snap):
+        if not snap or 'lastUpdateId' not in snap:
+            return False
+        self.book.load_snapshot(snap)
+        self.resyncs += 1
+        lid = self.book.last_update_id
+        evs = [e for e in self.pending if int(e['u']) > lid]
+        if evs and int(evs[0]['U']) > lid + 1:
+            return False  # snapshot is older than the buffered stream, retry later
+        prev = lid
+        for k, e in enumerate(evs):
+            if int(e['U']) > prev + 1:
+                self.pending = deque(evs[k:], maxlen=self.pending.maxlen)
+                return False
+            self.book.apply(e)
+            prev = int(e['u'])
+        self.pending.clear()
+        return True
+
+
+def load_events(path):
+    with open(path) as fh:
+        out = [json.loads(l) for l in fh if l.strip()]
+    # accept raw events or combined-stream envelopes as recorded by MarketStream
+    return [e.get('data', e) for e in out]
+
+
+def replay(snapshot, events, symbol='REPLAY'):
+    sync = BookSync(symbol, lambda s: snapshot, min_backoff=0.0, max_backoff=0.0)
+    for ev in events:
+        sync.on_diff(ev)
+    return sync
+
+
+if __name__ == '__main__':
+    import sys
+    with open(sys.argv[1]) as fh:
+        snap = json.load(fh)
+    s = replay(snap, load_events(sys.argv[2]))
+    print(json.dumps({'synced': s.synced, 'last_update_id': s.book.last_update_id,
+                      'top': s.book.top(), 'summary': s.book.summary()}, indent=2))
@@ -0,0 +1,99 @@
+import datetime
+import json
+import threading
+
+
+def _round(v, digits):
+    if isinstance(v, float):
+        return float(f"{v:.{digits}g}")
+    if isinstance(v, dict):
+        return {k: _round(x, digits) for k, x in v.items()}
+    if isinstance(v, list):
+        return [_round(x, digits) for x in v]
+    return v
+
+
+def diff(old, new):
+    # changed leaves of `new` relative to `old`; keys that disappeared come back as None
+    if not isinstance(old, dict) or not isinstance(new, dict):
+        return new
+    out = {}
+    for k, v in new.items():
+        if k not in old:
+            out[k] = v
+        elif old[k] != v:
+            out[k] = diff(old[k], v)
+    for k in old:
+        if k not in new:
+            out[k] = None
+    return out
+
+
+def _now():
+    return datetime.datetime.utcnow().isoformat() + "Z"
+
+
+class DeltaPublisher:
+    # Batches per-symbol payloads into one frame per sweep. For every room the state
+    # last sent is kept, so a frame only carries the fields that changed since; new
+    # clients get the full state once on connect. With `digits` floats are rounded to
+    # that many significant digits before diffing (suppressing noise-only deltas) and
+    # frames go out pre-encoded as compact JSON strings. The send time is stamped on
+    # the frame ('ts'), never inside payloads, so it cannot turn every symbol into a delta.
+    def __init__(self, emit, event='top15_delta', digits=None):
+        self.emit = emit
+        self.event = event
+        self.digits = digits
+        self.latest = {}
+        self.summary = None
+        self.sent = {}
+        self.seq = 0
+        self.lock = threading.Lock()
+
+    def _prep(self, obj):
+        return _round(obj, self.digits) if self.digits else obj
+
+    def _encode(self, frame):
+        return json.dumps(frame, separators=(',', ':'), ensure_ascii=False) if self.digits else frame
+
+    def stage(self, sym, payload):
+        with self.lock:
+            self.latest[sym] = self._prep(payload)
+
+    def set_summary(self, summary):
+        with self.lock:
+            self.summary = self._prep(summary)
+
+    def retain(self, syms):
+        keep = set(syms)
+        with self.lock:
+            for sym in [s for s in self.latest if s not in keep]:
+                del self.latest[sym]
+
+    def snapshot(self):
+        with self.lock:
+            return self._encode({'seq': self.seq, 'full': True, 'ts': _now(), 'u': dict(self.latest),
+                                 'summary': self.summary})
+
+    def flush(self, room=None):
+        with self.lock:
+            prev = self.sent.get(room, {'u': {}, 'summary': None})
+            upd = {}
+            for sym, payload in self.latest.items():
+                d = diff(prev['u'].get(sym), payload) if sym in prev['u'] else payload
+                if d:
+                    upd[sym] = d
+            removed = [s for s in prev['u'] if s not in self.latest]
+            summary = self.summary if self.summary != prev['summary'] else None
+            if not upd and not removed and summary is None:
+                return None
+            self.seq += 1
+            frame = {'seq': self.seq, 'ts': _now(), 'u': upd}
+            if removed:
+                frame['rm'] = removed
+            if summary is not None:
+                frame['summary'] = summary
+            self.sent[room] = {'u': dict(self.latest), 'summary': self.summary}
+            data = self._encode(frame)
+        self.emit(self.event, data, room)
+        return frame
@@ -0,0 +1,139 @@
+import math
+
+import numpy as np
+
+
+def parse_tiers(spec):
+    # "15:1,85:5,*:20" -> [(15, 1), (85, 5), (None, 20)]: tier size and cadence in sweeps
+    out = []
+    for part in spec.split(','):
+        size, cadence = part.strip().split(':')
+        out.append((None if size.strip() in ('*', '0') else int(size), max(1, int(cadence))))
+    return out
+
+
+class TieredScheduler:
+    # Picks the symbols to fully recompute on each sweep. Symbols are ranked by a mix
+    # of quote volume and 24h range; tier 0 is computed every sweep, lower tiers once
+    # their cadence has elapsed, or earlier when a cheap pre-screen (volume z-score or
+    # price move since the last full compute) flags them. Everything beyond tier 0 has
+    # to fit the per-sweep request-weight and CPU-seconds budgets; the CPU cost of a
+    # symbol is an EWMA of its measured compute time.
+    def __init__(self, tiers, weight_budget, cpu_budget, full_weight=11, screen_weight=2,
+                 z_threshold=2.0, move_threshold=0.005, alpha=0.2):
+        self.tiers = list(tiers)
+        self.weight_budget = weight_budget
+        self.cpu_budget = cpu_budget
+        self.full_weight = full_weight
+        self.screen_weight = screen_weight
+        self.z_threshold = z_threshold
+        self.move_threshold = move_threshold
+        self.alpha = alpha
+        self.tier = {}
+        self.sweep_no = 0
+        self.last_full = {}
+        self.last_price = {}
+        self.last_screen = {}
+        self.cost = {}
+        self.stats = {}
+
+    def rank(self, rows):
+        # rows: 24h ticker dicts with '_qvol' already set
+        if not rows:
+            return []
+        qvol = np.array([r.get('_qvol', 0.0) for r in rows], dtype=float)
+        vol = np.array([_range_pct(r) for r in rows], dtype=float)
+        score = _pct_rank(qvol) + 0.5 * _pct_rank(vol)
+        order = [rows[i]['symbol'] for i in np.argsort(-score, kind='stable')]
+        self.tier, k = {}, 0
+        for t, (size, _) in enumerate(self.tiers):
+            take = order[k:] if size is None else order[k:k + size]
+            self.tier.update((s, t) for s in take)
+            k += len(take)
+        for d in (self.last_full, self.last_price, self.last_screen, self.cost):
+            for s in [s for s in d if s not in self.tier]:
+                del d[s]
+        return order[:k]
+
+    def _est(self, sym):
+        if self.cost:
+            return self.cost.get(sym, sum(self.cost.values()) / len(self.cost))
+        return 0.0
+
+    def plan(self, screen=None, batch=1, only=None):
+        # screen([sym, ...]) -> [(volume_z, price) or None, ...], called with up to `batch` symbols;
+        # `only` restricts the sweep to those symbols so the rest take no budget
+        self.sweep_no += 1
+        n = self.sweep_no
+        tier = self.tier if only is None else {s: t for s, t in self.tier.items() if s in only}
+        chosen = [s for s, t in tier.items() if t == 0]
+        weight = self.full_weight * len(chosen)
+        cpu = sum(self._est(s) for s in chosen)
+        due, idle = [], []
+        for s, t in tier.items():
+            if t == 0:
+                continue
+            overdue = (n - self.last_full.get(s, -math.inf)) / self.tiers[t][1]
+            (due if overdue >= 1 else idle).append((overdue, s))
+        due.sort(reverse=True)
+
+        def fits(sym):
+            return weight + self.full_weight <= self.weight_budget and cpu + self._est(sym) <= self.cpu_budget
+
+        taken = 0
+        for _, s in due:
+            if not fits(s):
+                break
+            chosen.append(s)
+            weight += self.full_weight
+            cpu += self._est(s)
+            taken += 1
+        flagged = screened = 0
+        if screen is not None:
+            idle.sort(key=lambda x: self.last_screen.get(x[1], -1))  # least recently screened first
+            queue = [s for _, s in idle]
+            while queue:
+                # screens go out `batch` at a time; each must leave room for a full compute
+                spare = self.weight_budget - weight - self.full_weight
+                room = 0 if spare < 0 else len(queue) if self.screen_weight <= 0 else int(spare // self.screen_weight)
+                take, queue = queue[:min(batch, room)], queue[min(batch, room):]
+                if not take:
+                    break
+                weight += self.screen_weight * len(take)
+                screened += len(take)
+                for s, res in zip(take, screen(take)):
+                    self.last_screen[s] = n
+                    if res is None:
+                        continue
+                    z, price = res
+                    prev = self.last_price.get(s)
+                    moved = prev is not None and prev > 0 and abs(price / prev - 1.0) >= self.move_threshold
+                    if (z >= self.z_threshold or moved) and fits(s):
+                        chosen.append(s)
+                        weight += self.full_weight
+                        cpu += self._est(s)
+                        flagged += 1
+        self.stats = {'sweep': n, 'chosen': len(chosen), 'due_skipped': len(due) - taken,
+                      'screened': screened, 'flagged': flagged, 'weight': weight, 'cpu_est': cpu}
+        return chosen
+
+    def record(self, sym, seconds, price=None):
+        self.last_full[sym] = self.sweep_no
+        if price is not None:
+            self.last_price[sym] = price
+        prev = self.cost.get(sym)
+        self.cost[sym] = seconds if prev is None else (1 - self.alpha) * prev + self.alpha * seconds
+
+
+def _range_pct(r):
+    try:
+        last = float(r.get('lastPrice') or 0.0)
+        return (float(r.get('highPrice') or 0.0) - float(r.get('lowPrice') or 0.0)) / last if last > 0 else 0.0
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _pct_rank(x):
+    if len(x) < 2:
+        return np.zeros(len(x))
+    return np.argsort(np.argsort(x, kind='stable'), kind='stable') / (len(x) - 1)
@@ -0,0 +1,191 @@
+import argparse
+import base64
+import hashlib
+import json
+import socket
+import struct
+import threading
+import time
+from urllib.parse import urlparse, parse_qs
+
+# Minimal local stand-in for the Binance combined-stream endpoint. It replays a
+# recorded JSONL file (one {"stream": ..., "data": ...} message per line, as written
+# by MarketStream with STREAM_RECORD_PATH) to every client that connects, keeping only
+# the streams requested in the URL. Usage:
+#   python -m modules.stream_replay recorded.jsonl --port 9001
+#   INGEST_MODE=stream STREAM_URL=ws://127.0.0.1:9001 python app.py
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+
+def _frame(payload: bytes, opcode=0x1) -> bytes:
+    n = len(payload)
+    if n < 126:
+        head = struct.pack('!BB', 0x80 | opcode, n)
+    elif n < 1 << 16:
+        head = struct.pack('!BBH', 0x80 | opcode, 126, n)
+    else:
+        head = struct.pack('!BBQ', 0x80 | opcode, 127, n)
+    return head + payload
+
+
+def _recv_exact(conn, n):
+    buf = b''
+    while len(buf) < n:
+        chunk = conn.recv(n - len(buf))
+        if not chunk:
+            return None
+        buf += chunk
+    return buf
+
+
+def _read_frame(conn):
+    # one client frame -> (opcode, unmasked payload), or None once the peer is gone
+    head = _recv_exact(conn, 2)
+    if head is None:
+        return None
+    opcode, n = head[0] & 0x0F, head[1] & 0x7F
+    if n == 126:
+        n = struct.unpack('!H', _recv_exact(conn, 2) or b'\0\0')[0]
+    elif n == 127:
+        n = struct.unpack('!Q', _recv_exact(conn, 8) or b'\0' * 8)[0]
+    mask = _recv_exact(conn, 4) if head[1] & 0x80 else b''
+    payload = _recv_exact(conn, n) if n else b''
+    if mask is None or payload is None:
+        return None
+    if mask:
+        payload = bytes(b ^ mask[i % 4] for i, b in enumerate(payload))
+    return opcode, payload
+
+
+def load_messages(path):
+    out = []
+    with open(path) as fh:
+        for line in fh:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                out.append(json.loads(line))
+            except Exception:
+                continue
+    return out
+
+
+class ReplayServer:
+    # Each client gets a sender (the replay) and a reader that answers pings with
+    # pongs and a close frame with a close, so long replays survive the client's
+    # keepalive and end cleanly.
+    def __init__(self, messages, host='127.0.0.1', port=0, interval=0.0, loop=False):
+        self.messages = messages
+        self.interval = interval
+        self.loop = loop
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.sock.listen(16)
+        self.host, self.port = self.sock.getsockname()
+        self.stopped = False
+
+    @property
+    def url(self):
+        return f"ws://{self.host}:{self.port}"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.stopped = True
+        self.sock.close()
+
+    def serve_forever(self):
+        while not self.stopped:
+            try:
+                conn, _ = self.sock.accept()
+            except OSError:
+                break
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handshake(self, conn):
+        req = b''
+        while b'\r\n\r\n' not in req:
+            chunk = conn.recv(4096)
+            if not chunk:
+                return None
+            req += chunk
+        lines = req.decode('latin-1').split('\r\n')
+        path = lines[0].split(' ')[1]
+        headers = {k.strip().lower(): v.strip() for k, v in (l.split(':', 1) for l in lines[1:] if ':' in l)}
+        key = headers.get('sec-websocket-key', '')
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        conn.sendall(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {accept}\r\n\r\n").encode())
+        return path
+
+    def _handle(self, conn):
+        try:
+            path = self._handshake(conn)
+            if path is None:
+                conn.close()
+                return
+        except OSError:
+            conn.close()
+            return
+        lock = threading.Lock()
+        closed = threading.Event()
+
+        def send(data):
+            with lock:
+                conn.sendall(data)
+
+        threading.Thread(target=self._read, args=(conn, send, closed), daemon=True).start()
+        wanted = parse_qs(urlparse(path).query).get('streams', [''])[0]
+        wanted = set(s for s in wanted.split('/') if s)
+        try:
+            while not closed.is_set():
+                for msg in self.messages:
+                    if closed.is_set():
+                        break
+                    if wanted and msg.get('stream') not in wanted:
+                        continue
+                    send(_frame(json.dumps(msg).encode()))
+                    if self.interval:
+                        time.sleep(self.interval)
+                if not self.loop:
+                    break
+        except OSError:
+            closed.set()
+        # the reader keeps the connection open until the client goes away or closes it
+        closed.wait()
+        conn.close()
+
+    def _read(self, conn, send, closed):
+        try:
+            while not closed.is_set():
+                frame = _read_frame(conn)
+                if frame is None:
+                    break
+                opcode, payload = frame
+                if opcode == 0x9:
+                    send(_frame(payload, 0xA))
+                elif opcode == 0x8:
+                    send(_frame(payload[:2], 0x8))
+                    break
+        except OSError:
+            pass
+        finally:
+            closed.set()
+
+
+if __name__ == '__main__':
+    ap = argparse.ArgumentParser()
+    ap.add_argument('path')
+    ap.add_argument('--host', default='127.0.0.1')
+    ap.add_argument('--port', type=int, default=9001)
+    ap.add_argument('--interval', type=float, default=0.0)
+    ap.add_argument('--loop', action='store_true')
+    args = ap.parse_args()
+    srv = ReplayServer(load_messages(args.path), args.host, args.port, args.interval, args.loop)
+    print(f"[INFO] replaying {len(srv.messages)} messages on {srv.url}")
+    srv.serve_forever()
@@ -1,15 +1,81 @@
+import copy
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import pandas as pd
 import numpy as np
-from sklearn.ensemble import GradientBoostingRegressor
+from sklearn.ensemble import GradientBoostingRegressor, HistGradientBoostingRegressor
+
+_fit_pool = None
+_fit_pool_lock = threading.Lock()
+
+def _submit_fit(fn, *args):
+    # one shared background thread so refits of many symbols queue up instead of
+    # competing with the poller for CPU
+    global _fit_pool
+    with _fit_pool_lock:
+        if _fit_pool is None:
+            _fit_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='rev-fit')
+    return _fit_pool.submit(fn, *args)
 
 class ReversalTimer:
-    def __init__(self, max_forward: int = 30, min_rows: int = 120):
+    # refit_every: refit after this many new closed candles (1 = every new candle).
+    # drift_threshold: also refit when the mean of the last `drift_window` feature rows
+    # moves more than this many training std devs away (0 disables).
+    # estimator: 'gbr' (fresh GradientBoosting), 'warm' (warm-started GradientBoosting
+    # that grows by `warm_step` trees per refit) or 'hist' (HistGradientBoosting).
+    # async_fit: fit in a background thread and keep predicting with the previous model.
+    # fits counts the refits started, so a holder can tell the model changed.
+    FEATURES = ['ret1','ret3','ret5','rsi','atrp','mom','rng','volz']
+
+    def __init__(self, max_forward: int = 30, min_rows: int = 120, refit_every: int = 1,
+                 drift_threshold: float = 0.0, drift_window: int = 20, estimator: str = 'gbr',
+                 async_fit: bool = False, warm_step: int = 10, warm_max: int = 300):
         self.max_forward = max_forward
         self.min_rows = min_rows
-        self.model = GradientBoostingRegressor(random_state=42)
+        self.refit_every = max(1, int(refit_every))
+        self.drift_threshold = drift_threshold
+        self.drift_window = drift_window
+        self.estimator = estimator
+        self.async_fit = async_fit
+        self.warm_step = warm_step
+        self.warm_max = warm_max
+        self.model = self._make_model()
         self.fitted = False
+        self.fit_close_time = None
+        self.train_stats = None
+        self.fits = 0
+        self._future = None
+        self._lock = threading.Lock()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_future'] = None
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        state.setdefault('fits', 0)
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _make_model(self):
+        if self.estimator == 'hist':
+            return HistGradientBoostingRegressor(random_state=42)
+        return GradientBoostingRegressor(random_state=42, warm_start=(self.estimator == 'warm'))
+
+    def _next_model(self):
+        if self.estimator == 'warm' and self.fitted and self.model.n_estimators + self.warm_step <= self.warm_max:
+            model = copy.deepcopy(self.model)
+            model.n_estimators += self.warm_step
+            return model
+        return self._make_model()
 
     def _features(self, df: pd.DataFrame) -> pd.DataFrame:
+        if all(c in df for c in self.FEATURES):
+            # precomputed by data_features.feature_frame
+            return df[self.FEATURES].fillna(0.0)
         d = df.copy()
         d['ret1'] = d['close'].pct_change()
         d['ret3'] = d['close'].pct_change(3)
@@ -19,36 +85,187 @@ class ReversalTimer:
         d['mom'] = (d['close'] - d['open']) / (d['open'] + 1e-9)
         d['rng'] = (d['high'] - d['low']) / (d['open'] + 1e-9)
         d['volz'] = (d['volume'] / (d['volume'].rolling(20).mean() + 1e-9)).clip(0, 10)
-        return d[['ret1','ret3','ret5','rsi','atrp','mom','rng','volz']].fillna(0.0)
+        return d[self.FEATURES].fillna(0.0)
 
     def _labels(self, df: pd.DataFrame) -> pd.Series:
-        price = df['close'].values
+        # label[i] = first fwd in 1..max_forward where sign(price[i+fwd] - price[i]) differs
+        # from the momentum sign at i, else max_forward. Forward prices are compared in
+        # windows of doubling width and only rows without a reversal yet move on, so the
+        # cost follows the typical reversal distance rather than max_forward.
+        price = df['close'].values.astype(float)
         mom = np.sign(np.diff(price, prepend=price[0]) + 1e-12)
         n = len(price)
         lbl = np.full(n, self.max_forward, dtype=float)
-        for i in range(n-1):
-            cur = mom[i]
-            for fwd in range(1, self.max_forward+1):
-                j = i + fwd
-                if j >= n: break
-                if np.sign(price[j] - price[i]) != cur:
-                    lbl[i] = fwd
-                    break
+        pending = np.arange(n-1)
+        start, width = 1, 4
+        while pending.size and start <= self.max_forward:
+            stop = min(self.max_forward, start + width - 1)
+            j = pending[:, None] + np.arange(start, stop+1)[None, :]
+            hit = (np.sign(price[np.minimum(j, n-1)] - price[pending, None]) != mom[pending, None]) & (j < n)
+            found = hit.any(axis=1)
+            lbl[pending[found]] = start + hit[found].argmax(axis=1)
+            pending = pending[~found & (pending + stop < n-1)]
+            start, width = stop + 1, width * 2
         return pd.Series(lbl, index=df.index)
 
+    def _closed_since_fit(self, df: pd.DataFrame) -> int:
+        if self.fit_close_time is None or 'close_time' not in df:
+            return len(df)
+        return int((df['close_time'].iloc[:-1] > self.fit_close_time).sum())
+
+    def _drifted(self, feats: pd.DataFrame) -> bool:
+        if not self.drift_threshold or self.train_stats is None:
+            return False
+        mu, sd = self.train_stats
+        recent = feats.iloc[-self.drift_window:].mean()
+        return float(((recent - mu).abs() / (sd + 1e-9)).max()) > self.drift_threshold
+
+    @property
+    def pending_fit(self):
+        # the background fit still running, if any
+        fut = self._future
+        return fut if fut is not None and not fut.done() else None
+
+    def needs_refit(self, df: pd.DataFrame, feats: pd.DataFrame) -> bool:
+        if self._future is not None and not self._future.done():
+            return False
+        if not self.fitted:
+            return True
+        return self._closed_since_fit(df) >= self.refit_every or self._drifted(feats)
+
+    def _fit(self, X, y, close_time):
+        model = self._next_model()
+        model.fit(X, y)
+        with self._lock:
+            self.model = model
+            self.fitted = True
+            self.fit_close_time = close_time
+            self.train_stats = (X.mean(), X.std())
+
+    def _fit_logged(self, X, y, close_time):
+        try:
+            self._fit(X, y, close_time)
+        except Exception as e:
+            print(f"[WARN] reversal model fit failed: {e}")
+
     def fit_predict_minutes(self, df: pd.DataFrame) -> float | None:
         if df is None or len(df) < self.min_rows:
             return None
         feats = self._features(df)
-        y = self._labels(df)
-        X = feats.iloc[:-1]
-        y_tr = y.iloc[:-1]
-        if len(X) < self.min_rows:
+        if self.needs_refit(df, feats):
+            y = self._labels(df)
+            X = feats.iloc[:-1]
+            y_tr = y.iloc[:-1]
+            if len(X) < self.min_rows:
+                return None
+            close_time = df['close_time'].iloc[-2] if 'close_time' in df else None
+            self.fits += 1
+            if self.async_fit:
+                self._future = _submit_fit(self._fit_logged, X, y_tr, close_time)
+            else:
+                try:
+                    self._fit(X, y_tr, close_time)
+                except Exception:
+                    return None
+        if not self.fitted:
             return None
         try:
-            self.model.fit(X, y_tr)
-            self.fitted = True
-            pred = float(self.model.predict(feats.iloc[[-1]])[0])
+            with self._lock:
+                model = self.model
+            pred = float(model.predict(feats.iloc[[-1]])[0])
             return max(1.0, min(self.max_forward, pred))
         except Exception:
             return None
+
+class PooledReversal:
+    # One reversal-time model shared by every tracked symbol. Each symbol's rows are
+    # z-scored against its own window before pooling, so volatile and quiet symbols
+    # land on the same scale and thin ones borrow from the rest. rows(df) turns a
+    # frame into (X, y, x_last) and can run anywhere (e.g. a compute worker);
+    # fit_predict_minutes_many() keeps the latest rows per symbol, refits on the
+    # background fit thread every `refit_seconds` (sooner while the number of symbols
+    # with rows keeps doubling, e.g. as a first sweep lands), and predicts every
+    # symbol's last row in one batched call with the current model. `now` overrides
+    # the wall clock for the refit cadence (a replay passes its candle time).
+    def __init__(self, max_forward: int = 30, min_rows: int = 120, refit_seconds: float = 60.0,
+                 rows_per_symbol: int = 300, estimator: str = 'hist', async_fit: bool = True):
+        self.spec = ReversalTimer(max_forward=max_forward, min_rows=min_rows,
+                                  estimator='gbr' if estimator == 'warm' else estimator)
+        self.max_forward = max_forward
+        self.min_rows = min_rows
+        self.refit_seconds = refit_seconds
+        self.rows_per_symbol = rows_per_symbol
+        self.async_fit = async_fit
+        self.samples = {}
+        self.model = None
+        self.fitted_at = None
+        self.fitted_symbols = 0
+        self._future = None
+        self._lock = threading.Lock()
+
+    def rows(self, df: pd.DataFrame):
+        if df is None or len(df) < self.min_rows:
+            return None
+        X = self.spec._features(df).to_numpy(dtype=float)
+        y = self.spec._labels(df).to_numpy()
+        Z = (X - X.mean(axis=0)) / (X.std(axis=0) + 1e-9)
+        return Z[:-1], y[:-1], Z[-1]
+
+    def _fit(self, X, y):
+        model = self.spec._make_model()
+        model.fit(X, y)
+        with self._lock:
+            self.model = model
+
+    def _fit_logged(self, X, y):
+        try:
+            self._fit(X, y)
+        except Exception as e:
+            print(f"[WARN] pooled reversal model fit failed: {e}")
+
+    def maybe_fit(self, now=None):
+        now = time.time() if now is None else now
+        if self._future is not None and not self._future.done():
+            return False
+        with self._lock:
+            parts = list(self.samples.values())
+        grown = len(parts) >= 2 * self.fitted_symbols
+        if self.fitted_at is not None and now - self.fitted_at < self.refit_seconds and not grown:
+            return False
+        if not parts or sum(len(y) for _, y in parts) < self.min_rows:
+            return False
+        X = np.vstack([x for x, _ in parts])
+        y = np.concatenate([y for _, y in parts])
+        self.fitted_at = now
+        self.fitted_symbols = len(parts)
+        if self.async_fit:
+            self._future = _submit_fit(self._fit_logged, X, y)
+        else:
+            self._fit_logged(X, y)
+        return True
+
+    def fit_predict_minutes_many(self, symbols, rows, now=None):
+        with self._lock:
+            for sym, r in zip(symbols, rows):
+                if r is not None:
+                    self.samples[sym] = (r[0][-self.rows_per_symbol:], r[1][-self.rows_per_symbol:])
+        self.maybe_fit(now)
+        out = [None] * len(rows)
+        with self._lock:
+            model = self.model
+        idx = [i for i, r in enumerate(rows) if r is not None]
+        if model is None or not idx:
+            return out
+        try:
+            pred = model.predict(np.stack([rows[i][2] for i in idx]))
+        except Exception:
+            return out
+        for i, p in zip(idx, pred):
+            out[i] = max(1.0, min(self.max_forward, float(p)))
+        return out
+
+    def retain(self, symbols):
+        keep = set(symbols)
+        with self._lock:
+            for sym in [s for s in self.samples if s not in keep]:
+                del self.samples[sym]
@@ -2,6 +2,8 @@ import requests
 import pandas as pd
 import time
 
+from modules.kline_codec import decode_twelvedata, frame_from_columns
+
 BASE_URL = "https://api.twelvedata.com"
 
 def fetch_forex_klines(symbol="EUR/USD", interval="1min", outputsize=300, api_key=None, retries=3):
@@ -19,13 +21,7 @@ def fetch_forex_klines(symbol="EUR/USD", interval="1min", outputsize=300, api_ke
                 print(f"[WARN] {symbol} returned invalid data: {msg}")
                 return pd.DataFrame()
 
-            df = pd.DataFrame(js["values"])
-            df = df.rename(columns={"datetime":"close_time"})
-            df["close_time"] = pd.to_datetime(df["close_time"])
-            for col in ["open","high","low","close","volume"]:
-                df[col] = pd.to_numeric(df[col], errors="coerce").fillna(0.0)
-            df = df.sort_values("close_time").reset_index(drop=True)
-            return df
+            return frame_from_columns(decode_twelvedata(js["values"]), utc=False)
         except Exception as e:
             print(f"[WARN] retry {i+1}/{retries} for {symbol}: {e}")
             time.sleep(2)
@@ -1,4 +1,5 @@
-const socket = io();
+// websocket-only so any web worker can take the connection without sticky sessions
+const socket = io({transports: ['websocket']});
 const grid = document.getElementById('grid');
 const ts = document.getElementById('ts');
 const latest = new Map();
@@ -29,6 +30,7 @@ function tfBadge(tf, data){
   const rsi = data.rsi!=null ? Number(data.rsi).toFixed(1) : '—';
   const atr = data.atr!=null ? Number(data.atr).toFixed(6) : '—';
   const tp = data.tp_pct!=null ? Number(data.tp_pct).toFixed(2)+'%' : '—';
+  const ml = data.ml_prob!=null ? (data.ml_prob*100).toFixed(0)+'%🔼' : '—';
 
   const phase = data.trend_phase || 'Neutral';
   const phaseColor = data.trend_color || 'gray';
@@ -53,6 +55,7 @@ function tfBadge(tf, data){
       ${small('RSI', rsi)}
       ${small('ATR', atr)}
       ${small('TP', tp, 'text-indigo-700')}
+      ${small('ML', ml)}
     </div>
   </div>`;
 }
@@ -122,32 +125,33 @@ function pressureLabel(p){
   return '⚪ ضغط محايد';
 }
 
-function rebuildGrid(){
-  const entries = Array.from(latest.entries());
-  entries.sort((a,b)=>{
-    const aPrice = a[1]?.tfs?.['1m']?.price ?? 0;
-    const bPrice = b[1]?.tfs?.['1m']?.price ?? 0;
-    return bPrice - aPrice;
-  });
+const cards = new Map();
+let lastSeq = 0;
 
-  grid.innerHTML = '';
-  for (const [sym, payload] of entries){
-    const name = payload.name || sym.replace('USDT','/USDT');
-    const card = buildCard(sym, name);
-    grid.appendChild(card);
+function merge(dst, src){
+  for (const k in src){
+    const v = src[k];
+    if (v && typeof v === 'object' && !Array.isArray(v) && dst[k] && typeof dst[k] === 'object') merge(dst[k], v);
+    else dst[k] = v;
+  }
+  return dst;
+}
+
+function renderCard(card, payload, delta){
+  // only the sections touched by the delta are re-rendered
+  if (delta.name) card.querySelector('[data-name]').textContent = payload.name;
 
+  if (delta.tfs){
     const p = payload.tfs?.['1m']?.price ?? null;
-    const priceEl = card.querySelector('[data-price]');
-    if (p!=null) priceEl.textContent = Number(p).toFixed(6);
+    if (p!=null) card.querySelector('[data-price]').textContent = Number(p).toFixed(6);
 
-    const tfsEl = card.querySelector('[data-tfs]');
     const tfs = payload.tfs || {};
     ['1m','5m','10m'].forEach(tf => { if(!tfs[tf]) tfs[tf] = {dir:0,conf:0,time:null}; });
-    tfsEl.innerHTML = ['1m','5m','10m'].map(tf => tfBadge(tf, tfs[tf])).join('');
-
-    const dir1 = tfs['1m'].dir;
-    setCardColor(card, dir1);
+    card.querySelector('[data-tfs]').innerHTML = ['1m','5m','10m'].map(tf => tfBadge(tf, tfs[tf])).join('');
+    setCardColor(card, tfs['1m'].dir);
+  }
 
+  if (delta.extras){
     const exEl = card.querySelector('[data-extras]');
     const sp = payload.extras?.spread_pct ?? null;
     const imb = payload.extras?.imbalance ?? null;
@@ -168,9 +172,6 @@ function rebuildGrid(){
       </div>
     `;
 
-    const recEl = card.querySelector('[data-reco]');
-    recEl.innerHTML = renderRecommendation(payload.recommendation);
-
     const tmEl = card.querySelector('[data-timing]');
     const pm = payload.extras?.pred_minutes ?? null;
     if (pm!=null){
@@ -181,15 +182,24 @@ function rebuildGrid(){
       tmEl.innerHTML = `<div class="text-[12px] text-gray-400">⏱ التقدير الزمني غير متاح بعد</div>`;
     }
   }
+
+  if ('recommendation' in delta){
+    card.querySelector('[data-reco]').innerHTML = renderRecommendation(payload.recommendation);
+  }
 }
 
-socket.on('top15_update', (payload)=>{
-  ts.textContent = 'آخر تحديث: '+new Date().toLocaleTimeString();
-  latest.set(payload.symbol, payload);
-  rebuildGrid();
-});
+function orderGrid(){
+  const order = Array.from(latest.entries()).sort((a,b)=>{
+    const aPrice = a[1]?.tfs?.['1m']?.price ?? 0;
+    const bPrice = b[1]?.tfs?.['1m']?.price ?? 0;
+    return bPrice - aPrice;
+  }).map(([sym]) => cards.get(sym));
+  // move nodes only when the order actually changed
+  if (order.every((card, i) => grid.children[i] === card)) return;
+  order.forEach(card => grid.appendChild(card));
+}
 
-socket.on('market_summary', (s)=>{
+function applySummary(s){
   elSumTs.textContent = 'آخر تحديث: '+new Date().toLocaleTimeString();
   elConf.textContent = 'Avg Confidence: '+(s.avg_conf_pct!=null ? s.avg_conf_pct.toFixed(1)+'%' : '—');
   elLiq.textContent = 'Liquidity Bias: '+(s.liq_bias_pct!=null ? (s.liq_bias_pct>=0?'+':'')+s.liq_bias_pct.toFixed(1)+'%' : '—');
@@ -204,4 +214,39 @@ socket.on('market_summary', (s)=>{
   elTrend.textContent = trendBadge;
   elTrend.className = 'px-2 py-0.5 rounded '+cls;
   summaryBox.className = 'mt-2 rounded-lg border px-3 py-2 text-sm '+cls;
+}
+
+socket.on('top15_delta', (raw)=>{
+  const frame = typeof raw === 'string' ? JSON.parse(raw) : raw;
+  if (frame.full){
+    latest.clear();
+    cards.forEach(card => card.remove());
+    cards.clear();
+  } else if (frame.seq !== lastSeq + 1){
+    // missed a frame: ask for a fresh snapshot instead of merging onto stale state
+    socket.emit('resync');
+    return;
+  }
+  lastSeq = frame.seq;
+  ts.textContent = 'آخر تحديث: '+new Date().toLocaleTimeString();
+
+  for (const sym of frame.rm || []){
+    latest.delete(sym);
+    cards.get(sym)?.remove();
+    cards.delete(sym);
+  }
+  for (const [sym, delta] of Object.entries(frame.u || {})){
+    const payload = merge(latest.get(sym) || {}, delta);
+    latest.set(sym, payload);
+    let card = cards.get(sym);
+    if (!card){
+      card = buildCard(sym, payload.name);
+      cards.set(sym, card);
+      renderCard(card, payload, payload);
+    } else {
+      renderCard(card, payload, delta);
+    }
+  }
+  orderGrid();
+  if (frame.summary) applySummary(frame.summary);
 });
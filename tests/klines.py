@@ -0,0 +1,35 @@
+import numpy as np
+
+# Synthetic 1m klines in the raw Binance row format, shared by the candle tests.
+T0 = 1_700_000_040_000 - 1_700_000_040_000 % 900_000
+
+
+def kline_rows(n, seed=0):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.002, n)))
+    rows = []
+    for i, c in enumerate(close):
+        o = close[i - 1] if i else c
+        ot = T0 + i * 60_000
+        rows.append([ot, f"{o:.6f}", f"{max(o, c) * 1.001:.6f}", f"{min(o, c) * 0.999:.6f}", f"{c:.6f}",
+                     f"{rng.uniform(5, 50):.3f}", ot + 59_999, "0", 1, "0", "0", "0"])
+    return rows
+
+
+def forming(row, frac):
+    # the same candle earlier in its minute: partial move and volume
+    o, c = float(row[1]), float(row[4])
+    px = o + (c - o) * frac
+    return row[:2] + [f"{max(o, px):.6f}", f"{min(o, px):.6f}", f"{px:.6f}", f"{float(row[5]) * frac:.3f}"] + row[6:]
+
+
+def fetcher(rows):
+    def fetch(symbol, interval, limit, start_time=None):
+        return rows[-limit:]
+    return fetch
+
+
+def assert_same(a, b):
+    assert len(a) == len(b)
+    for c in ('open_time', 'open', 'high', 'low', 'close', 'volume', 'close_time') + tuple(a.factories):
+        np.testing.assert_array_equal(a.view(c), b.view(c), err_msg=c)
@@ -0,0 +1,78 @@
+import threading
+import time
+
+import pytest
+from binance.error import ClientError
+
+from modules.binance_client import TokenBucket, make_client
+from modules.fake_exchange import FakeExchange
+
+
+@pytest.fixture
+def exchange():
+    srv = FakeExchange(symbols=['BTCUSDT'])
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield srv
+    srv.shutdown()
+    srv.server_close()
+
+
+def test_bucket_refills_at_rate_up_to_capacity():
+    bucket = TokenBucket(60, window=60.0)  # one token per second
+    assert bucket.reserve(60) == 0.0
+    assert bucket.reserve(5) == pytest.approx(5.0, abs=0.1)
+    bucket.stamp -= 5.0
+    assert bucket.reserve(5) == 0.0
+    bucket.stamp -= 1000.0
+    bucket._refill()
+    assert bucket.tokens == 60.0
+
+
+def test_bucket_sync_only_lowers_the_level():
+    bucket = TokenBucket(4800)  # 80% of a 6000 weight limit
+    bucket.sync(3000, 6000)
+    assert bucket.tokens == pytest.approx(2400.0, abs=1.0)
+    bucket.tokens = 100.0
+    bucket.sync(0, 6000)
+    assert bucket.tokens == pytest.approx(100.0, abs=1.0)
+
+
+def test_take_waits_for_tokens():
+    bucket = TokenBucket(60, window=6.0)  # ten tokens per second
+    bucket.take(60)
+    started = time.monotonic()
+    bucket.take(3)
+    assert time.monotonic() - started >= 0.25
+
+
+def test_retry_after_blocks_every_thread(exchange):
+    client = make_client(timeout=5, base_url=exchange.url, base_delay=0.01)
+    exchange.fail_next(429, retry_after=1)
+    started = time.time()
+    rows = client.klines('BTCUSDT', interval='1m', limit=5)
+    assert len(rows) == 5
+    assert time.time() - started >= 0.9
+    assert client.blocked_until >= started + 1.0
+
+    exchange.fail_next(418, retry_after=1)
+    done = {}
+
+    def other():
+        time.sleep(0.2)  # starts while the first call is already paused
+        t0 = time.time()
+        client.book_ticker('BTCUSDT')
+        done['waited'] = time.time() - t0
+
+    t = threading.Thread(target=other)
+    t.start()
+    client.depth('BTCUSDT', limit=5)
+    t.join()
+    assert done['waited'] >= 0.5
+
+
+def test_other_client_errors_are_not_retried(exchange):
+    client = make_client(timeout=5, base_url=exchange.url)
+    with pytest.raises(ClientError) as err:
+        client.klines('NOPEUSDT', interval='1m', limit=5)
+    assert err.value.status_code == 400
+    assert exchange.hits['klines'] == 1
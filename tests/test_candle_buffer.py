@@ -0,0 +1,51 @@
+from klines import assert_same, forming, kline_rows
+
+from modules.candle_store import CandleBuffer, CandleStore
+from modules.kline_codec import decode_klines
+
+
+def test_tail_upserts_match_a_fresh_seed():
+    rows = kline_rows(300)
+    live = CandleBuffer(400)
+    live.seed(decode_klines(rows[:200]))
+    for k in range(200, 300):
+        live.upsert(decode_klines([forming(rows[k], 0.5)]))
+        live.upsert(decode_klines(rows[k - 1:k + 1]))  # previous candle re-sent with the final one
+    fresh = CandleBuffer(400)
+    fresh.seed(decode_klines(rows))
+    assert_same(live, fresh)
+
+
+def test_upsert_keeps_a_sliding_window():
+    rows = kline_rows(120)
+    live = CandleBuffer(50)
+    live.seed(decode_klines(rows[:10]))
+    for k in range(10, 120):
+        live.upsert(decode_klines([rows[k]]))
+    fresh = CandleBuffer(50)
+    fresh.seed(decode_klines(rows))
+    assert_same(live, fresh)
+    assert live.view('open_time')[0] == rows[70][0]
+
+
+def test_tail_refresh_reseeds_after_missed_candles():
+    rows = kline_rows(100)
+    feed = {'rows': rows[:60]}
+    store = CandleStore(lambda s, i, limit, start_time=None: feed['rows'][-limit:], tail_limit=2)
+    store.refresh('X', '1m', 80)
+    feed['rows'] = rows[:61]
+    assert len(store.refresh('X', '1m', 80)) == 61
+    feed['rows'] = rows  # 39 candles missed: the 2-row tail no longer overlaps
+    buf = store.refresh('X', '1m', 80)
+    assert len(buf) == 80 and buf.last_open_time == rows[-1][0]
+
+
+def test_identical_rows_leave_the_version_alone():
+    rows = kline_rows(30)
+    buf = CandleBuffer(50)
+    buf.seed(decode_klines(rows))
+    v = buf.version
+    buf.upsert(decode_klines(rows[-3:]))
+    assert buf.version == v
+    buf.upsert(decode_klines([forming(rows[-1], 0.5)]))
+    assert buf.version != v
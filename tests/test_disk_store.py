@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+from klines import T0, kline_rows
+
+from modules import candle_store
+from modules.candle_store import CandleStore
+from modules.disk_store import CandleDisk, run_start
+from modules.kline_codec import decode_klines
+
+ROWS = kline_rows(200)
+
+
+def gapped_disk(root):
+    # rows 0..99 and 150..169 on disk: the process was down for 50 minutes
+    disk = CandleDisk(str(root))
+    for part in (ROWS[:100], ROWS[150:170]):
+        disk.append('X', '1m', decode_klines(part), now_ms=T0 + 200 * 60_000)
+    return disk
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    monkeypatch.setattr(candle_store.time, 'time', lambda: (T0 + 199 * 60_000 + 30_000) / 1000)
+    calls = []
+
+    def fetch(symbol, interval, limit, start_time=None):
+        calls.append(start_time)
+        rows = ROWS if start_time is None else [r for r in ROWS if r[0] >= start_time]
+        return rows[-limit:] if start_time is None else rows[:limit]
+
+    s = CandleStore(fetch, disk=gapped_disk(tmp_path))
+    s.calls = calls
+    return s
+
+
+def test_run_start():
+    assert run_start(np.arange(5) * 60, 60) == 0
+    assert run_start(np.array([0, 60, 240, 300, 360]), 60) == 2
+
+
+def test_load_range_keeps_the_run_after_a_gap(tmp_path):
+    part = gapped_disk(tmp_path).load_range('X', '1m')
+    assert list(part['open_time']) == [r[0] for r in ROWS[150:170]]
+
+
+def test_seed_refetches_when_the_run_after_a_gap_is_short(store):
+    buf = store.refresh('X', '1m', 60)
+    assert store.calls == [ROWS[169][0], None]
+    assert list(buf.view('open_time')) == [r[0] for r in ROWS[140:200]]
+
+
+def test_seed_uses_the_disk_tail_when_it_covers_the_lookback(store):
+    buf = store.refresh('X', '1m', 40)
+    assert store.calls == [ROWS[169][0]]
+    assert list(buf.view('open_time')) == [r[0] for r in ROWS[160:200]]
@@ -0,0 +1,48 @@
+from functools import partial
+
+import numpy as np
+import pandas as pd
+import pytest
+from klines import assert_same, forming, kline_rows
+
+from modules.candle_store import CandleBuffer
+from modules.indicators import ADX, ATR, EMA, RSI, _Streaming, adx, atr, ema, rsi
+from modules.kline_codec import decode_klines
+
+INDICATORS = {'rsi14': partial(RSI, 14), 'atr14': partial(ATR, 14), 'adx14': partial(ADX, 14),
+              'ema20': partial(EMA, 20)}
+
+
+def test_streaming_matches_the_batch_functions():
+    cols = decode_klines(kline_rows(300))
+    df = pd.DataFrame({c: cols[c] for c in ('high', 'low', 'close')})
+    ind = {'rsi': RSI(14), 'atr': ATR(14), 'adx': ADX(14), 'ema': EMA(20)}
+    out = {k: [] for k in ind}
+    for i in range(len(df)):
+        for k, x in ind.items():
+            out[k].append(x.update(*[cols[c][i] for c in x.inputs]))
+    np.testing.assert_array_equal(out['rsi'], rsi(df['close'], 14).to_numpy())
+    np.testing.assert_array_equal(out['atr'], atr(df, 14).to_numpy())
+    np.testing.assert_array_equal(out['adx'], adx(df, 14).to_numpy())
+    np.testing.assert_array_equal(out['ema'], ema(df['close'], 20).to_numpy())
+
+
+def test_base_class_is_abstract():
+    with pytest.raises(TypeError):
+        _Streaming()
+
+
+def test_revised_candles_match_a_fresh_seed():
+    rows = kline_rows(300)
+    live = CandleBuffer(400, INDICATORS)
+    live.seed(decode_klines(rows[:200]))
+    for k in range(200, 300):
+        for frac in (0.3, 0.7):
+            live.upsert(decode_klines([forming(rows[k], frac)]))
+        live.upsert(decode_klines(rows[k - 1:k + 1]))
+        if k % 25 == 0:
+            live.upsert(decode_klines([forming(rows[k - 3], 0.5)]))  # an older candle revised ...
+            live.upsert(decode_klines(rows[k - 3:k + 1]))  # ... and restored
+    fresh = CandleBuffer(400, INDICATORS)
+    fresh.seed(decode_klines(rows))
+    assert_same(live, fresh)
@@ -0,0 +1,111 @@
+import json
+import time
+
+import websocket
+
+from modules.candle_store import CandleStore
+from modules.market_stream import MarketStream
+from modules.stream_replay import ReplayServer, load_messages
+
+SYM = 'XUSDT'
+NOW = int(time.time() // 60) * 60_000  # open time of the forming minute
+
+
+def kline_row(ot, close):
+    return [ot, f"{close - 0.1:.4f}", f"{close + 0.5:.4f}", f"{close - 0.5:.4f}", f"{close:.4f}", "10.0",
+            ot + 59_999, "0", 1, "0", "0", "0"]
+
+
+def kline_msg(ot, close, closed):
+    r = kline_row(ot, close)
+    k = {'t': r[0], 'T': r[6], 'i': '1m', 'o': r[1], 'h': r[2], 'l': r[3], 'c': r[4], 'v': r[5], 'x': closed}
+    return {'stream': f"{SYM.lower()}@kline_1m", 'data': {'e': 'kline', 's': SYM, 'k': k}}
+
+
+def depth_msg(first, last):
+    return {'stream': f"{SYM.lower()}@depth@100ms",
+            'data': {'e': 'depthUpdate', 's': SYM, 'U': first, 'u': last, 'b': [['99.0', str(last % 7 + 1)]], 'a': []}}
+
+
+def recording():
+    # closed candles for the last four minutes and two updates of the forming one, then
+    # diff-depth events 101..110, a gap, and 200..279
+    msgs = [kline_msg(NOW - m * 60_000, 100.0 + m, True) for m in range(4, 0, -1)]
+    msgs += [kline_msg(NOW, 101.0, False), kline_msg(NOW, 102.5, False)]
+    msgs += [depth_msg(u, u) for u in range(101, 111)]
+    msgs += [depth_msg(u, u) for u in range(200, 280)]
+    return msgs
+
+
+def seeded_store():
+    rows = [kline_row(NOW - m * 60_000, 100.0) for m in range(59, 4, -1)]  # up to five minutes ago
+    calls = []
+
+    def fetch(symbol, interval, limit, start_time=None):
+        calls.append(limit)
+        return rows[-limit:]
+    store = CandleStore(fetch)
+    store.refresh(SYM, '1m', 60)  # as left by an earlier connection
+    calls.clear()
+    return store, calls
+
+
+def snapshots():
+    calls = []
+
+    def snapshot(symbol):
+        calls.append(symbol)
+        lid = 100 if len(calls) == 1 else 205
+        return {'lastUpdateId': lid, 'bids': [['99.0', '1'], ['98.0', '2']], 'asks': [['101.0', '1']]}
+    return snapshot, calls
+
+
+def wait_for(cond, timeout=10.0):
+    end = time.time() + timeout
+    while time.time() < end:
+        if cond():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def test_stream_advances_candles_and_resyncs_the_book(tmp_path):
+    path = tmp_path / 'rec.jsonl'
+    path.write_text('\n'.join(json.dumps(m) for m in recording()) + '\n')
+    srv = ReplayServer(load_messages(str(path)), interval=0.05).start()
+    store, fetches = seeded_store()
+    snapshot, snaps = snapshots()
+    stream = MarketStream(store, {'1m': 60}, url=srv.url, min_interval=0.05, snapshot=snapshot)
+    stream.start([SYM])
+    try:
+        assert stream.wait_dirty(5.0) == [SYM]
+        buf = store.get(SYM, '1m')
+        assert wait_for(lambda: buf.last_open_time == NOW and buf.view('close')[-1] == 102.5)
+        assert len(buf) == 60
+        assert list(buf.view('close')[-5:-1]) == [104.0, 103.0, 102.0, 101.0]
+        # one tail pull of the missed candles plus an overlapping row, no reseed
+        assert len(fetches) == 1 and fetches[0] <= 7
+
+        assert wait_for(lambda: len(snaps) == 2 and stream.syncs[SYM].synced, timeout=15.0)
+        assert wait_for(lambda: stream.syncs[SYM].book.last_update_id == 279)
+        assert stream.syncs[SYM].resyncs == 2
+        assert stream.depth(SYM)['bids_vol'] > 0
+    finally:
+        stream.stop()
+        srv.stop()
+
+
+def test_replay_server_answers_pings_and_close():
+    srv = ReplayServer([kline_msg(NOW, 100.0, False)]).start()
+    ws = websocket.create_connection(srv.url + '/stream?streams=xusdt@kline_1m', timeout=5)
+    try:
+        assert json.loads(ws.recv())['data']['k']['c'] == '100.0000'
+        ws.ping('keepalive')
+        frame = ws.recv_data_frame(control_frame=True)[1]
+        assert frame.opcode == websocket.ABNF.OPCODE_PONG and frame.data == b'keepalive'
+        ws.send_close()
+        frame = ws.recv_data_frame(control_frame=True)[1]
+        assert frame.opcode == websocket.ABNF.OPCODE_CLOSE
+    finally:
+        ws.shutdown()
+        srv.stop()
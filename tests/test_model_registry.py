@@ -0,0 +1,46 @@
+import threading
+
+from modules.model_registry import ModelRegistry
+
+
+class Model:
+    def __init__(self):
+        self.fits = 0
+
+
+def test_lookups_do_not_mark_models_dirty(tmp_path):
+    reg = ModelRegistry(Model, directory=str(tmp_path), snapshot_seconds=0)
+    m = reg['A']
+    assert reg['A'] is m
+    assert reg.snapshot(force=True) == 0
+    m.fits += 1
+    reg.mark_dirty('A')
+    assert reg.snapshot(force=True) == 1
+    assert reg.snapshot(force=True) == 0
+
+
+def test_evicted_models_are_written_outside_the_lock(tmp_path):
+    reg = ModelRegistry(Model, max_entries=1, directory=str(tmp_path))
+    free = []
+    save = reg._save
+
+    def checked_save(key, model):
+        t = threading.Thread(target=lambda: free.append(reg.lock.acquire(timeout=1.0) and reg.lock.release() is None))
+        t.start()
+        t.join()
+        return save(key, model)
+
+    reg._save = checked_save
+    reg['A'].fits = 3
+    reg.mark_dirty('A')
+    reg['B']  # evicts A
+    assert free == [True]
+    assert 'A' not in reg and not reg.writing
+    assert reg['A'].fits == 3  # reloaded from its snapshot
+
+
+def test_clean_models_are_not_rewritten_on_eviction(tmp_path):
+    reg = ModelRegistry(Model, max_entries=1, directory=str(tmp_path))
+    reg['A']
+    reg['B']
+    assert not (tmp_path / 'A.pkl.gz').exists()
@@ -0,0 +1,92 @@
+import pytest
+
+from modules.order_book import BookSync, OrderBook, replay
+
+SNAP = {'lastUpdateId': 100, 'bids': [['10.0', '1'], ['9.0', '2']], 'asks': [['11.0', '1'], ['12.0', '3']]}
+
+
+def ev(first, last, bids=(), asks=()):
+    return {'U': first, 'u': last, 'b': [list(x) for x in bids], 'a': [list(x) for x in asks]}
+
+
+def test_replay_drops_stale_events_and_applies_the_straddling_one():
+    s = replay(SNAP, [ev(95, 99, bids=[('10.0', '50')]), ev(100, 102, bids=[('10.0', '5')]),
+                      ev(103, 104, asks=[('11.0', '0')])])
+    assert s.synced
+    assert s.book.last_update_id == 104
+    assert s.book.top() == {'bid': 10.0, 'ask': 12.0, 'bid_qty': 5.0, 'ask_qty': 3.0}
+
+
+def test_snapshot_older_than_the_stream_is_retried():
+    snaps = [SNAP, dict(SNAP, lastUpdateId=120)]
+    s = BookSync('X', lambda sym: snaps.pop(0), min_backoff=0.0, max_backoff=0.0)
+    assert not s.on_diff(ev(110, 112))  # first event already past 101: snapshot too old
+    assert not s.synced
+    assert s.on_diff(ev(113, 121))
+    assert s.synced and s.book.last_update_id == 121
+
+
+def test_gap_resyncs_from_a_fresh_snapshot():
+    snaps = [SNAP, dict(SNAP, lastUpdateId=200, bids=[['10.5', '7']])]
+    s = BookSync('X', lambda sym: snaps.pop(0), min_backoff=0.0, max_backoff=0.0)
+    assert s.on_diff(ev(101, 101))
+    assert s.on_diff(ev(150, 201))  # gap: 102..149 missing, resynced on the new snapshot
+    assert s.synced and s.resyncs == 2
+    assert s.book.last_update_id == 201
+    assert s.book.top()['bid'] == 10.5
+
+
+def test_failed_snapshots_back_off():
+    calls = []
+
+    def fetch(sym):
+        calls.append(sym)
+        return None
+
+    s = BookSync('X', fetch, min_backoff=10.0, max_backoff=40.0)
+    assert not s.on_diff(ev(101, 101))
+    assert not s.on_diff(ev(102, 102))
+    assert len(calls) == 1  # still inside the backoff window
+    assert s.backoff == 20.0
+    s.next_attempt = 0.0
+    s.on_diff(ev(103, 103))
+    assert len(calls) == 2 and s.backoff == 40.0
+    s.next_attempt = 0.0
+    s.on_diff(ev(104, 104))
+    assert s.backoff == 40.0
+    assert len(s.pending) == 4
+
+
+def test_gap_right_after_a_sync_backs_off():
+    s = BookSync('X', lambda sym: SNAP, min_backoff=5.0, max_backoff=30.0)
+    assert s.on_diff(ev(101, 101))
+    assert not s.on_diff(ev(150, 151))
+    assert not s.synced and s.resyncs == 1
+    assert s.next_attempt > s.synced_at
+
+
+def test_worker_fetch_is_applied_by_the_next_diff():
+    jobs = []
+    s = BookSync('X', lambda sym: SNAP, submit=jobs.append)
+    assert not s.on_diff(ev(99, 100))
+    assert not s.on_diff(ev(101, 102))
+    assert len(jobs) == 1 and s.inflight
+    jobs.pop()()  # the worker finishes; nothing is applied on its thread
+    assert not s.synced
+    assert s.on_diff(ev(103, 103, bids=[('9.0', '0')]))
+    assert s.book.last_update_id == 103
+    assert s.book.summary(5)['bids_vol'] == pytest.approx(1.0)
+    assert not jobs
+
+
+def test_band_quantities():
+    book = OrderBook()
+    book.load_snapshot({'lastUpdateId': 1, 'bids': [['100.0', '1'], ['99.95', '2'], ['99.0', '4']],
+                        'asks': [['100.1', '3'], ['100.2', '5']]})
+    assert book.bids.qty_through(99.95) == 3.0
+    assert book.asks.qty_through(100.15) == 3.0
+    assert book.asks.qty_levels(10) == 8.0
+    assert book.bids.qty_through(101.0) == 0.0
+    book.apply({'U': 2, 'u': 2, 'b': [['99.95', '0'], ['99.97', '6']], 'a': [['100.1', '1']]})
+    assert book.bids.qty_through(99.95) == 7.0
+    assert book.asks.qty_levels(1) == 1.0
@@ -0,0 +1,34 @@
+from functools import partial
+
+import pytest
+from klines import assert_same, fetcher, forming, kline_rows
+
+from modules.candle_store import CandleStore
+from modules.indicators import ATR, RSI
+from modules.kline_codec import decode_klines
+
+INDICATORS = {'rsi14': partial(RSI, 14), 'atr14': partial(ATR, 14)}
+
+
+@pytest.mark.parametrize('interval,minutes', [('5m', 5), ('15m', 15)])
+def test_stream_rollup_matches_a_fresh_seed(interval, minutes):
+    rows = kline_rows(360, seed=1)
+    live = CandleStore(fetcher(rows[:180]), indicators=INDICATORS, rollups={interval: 200})
+    live.refresh('X', '1m', 400)
+    for k in range(180, 360):
+        for row in (forming(rows[k], 0.4), rows[k]):
+            assert live.merge('X', '1m', decode_klines([row])) is not None
+    fresh = CandleStore(fetcher(rows), indicators=INDICATORS, rollups={interval: 200})
+    fresh.refresh('X', '1m', 400)
+    assert_same(live.get('X', '1m'), fresh.get('X', '1m'))
+    assert_same(live.get('X', interval), fresh.get('X', interval))
+    assert len(fresh.get('X', interval)) == 360 // minutes
+
+
+def test_partial_first_bucket_is_skipped():
+    rows = kline_rows(33)[2:]  # starts two minutes into a 5m bucket
+    store = CandleStore(fetcher(rows), rollups={'5m': 20})
+    store.refresh('X', '1m', 40)
+    buf = store.get('X', '5m')
+    assert buf.view('open_time')[0] == rows[3][0]
+    assert len(buf) == 6
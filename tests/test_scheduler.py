@@ -0,0 +1,28 @@
+from modules.scheduler import TieredScheduler
+
+
+def scheduler(tiers=((1, 1), (None, 1)), weight_budget=2):
+    s = TieredScheduler(tiers, weight_budget=weight_budget, cpu_budget=1e9, full_weight=1, screen_weight=0)
+    s.rank([{'symbol': sym, '_qvol': float(10 - i)} for i, sym in enumerate('ABCDE')])
+    return s
+
+
+def test_only_keeps_other_symbols_out_of_the_budget():
+    s = scheduler()
+    assert len(s.plan()) == 2  # tier 0 plus one due symbol fill the budget
+    s = scheduler()
+    assert sorted(s.plan(only={'C', 'D'})) == ['C', 'D']
+    assert s.stats['weight'] == 2 and s.stats['due_skipped'] == 0
+
+
+def test_only_screens_just_the_given_symbols():
+    s = scheduler(tiers=((1, 1), (None, 5)))
+    s.last_full = dict.fromkeys('ABCDE', 0)
+    seen = []
+
+    def screen(syms):
+        seen.extend(syms)
+        return [None] * len(syms)
+
+    assert s.plan(screen, only={'C', 'E'}) == []
+    assert sorted(seen) == ['C', 'E']